@@ -0,0 +1,422 @@
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+
+import attr
+from loguru import logger
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Nodes import their modules the same way as scripts started from communication
+sys.path.insert(0, os.path.join(ROOT_DIR, "communication"))
+
+from async_master_node import AsyncMasterNode
+from master_node import MasterNode, run_master_thread
+from worker_node import WorkerNode, run_worker_thread
+
+from benchmarks.corpus import generate_corpus
+from mapreduce.compression import CODECS
+from mapreduce.function_loader import FunctionLoader
+from mapreduce.local_runner import LocalRunner
+from mapreduce.map_reduce import MapReduce
+from mapreduce.map_task import MAP_MODES
+
+MiB = 1024 * 1024
+CONNECT_TIMEOUT = 30
+
+
+@attr.s(auto_attribs=True)
+class LoopbackCluster:
+    """
+    Master and workers running in threads of this process, connected on
+    loopback. Workers with data_dir store task outputs in its subdirectories
+    and reducers fetch them from shuffle services, otherwise outputs are
+    stored next to the input file.
+    """
+
+    workers: int = 3
+    slots: int = 2
+    asynchronous: bool = False
+    data_dir: Optional[str] = None
+
+    master: MasterNode = attr.ib(init=False)
+    worker_nodes: list[WorkerNode] = attr.ib(factory=list, init=False)
+    threads: list[threading.Thread] = attr.ib(factory=list, init=False)
+
+    def __enter__(self) -> "LoopbackCluster":
+        self.start()
+        return self
+
+    def __exit__(self, *_):
+        self.stop()
+
+    def start(self):
+        master_type = AsyncMasterNode if self.asynchronous else MasterNode
+        self.master = master_type("localhost", 0)
+        master_thread = threading.Thread(target=run_master_thread, args=[self.master])
+        master_thread.start()
+        self.master.wait_server_initialized()
+        master_port = self.master.server_address()[1]
+
+        self.threads.append(master_thread)
+
+        for i in range(self.workers):
+            data_dir = f"{self.data_dir}/worker_{i}" if self.data_dir else None
+            worker = WorkerNode("localhost", 0, self.slots, data_dir)
+            worker_thread = threading.Thread(
+                target=run_worker_thread, args=[worker, "localhost", master_port]
+            )
+            worker_thread.start()
+            self.worker_nodes.append(worker)
+            self.threads.append(worker_thread)
+
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        while len(self.master.workers) < self.workers:
+            if time.monotonic() > deadline:
+                self.stop()
+                raise RuntimeError("Workers did not connect to master")
+            time.sleep(0.1)
+
+    def stop(self):
+        """Workers disconnect before master is stopped"""
+        master_thread, *worker_threads = self.threads
+        for worker in self.worker_nodes:
+            worker.exit_flag.set()
+        for thread in worker_threads:
+            thread.join()
+
+        self.master.exit_flag.set()
+        master_thread.join()
+
+
+def load_function(filename: str) -> str:
+    with open(filename, "r") as file:
+        return FunctionLoader.from_file(file)
+
+
+def directory_files(directory: str) -> list[str]:
+    return [
+        os.path.join(path, filename)
+        for path, _, filenames in os.walk(directory)
+        for filename in filenames
+    ]
+
+
+def clean_outputs(work_dir: str, input_file: str):
+    """
+    Removes files of previous run, except the input. Workers may still be
+    removing map outputs of the run, see MapReduce.remove_outputs.
+    """
+    for filename in directory_files(work_dir):
+        with contextlib.suppress(FileNotFoundError):
+            if not os.path.samefile(filename, input_file):
+                os.remove(filename)
+
+
+def output_sizes(results: list[str], mrs: list[MapReduce]) -> dict[str, int]:
+    """
+    Sizes of files written by the jobs: map outputs, files of master shuffle
+    and results of reduce tasks. Map outputs and shuffle files are removed
+    once their job is done, so their sizes are the ones recorded by the jobs.
+    Temporary files removed during the job, like fetched partitions and sort
+    runs, are not counted.
+    """
+    sizes = {
+        "map_output_bytes": 0,
+        "shuffle_bytes": sum(mr.shuffle_bytes for mr in mrs),
+        "output_bytes": sum(os.path.getsize(result) for result in results),
+    }
+    for mr in mrs:
+        if "map" in mr.metrics.stages:
+            sizes["map_output_bytes"] += mr.metrics.stages["map"].bytes_written
+
+    sizes["intermediate_bytes"] = sizes["map_output_bytes"] + sizes["shuffle_bytes"]
+    return sizes
+
+
+def reference_results(
+    input_file: str,
+    map_function: str,
+    reduce_function: str,
+    combine_function: Optional[str],
+    map_mode: str,
+) -> dict[str, list[str]]:
+    """Results of the job run by LocalRunner, to check runs on the cluster"""
+    mr = MapReduce(
+        input_file,
+        map_function,
+        reduce_function,
+        combine_function=combine_function,
+        map_mode=map_mode,
+    )
+    return LocalRunner().collect(mr)
+
+
+def keep_results(results: list[str], directory: str) -> list[str]:
+    """Moves reduce output files to directory, so next runs do not remove them"""
+    os.makedirs(directory)
+    kept = [
+        f"{directory}/{i}_{os.path.basename(result)}"
+        for i, result in enumerate(results)
+    ]
+    for result, kept_result in zip(results, kept):
+        shutil.move(result, kept_result)
+    return kept
+
+
+def check_results(results: list[str], expected: dict[str, list[str]]):
+    """Raises if reduce output files differ from expected, in any order of values"""
+    actual: dict[str, list[str]] = {}
+    for result in results:
+        with open(result, "r") as file:
+            actual.update(json.load(file))
+
+    wrong = sorted(
+        key
+        for key in expected.keys() | actual.keys()
+        if key not in actual
+        or key not in expected
+        or sorted(actual[key]) != sorted(expected[key])
+    )
+    if wrong:
+        raise AssertionError(
+            f"Results of {len(wrong)} keys differ from reference, e.g. {wrong[:5]}"
+        )
+
+
+def run_job(
+    cluster: LoopbackCluster,
+    input_file: str,
+    functions: dict[str, Optional[str]],
+    options: dict[str, Any],
+    results_dir: str,
+    jobs: int = 1,
+) -> tuple[dict[str, Any], list[list[str]]]:
+    """
+    Runs the job on cluster, returns its measurements and its reduce output
+    files, moved to results_dir. With more jobs, copies of it run at the
+    same time and stage times and metrics are those of the first one.
+    """
+    mrs = [
+        cluster.master.map_reduce_type(
+            input_file,
+            functions["map"],
+            functions["reduce"],
+            combine_function=functions["combine"],
+            task_sizing=cluster.master.task_sizing,
+            scheduler=cluster.master.scheduler,
+            **options,
+        )
+        for _ in range(jobs)
+    ]
+
+    job_manager = cluster.master.job_manager
+    started = time.monotonic()
+    job_ids = [job_manager.submit(mr) for mr in mrs]
+    results = [job_manager.wait(job_id) for job_id in job_ids]
+    wall_time = time.monotonic() - started
+
+    input_size = os.path.getsize(input_file)
+    measurements = {
+        "wall_time": wall_time,
+        "job_times": [job_manager.jobs[job_id].run_time for job_id in job_ids],
+        "stage_times": dict(mrs[0].stage_times),
+        "throughput_mib_s": jobs * input_size / MiB / wall_time,
+        "reduce_tasks": len(results[0]),
+        **output_sizes(sum(results, []), mrs),
+        "map_cache": {
+            "hits": mrs[0].map_cache_hits,
+            "misses": mrs[0].map_cache_misses,
+        },
+        "metrics": mrs[0].metrics.to_dict(),
+    }
+    kept_results = [
+        keep_results(job_results, f"{results_dir}/{job_id}")
+        for job_id, job_results in zip(job_ids, results)
+    ]
+    return measurements, kept_results
+
+
+def peak_rss() -> dict[str, float]:
+    """
+    Peak resident memory in MiB of this process, which runs all nodes,
+    and of the largest finished task process. ru_maxrss is in KiB on Linux.
+    """
+    nodes = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tasks = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"peak_rss_nodes_mib": nodes / 1024, "peak_rss_tasks_mib": tasks / 1024}
+
+
+def map_cache_summary(map_cache: dict[str, int]) -> str:
+    tasks = map_cache["hits"] + map_cache["misses"]
+    if tasks == 0:
+        return ""
+    return f", map cache hits {map_cache['hits']}/{tasks}"
+
+
+def print_report(report: dict[str, Any]):
+    print(f"Input: {report['input_bytes'] / MiB:.1f} MiB, config: {report['config']}")
+    for i, run in enumerate(report["runs"]):
+        stages = ", ".join(
+            f"{stage} {seconds:.2f}s" for stage, seconds in run["stage_times"].items()
+        )
+        print(
+            f"Run {i}: {run['wall_time']:.2f}s ({stages}), "
+            f"{run['throughput_mib_s']:.2f} MiB/s, "
+            f"intermediate {run['intermediate_bytes'] / MiB:.1f} MiB "
+            f"(map {run['map_output_bytes'] / MiB:.1f} MiB, "
+            f"shuffle {run['shuffle_bytes'] / MiB:.1f} MiB), "
+            f"output {run['output_bytes'] / MiB:.1f} MiB"
+            + map_cache_summary(run["map_cache"])
+        )
+    print(
+        f"Peak RSS: nodes {report['peak_rss_nodes_mib']:.1f} MiB, "
+        f"tasks {report['peak_rss_tasks_mib']:.1f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark map reduce on master and workers running on loopback"
+    )
+    parser.add_argument("--input", help="input file, synthetic corpus if not set")
+    parser.add_argument("--size", type=float, default=16, help="corpus size in MiB")
+    parser.add_argument("--vocabulary", type=int, default=10000)
+    parser.add_argument("--zipf", type=float, default=1.0, help="key skew exponent")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--slots", type=int, default=2)
+    parser.add_argument("--chunk-size", type=int, default=MiB)
+    parser.add_argument(
+        "--target-task-duration",
+        type=float,
+        help="size tasks adaptively, chunk size is ignored then",
+    )
+    parser.add_argument("--partitioned", action="store_true")
+    parser.add_argument("--pipelined", action="store_true")
+    parser.add_argument("--serialization")
+    parser.add_argument("--compression", choices=CODECS)
+    parser.add_argument("--map-mode", choices=MAP_MODES, default="document")
+    parser.add_argument("--streaming-reduce", action="store_true")
+    parser.add_argument("--balance-partitions", action="store_true")
+    parser.add_argument("--split-hot-keys", action="store_true")
+    parser.add_argument("--async", dest="asynchronous", action="store_true")
+    parser.add_argument(
+        "--worker-dirs",
+        action="store_true",
+        help="separate data directory per worker, map outputs are fetched",
+    )
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument(
+        "--map-cache-dir", help="reuse map outputs of previous runs cached there"
+    )
+    parser.add_argument(
+        "--journaled", action="store_true", help="log job progress to journal"
+    )
+    parser.add_argument("--jobs", type=int, default=1, help="jobs submitted at once")
+    parser.add_argument("--map-file", default=f"{ROOT_DIR}/files/map.py")
+    parser.add_argument("--reduce-file", default=f"{ROOT_DIR}/files/reduce.py")
+    parser.add_argument("--combine-file", help="e.g. files/combine.py")
+    parser.add_argument("--work-dir", help="kept after benchmark if set")
+    parser.add_argument("--json", help="file to write report to")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="mapreduce_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+    input_file = f"{work_dir}/corpus.txt"
+    if args.input:
+        shutil.copyfile(args.input, input_file)
+    else:
+        generate_corpus(
+            input_file, int(args.size * MiB), args.vocabulary, args.zipf, args.seed
+        )
+
+    map_function = load_function(args.map_file)
+    reduce_function = load_function(args.reduce_file)
+    combine_function = load_function(args.combine_file) if args.combine_file else None
+    functions = {
+        "map": map_function,
+        "reduce": reduce_function,
+        "combine": combine_function,
+    }
+    options: dict[str, Any] = {
+        "chunk_size": args.chunk_size,
+        "partitioned": args.partitioned,
+        "pipelined": args.pipelined,
+        "map_mode": args.map_mode,
+        "streaming_reduce": args.streaming_reduce,
+        "target_task_duration": args.target_task_duration,
+        "balance_partitions": args.balance_partitions,
+        "split_hot_keys": args.split_hot_keys,
+        "map_cache_dir": args.map_cache_dir,
+        "journaled": args.journaled,
+    }
+    if args.serialization:
+        options["serialization"] = args.serialization
+    if args.compression:
+        options["compression"] = args.compression
+
+    report: dict[str, Any] = {
+        "config": {
+            key: value
+            for key, value in vars(args).items()
+            if key not in ["json", "log_level", "work_dir"]
+        },
+        "input_bytes": os.path.getsize(input_file),
+        "runs": [],
+    }
+
+    results_dir = tempfile.mkdtemp(prefix="mapreduce_benchmark_results_")
+    try:
+        runs_results: list[list[str]] = []
+        with LoopbackCluster(
+            args.workers,
+            args.slots,
+            args.asynchronous,
+            work_dir if args.worker_dirs else None,
+        ) as cluster:
+            for _ in range(args.repeat):
+                clean_outputs(work_dir, input_file)
+                measurements, results = run_job(
+                    cluster,
+                    input_file,
+                    functions,
+                    options,
+                    results_dir,
+                    args.jobs,
+                )
+                report["runs"].append(measurements)
+                runs_results.extend(results)
+        # Task processes are counted once the workers shut their pools down
+        report.update(peak_rss())
+
+        # Reference job runs after memory of the cluster is measured
+        expected = reference_results(
+            input_file, map_function, reduce_function, combine_function, args.map_mode
+        )
+        for results in runs_results:
+            check_results(results, expected)
+    finally:
+        shutil.rmtree(results_dir, ignore_errors=True)
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
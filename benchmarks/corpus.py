@@ -0,0 +1,77 @@
+import argparse
+import itertools
+import random
+import string
+
+WORDS_PER_LINE = 12
+# Words are drawn in batches, so the generator does not hold whole corpus
+BATCH_SIZE = 64 * 1024
+
+
+def vocabulary(size: int, rng: random.Random) -> list[str]:
+    """Distinct random lowercase words, ordered by rank"""
+    words: dict[str, None] = {}
+    while len(words) < size:
+        length = rng.randint(2, 12)
+        words["".join(rng.choices(string.ascii_lowercase, k=length))] = None
+    return list(words)
+
+
+def zipf_weights(size: int, exponent: float) -> list[float]:
+    """Cumulative weights of ranks 1..size, word of rank r has weight 1/r^s"""
+    return list(itertools.accumulate(1 / rank**exponent for rank in range(1, size + 1)))
+
+
+def generate_corpus(
+    filename: str,
+    size: int,
+    vocabulary_size: int = 10000,
+    exponent: float = 1.0,
+    seed: int = 0,
+) -> int:
+    """
+    Writes text file of at least size bytes with words drawn from
+    vocabulary with Zipfian distribution, exponent 0 gives uniform keys
+    and higher exponents make the most frequent keys hotter.
+
+    Returns number of bytes written.
+    """
+    rng = random.Random(seed)
+    words = vocabulary(vocabulary_size, rng)
+    cum_weights = zipf_weights(vocabulary_size, exponent)
+
+    written = 0
+    with open(filename, "w") as file:
+        while written < size:
+            batch = rng.choices(words, cum_weights=cum_weights, k=BATCH_SIZE)
+            lines = "".join(
+                " ".join(batch[i : i + WORDS_PER_LINE]) + "\n"
+                for i in range(0, len(batch), WORDS_PER_LINE)
+            )
+            file.write(lines)
+            written += len(lines)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic text corpus")
+    parser.add_argument("output_file")
+    parser.add_argument("--size", type=float, default=16, help="size in MiB")
+    parser.add_argument("--vocabulary", type=int, default=10000)
+    parser.add_argument("--zipf", type=float, default=1.0, help="key skew exponent")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    written = generate_corpus(
+        args.output_file,
+        int(args.size * 1024 * 1024),
+        args.vocabulary,
+        args.zipf,
+        args.seed,
+    )
+    print(f"Written {written} bytes to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+from typing import Any, Optional
+
+import attr
+from communicator import DEFAULT_TIMEOUT, HEARTBEAT_COMMANDS, QUIET_COMMANDS
+from loguru import logger
+from protocol import (
+    AsyncConnectionPool,
+    async_connection_pool,
+    async_heartbeat_connection_pool,
+)
+
+
+@attr.s(auto_attribs=True)
+class AsyncCommunicator:
+    """Asyncio version of Communicator"""
+
+    self_host: str
+    self_port: int
+    target_host: str
+    target_port: int
+    timeout: int = DEFAULT_TIMEOUT
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, AsyncCommunicator):
+            return (
+                self.target_host == other.target_host
+                and self.target_port == other.target_port
+            )
+        return super().__eq__(other)
+
+    def __hash__(self) -> int:
+        return hash((self.target_host, self.target_port))
+
+    def __str__(self) -> str:
+        return f"{self.target_host}:{self.target_port}"
+
+    async def communicate(
+        self,
+        command_name: str,
+        command_data: dict[str, Any] = dict(),
+        timeout: Optional[float] = None,
+    ) -> bool:
+        try:
+            level = "DEBUG" if command_name in QUIET_COMMANDS else "INFO"
+            logger.log(level, f"Sending {command_name} to {self.target_string}")
+            await self.__communicate(command_name, command_data, timeout)
+        except (ConnectionError, TimeoutError):
+            logger.error(f"Rejected {command_name} to {self.target_string}")
+            return False
+        return True
+
+    async def __communicate(
+        self,
+        command_name: str,
+        command_data: dict[str, Any] = dict(),
+        timeout: Optional[float] = None,
+    ) -> dict[str, Any]:
+        timeout = timeout or self.timeout
+        conn_data = {
+            "host": self.self_host,
+            "port": self.self_port,
+            "name": command_name,
+            "data": command_data,
+        }
+
+        pool: AsyncConnectionPool = async_connection_pool
+        if command_name in HEARTBEAT_COMMANDS:
+            pool = async_heartbeat_connection_pool
+        # Broken connections are closed and reopened by the pool, timeouts
+        # fail only this request
+        try:
+            connection = await pool.get(self.target_host, self.target_port, timeout)
+            response = await connection.request(conn_data, timeout)
+        except (OSError, TimeoutError):
+            raise ConnectionError(f"Cannot send {command_name} to {self}")
+
+        if response.get("status") != "ACCEPT":
+            raise ConnectionError(
+                f"Command {command_name} rejected by: {self.target_string}"
+            )
+        return response
+
+    @property
+    def target_string(self) -> str:
+        return f"host={self.target_host}, port={self.target_port}"
+
+    @property
+    def self_string(self) -> str:
+        return f"host={self.self_host}, port={self.self_port}"
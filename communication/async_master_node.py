@@ -0,0 +1,39 @@
+import asyncio
+
+from async_node import AsyncNode
+from async_worker import AsyncWorker
+from master_node import MASTER_HOST, MASTER_PORT, MasterNode, run_console
+
+from mapreduce.async_map_reduce import AsyncMapReduce
+from mapreduce.map_reduce import MapReduce
+from mapreduce.scheduler import AsyncFairScheduler
+
+
+class AsyncMasterNode(MasterNode, AsyncNode):
+    """
+    Master running its server, workers communication and job scheduling
+    on a single asyncio event loop.
+    """
+
+    map_reduce_type = AsyncMapReduce
+    scheduler_type = AsyncFairScheduler
+
+    def create_worker(self, host: str, port: int, slots: int) -> AsyncWorker:  # type: ignore[override]
+        return AsyncWorker(self.host, self.port, host, port, slots)
+
+    def start_heartbeat(self):
+        self.server_created.wait()
+        if self.loop is not None:
+            asyncio.run_coroutine_threadsafe(self.heartbeat.run_async(), self.loop)
+
+    def run_job(self, mr: MapReduce) -> list[str]:
+        if self.loop is None or not isinstance(mr, AsyncMapReduce):
+            raise RuntimeError("Async job requires running event loop")
+
+        workers: list[AsyncWorker] = list(self.workers)  # type: ignore[arg-type]
+        future = asyncio.run_coroutine_threadsafe(mr.run_async(workers), self.loop)
+        return future.result()
+
+
+if __name__ == "__main__":
+    run_console(AsyncMasterNode(host=MASTER_HOST, port=MASTER_PORT))
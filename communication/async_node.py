@@ -0,0 +1,138 @@
+import asyncio
+import json
+import threading
+from typing import Any, Optional
+
+from loguru import logger
+from node import Node
+from protocol import (
+    async_connection_pool,
+    async_heartbeat_connection_pool,
+    read_frame,
+    write_frame,
+)
+
+
+class AsyncNode(Node):
+    """
+    Node served by a single asyncio event loop instead of a TCPServer
+    with a thread per connection.
+
+    Commands are handled in the event loop as soon as they arrive,
+    without queueing and polling in main_loop. Handlers may be
+    coroutines, plain handlers are called directly and must not block.
+    """
+
+    def __init__(self, host: str, port: int) -> None:
+        super().__init__(host, port)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.async_server: Optional[asyncio.Server] = None
+        self.stop_server: Optional[asyncio.Event] = None
+        self.connection_tasks: dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.handler_tasks: set[asyncio.Task] = set()
+
+    def main_loop(self):
+        self.exit_flag.wait()
+
+    def run_server(self):
+        logger.info(f"Starting server at: host={self.host}, port={self.port}")
+        self.server_thread = threading.Thread(target=asyncio.run, args=[self.__serve()])
+        self.server_thread.start()
+
+    def server_address(self) -> tuple[str, int]:
+        if self.async_server is None:
+            raise RuntimeError("Server was not created")
+        host, port = self.async_server.sockets[0].getsockname()[:2]
+        return host, port
+
+    def shutdown_server(self):
+        if self.loop is not None and self.stop_server is not None:
+            self.loop.call_soon_threadsafe(self.stop_server.set)
+
+    def run_command(self, command: dict[str, Any]):
+        if not self.validate_command(command):
+            logger.error(f"Invalid command: {command}")
+            return
+
+        cmd_name: str = str(command["name"])
+        handler = Node.handlers.get(cmd_name)
+        if handler is None:
+            logger.error(f"Command '{cmd_name}' not implemented")
+            return
+
+        try:
+            result = handler(self, command)
+        except Exception:
+            logger.exception(f"Command '{cmd_name}' failed")
+            return
+
+        if asyncio.iscoroutine(result):
+            task = asyncio.create_task(result)
+            self.handler_tasks.add(task)
+            task.add_done_callback(self.handler_tasks.discard)
+
+    async def __serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stop_server = asyncio.Event()
+        self.async_server = await asyncio.start_server(
+            self.__handle_connection, self.host, self.port
+        )
+
+        async with self.async_server:
+            logger.info("Server started")
+            self.server_created.set()
+            await self.stop_server.wait()
+
+        for writer in self.connection_tasks:
+            writer.close()
+        await asyncio.gather(*self.connection_tasks.values(), return_exceptions=True)
+        async_connection_pool.close_all()
+        async_heartbeat_connection_pool.close_all()
+        logger.info("Server has been shut down")
+
+    async def __handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        task = asyncio.current_task()
+        if task is not None:
+            self.connection_tasks[writer] = task
+
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+
+                request_id, rawdata, _ = frame
+                command = self.__parse_command(rawdata)
+                if command is None:
+                    response, body = {"status": "REJECT"}, b""
+                elif (
+                    isinstance(command, dict)
+                    and command.get("name") in Node.query_handlers
+                ):
+                    response, body = self.run_query(command)
+                    command = None
+                else:
+                    response, body = {"status": "ACCEPT"}, b""
+
+                await write_frame(
+                    writer, request_id, json.dumps(response).encode(), body
+                )
+                if command is not None:
+                    self.run_command(command)
+        except OSError as e:
+            logger.error(f"Connection error: {e}")
+        finally:
+            self.connection_tasks.pop(writer, None)
+            writer.close()
+
+    @staticmethod
+    def __parse_command(rawdata: bytes) -> Optional[dict[str, Any]]:
+        try:
+            command = json.loads(rawdata)
+            logger.debug(f"Received data: {command}")
+            return command
+        except ValueError:
+            logger.error(f"Received invalid data: {rawdata!r}")
+            return None
@@ -0,0 +1,138 @@
+import asyncio
+import uuid
+from typing import Any, Optional
+
+from async_communicator import AsyncCommunicator
+from communicator import DEFAULT_TIMEOUT
+from heartbeat import WorkerHealth
+
+from mapreduce.function_registry import function_digest
+
+
+class AsyncWorker(AsyncCommunicator):
+    """Asyncio version of Worker, task results are delivered to futures"""
+
+    def __init__(
+        self,
+        self_host: str,
+        self_port: int,
+        target_host: str,
+        target_port: int,
+        slots: int = 1,
+    ):
+        self.self_host = self_host
+        self.self_port = self_port
+        self.target_host = target_host
+        self.target_port = target_port
+
+        self.timeout: int = DEFAULT_TIMEOUT
+        self.slots = slots
+        self.running_tasks: dict[str, asyncio.Future] = {}
+        self.registered_functions: set[str] = set()
+        self.registration_lock = asyncio.Lock()
+        self.health = WorkerHealth()
+
+    def start_task(self) -> str:
+        task_id = uuid.uuid4().hex
+        self.running_tasks[task_id] = asyncio.get_running_loop().create_future()
+        return task_id
+
+    def put_task_result(self, task_id: str, data: dict[str, Any]):
+        """May be called from any thread"""
+        task = self.running_tasks.get(task_id)
+        if task is not None:
+            task.get_loop().call_soon_threadsafe(self.__set_result, task_id, data)
+
+    async def wait_task(self, task_id: str, timeout: float) -> Optional[dict[str, Any]]:
+        """
+        Returns task result or None on timeout.
+        Task timed out is still running and may be waited for again.
+        """
+        task = self.running_tasks[task_id]
+        try:
+            result = await asyncio.wait_for(asyncio.shield(task), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+        self.forget_task(task_id)
+        return result
+
+    def forget_task(self, task_id: str):
+        self.running_tasks.pop(task_id, None)
+
+    def fail_running_tasks(self, error: str):
+        """May be called from any thread"""
+        for task_id in list(self.running_tasks):
+            self.put_task_result(task_id, {"error": error})
+
+    @property
+    def load(self) -> float:
+        """Fraction of slots running tasks"""
+        return len(self.running_tasks) / self.slots
+
+    async def ping(self, timeout: Optional[float] = None) -> bool:
+        return await self.communicate("ping", timeout=timeout)
+
+    async def terminate(self) -> bool:
+        return await self.communicate("terminate")
+
+    async def discard_task(self, task_id: str) -> bool:
+        """Removes outputs of task attempt which lost to another attempt"""
+        return await self.communicate("discard", {"task_id": task_id})
+
+    async def job_done(self, job_dir: str, keep: list[str]) -> bool:
+        """Removes outputs of tasks of the job, except keep"""
+        data = {"job_dir": job_dir, "keep": keep}
+        return await self.communicate("job_done", data)
+
+    async def register_function(self, source: str) -> Optional[str]:
+        digest = function_digest(source)
+        async with self.registration_lock:
+            if digest in self.registered_functions:
+                return digest
+
+            data = {"digest": digest, "source": source}
+            if not await self.communicate("register_function", data):
+                return None
+
+            self.registered_functions.add(digest)
+        return digest
+
+    async def map(
+        self,
+        map_function: str,
+        split: dict[str, Any],
+        combine_function: Optional[str] = None,
+        **options: Any,
+    ) -> bool:
+        functions = {"map_function": map_function, "combine_function": combine_function}
+        return await self.__run_task("map", functions, {"split": split, **options})
+
+    async def reduce(self, reduce_function: str, filename: str, **options: Any) -> bool:
+        functions: dict[str, Optional[str]] = {"reduce_function": reduce_function}
+        data = {"filename": filename, **options}
+        return await self.__run_task("reduce", functions, data)
+
+    async def __run_task(
+        self,
+        command_name: str,
+        functions: dict[str, Optional[str]],
+        data: dict[str, Any],
+    ) -> bool:
+        for name, source in functions.items():
+            if source is None:
+                continue
+
+            digest = await self.register_function(source)
+            if digest is None:
+                return False
+            data[f"{name}_digest"] = digest
+
+        return await self.communicate(command_name, data)
+
+    def __set_result(self, task_id: str, data: dict[str, Any]):
+        self.registered_functions.difference_update(data.get("missing_functions", []))
+
+        task = self.running_tasks.get(task_id)
+        if task is not None and not task.done():
+            task.set_result(data)
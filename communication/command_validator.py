@@ -2,8 +2,17 @@ import copy
 
 import jsonschema
 
-MASTER_CMD_NAMES = ["connect", "disconnect", "finished", "task_done"]
-WORKER_CMD_NAMES = ["map", "reduce", "terminate", "ping"]
+MASTER_CMD_NAMES = ["connect", "disconnect", "finished", "task_done", "map_outputs"]
+WORKER_CMD_NAMES = [
+    "map",
+    "reduce",
+    "terminate",
+    "ping",
+    "register_function",
+    "discard",
+    "fetch",
+    "job_done",
+]
 
 CMD_SCHEMA = {
     "type": "object",
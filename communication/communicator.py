@@ -1,11 +1,14 @@
-import json
-import socket
-from typing import Any
+from typing import Any, Optional
 
 import attr
 from loguru import logger
+from protocol import ConnectionPool, connection_pool, heartbeat_connection_pool
 
 DEFAULT_TIMEOUT = 10
+# Frequent commands logged only in debug
+QUIET_COMMANDS = {"ping"}
+# Commands sent on their own connections, see heartbeat_connection_pool
+HEARTBEAT_COMMANDS = {"ping"}
 
 
 @attr.s(auto_attribs=True)
@@ -31,35 +34,58 @@ class Communicator:
         return f"{self.target_host}:{self.target_port}"
 
     def communicate(
-        self, command_name: str, command_data: dict[str, Any] = dict()
+        self,
+        command_name: str,
+        command_data: dict[str, Any] = dict(),
+        timeout: Optional[float] = None,
     ) -> bool:
         try:
-            logger.info(f"Sending {command_name} to {self.target_string}")
-            self.__communicate(command_name, command_data)
-        except (ConnectionError, ConnectionRefusedError):
+            level = "DEBUG" if command_name in QUIET_COMMANDS else "INFO"
+            logger.log(level, f"Sending {command_name} to {self.target_string}")
+            self.__communicate(command_name, command_data, timeout)
+        except OSError:
+            # Also errors of opening connections, e.g. unknown or unreachable host
             logger.error(f"Rejected {command_name} to {self.target_string}")
             return False
         return True
 
+    def query(
+        self,
+        command_name: str,
+        command_data: dict[str, Any] = dict(),
+        timeout: Optional[float] = None,
+    ) -> bytes:
+        """Returns body of response to query, raises ConnectionError if rejected"""
+        logger.debug(f"Sending {command_name} to {self.target_string}")
+        return self.__communicate(command_name, command_data, timeout)[1]
+
     def __communicate(
-        self, command_name: str, command_data: dict[str, Any] = dict()
-    ) -> None:
-        with socket.create_connection(
-            (self.target_host, self.target_port), self.timeout
-        ) as connection:
-            conn_data = {
-                "host": self.self_host,
-                "port": self.self_port,
-                "name": command_name,
-                "data": command_data,
-            }
-            connection.sendall(json.dumps(conn_data).encode())
-            response = connection.recv(512)
+        self,
+        command_name: str,
+        command_data: dict[str, Any] = dict(),
+        timeout: Optional[float] = None,
+    ) -> tuple[dict[str, Any], bytes]:
+        timeout = timeout or self.timeout
+        conn_data = {
+            "host": self.self_host,
+            "port": self.self_port,
+            "name": command_name,
+            "data": command_data,
+        }
+
+        pool: ConnectionPool = connection_pool
+        if command_name in HEARTBEAT_COMMANDS:
+            pool = heartbeat_connection_pool
+        # Broken connections are closed and reopened by the pool, timeouts
+        # fail only this request
+        connection = pool.get(self.target_host, self.target_port, timeout)
+        response, body = connection.request_with_body(conn_data, timeout)
 
-        if response != b"ACCEPT":
+        if response.get("status") != "ACCEPT":
             raise ConnectionError(
-                f"Cannot connect to master at: host={self.target_host} port={self.target_port}"
+                f"Command {command_name} rejected by: {self.target_string}"
             )
+        return response, body
 
     @property
     def target_string(self) -> str:
@@ -8,3 +8,17 @@ class event_handler:
     def __set_name__(self, owner, name):
         owner.handlers[self.fn.__name__] = self.fn
         setattr(owner, name, self.fn)
+
+
+class query_handler:
+    """
+    Handler answering a command directly in the connection thread,
+    returned bytes are sent back as response body
+    """
+
+    def __init__(self, fn: Callable):
+        self.fn = fn
+
+    def __set_name__(self, owner, name):
+        owner.query_handlers[self.fn.__name__] = self.fn
+        setattr(owner, name, self.fn)
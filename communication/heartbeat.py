@@ -0,0 +1,98 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from loguru import logger
+
+DEFAULT_HEARTBEAT_INTERVAL = 1.0
+DEFAULT_MAX_MISSED_HEARTBEATS = 3
+MAX_CONCURRENT_PINGS = 16
+
+
+class WorkerHealth:
+    """Liveness of a worker, tracked by master from heartbeats"""
+
+    def __init__(self) -> None:
+        self.alive = True
+        self.missed_heartbeats = 0
+        self.last_heartbeat = time.monotonic()
+
+    def record_heartbeat(self, success: bool):
+        if success:
+            self.missed_heartbeats = 0
+            self.last_heartbeat = time.monotonic()
+        else:
+            self.missed_heartbeats += 1
+
+    @property
+    def since_last_heartbeat(self) -> float:
+        return time.monotonic() - self.last_heartbeat
+
+
+class HeartbeatMonitor:
+    """
+    Pings all workers every interval, workers which missed max_missed
+    heartbeats in a row are reported as dead to on_dead callback.
+    """
+
+    def __init__(
+        self,
+        workers: Callable[[], list[Any]],
+        on_dead: Callable[[Any, str], None],
+        exit_flag: threading.Event,
+        interval: float = DEFAULT_HEARTBEAT_INTERVAL,
+        max_missed: int = DEFAULT_MAX_MISSED_HEARTBEATS,
+    ) -> None:
+        self.workers = workers
+        self.on_dead = on_dead
+        self.exit_flag = exit_flag
+        self.interval = interval
+        self.max_missed = max_missed
+        self.thread = threading.Thread(target=self.__run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    async def run_async(self):
+        """Heartbeat of asyncio workers, run in the event loop instead of start"""
+        while not self.exit_flag.is_set():
+            await asyncio.sleep(self.interval)
+            workers = self.workers()
+            results = await asyncio.gather(
+                *[worker.ping(self.interval) for worker in workers],
+                return_exceptions=True,
+            )
+            try:
+                for worker, success in zip(workers, results):
+                    self.record(worker, success is True)
+            except Exception as e:
+                logger.exception(f"Heartbeat failed: {e!r}")
+
+    def __run(self):
+        with ThreadPoolExecutor(MAX_CONCURRENT_PINGS) as executor:
+            while not self.exit_flag.wait(self.interval):
+                workers = self.workers()
+                results = executor.map(self.__ping, workers)
+                # Errors must not stop the thread, workers would never be
+                # found dead again
+                try:
+                    for worker, success in zip(workers, results):
+                        self.record(worker, success)
+                except Exception as e:
+                    logger.exception(f"Heartbeat failed: {e!r}")
+
+    def __ping(self, worker: Any) -> bool:
+        """Unexpected errors of ping count as missed heartbeats"""
+        try:
+            return worker.ping(self.interval)
+        except Exception as e:
+            logger.error(f"Ping of worker {worker} failed: {e!r}")
+            return False
+
+    def record(self, worker: Any, success: bool):
+        worker.health.record_heartbeat(success)
+        if worker.health.alive and worker.health.missed_heartbeats >= self.max_missed:
+            logger.error(f"Worker {worker} missed {self.max_missed} heartbeats")
+            self.on_dead(worker, "missed heartbeats")
@@ -1,3 +1,6 @@
+import json
+from typing import Any, Optional
+
 import attr
 from communicator import DEFAULT_TIMEOUT, Communicator
 
@@ -10,11 +13,25 @@ class Master(Communicator):
     target_port: int
     timeout: int = DEFAULT_TIMEOUT
 
-    def connect(self):
-        return self.communicate("connect")
+    def connect(self, slots: int = 1):
+        return self.communicate("connect", {"slots": slots})
 
     def disconnect(self):
         return self.communicate("disconnect")
 
-    def task_done(self, output_file: str):
-        return self.communicate("task_done", {"output": output_file})
+    def task_done(
+        self,
+        output_file: Optional[str],
+        task_id: str,
+        error: Optional[str] = None,
+        **details: Any,
+    ):
+        data = {"output": output_file, "task_id": task_id, **details}
+        if error is not None:
+            data["error"] = error
+        return self.communicate("task_done", data)
+
+    def map_outputs(self, job_id: str, partition: int) -> dict[str, Any]:
+        """Map outputs of partition completed so far in pipelined job"""
+        data = {"job_id": job_id, "partition": partition}
+        return json.loads(self.query("map_outputs", data))
@@ -1,60 +1,170 @@
+import json
 import threading
-from typing import Any
+from typing import Any, Optional
 
 from command_validator import CommandValidator
-from event_handler import event_handler
+from event_handler import event_handler, query_handler
+from heartbeat import HeartbeatMonitor
 from loguru import logger
 from node import Node
 from rich import print
+from rich.table import Table
 from worker import Worker
 
 from mapreduce.function_loader import FunctionLoader
+from mapreduce.job_manager import JobManager
 from mapreduce.map_reduce import MapReduce
+from mapreduce.scheduler import FairScheduler
+from mapreduce.task_metrics import TaskMetrics
+from mapreduce.task_sizing import TaskSizing
 
 MASTER_HOST = "localhost"
 MASTER_PORT = 9999
 
 
 class MasterNode(Node):
+    map_reduce_type: type[MapReduce] = MapReduce
+    scheduler_type: type[FairScheduler] = FairScheduler
+
     def __init__(self, host: str, port: int) -> None:
         super().__init__(host, port)
         self.workers: list[Worker] = []
+        self.jobs: dict[str, MapReduce] = {}
+        self.last_job: Optional[MapReduce] = None
+        # Throughput observed by jobs sizes tasks of next adaptive jobs
+        self.task_sizing = TaskSizing()
+        # Jobs run at the same time share worker slots fairly
+        self.scheduler = self.scheduler_type()
+        self.job_manager = JobManager(self.execute_job)
+        self.heartbeat = HeartbeatMonitor(
+            lambda: list(self.workers), self.remove_worker, self.exit_flag
+        )
+
+    def run_server(self):
+        super().run_server()
+        self.start_heartbeat()
+
+    def start_heartbeat(self):
+        self.heartbeat.start()
 
     def validate_command(self, command: dict[str, Any]) -> bool:
         return CommandValidator.validate_master(command)
 
     @event_handler
     def connect(self, command: dict[str, Any]):
-        worker = Worker(self.host, self.port, command["host"], command["port"])
+        host, port = command["host"], command["port"]
+        if any(
+            worker.target_host == host and worker.target_port == port
+            for worker in self.workers
+        ):
+            logger.info(f"Already connected with: {host}:{port}")
+            return
+
+        worker = self.create_worker(host, port, command["data"].get("slots", 1))
         self.workers.append(worker)
-        logger.info(f"Connected with: {worker.target_string}")
+        logger.info(f"Connected with: {worker.target_string}, slots: {worker.slots}")
+
+    def create_worker(self, host: str, port: int, slots: int) -> Worker:
+        return Worker(self.host, self.port, host, port, slots)
 
     @event_handler
     def disconnect(self, command: dict[str, Any]):
         host, port = command["host"], command["port"]
         for worker in self.workers:
             if worker.target_host == host and worker.target_port == port:
-                self.workers.remove(worker)
-                logger.info(f"Removed: {worker.target_string}")
+                self.remove_worker(worker, "disconnected")
                 break
 
+    def remove_worker(self, worker: Worker, reason: str):
+        """Stops scheduling on worker, its running tasks are failed and rescheduled"""
+        worker.health.alive = False
+        try:
+            self.workers.remove(worker)
+        except ValueError:
+            return
+
+        worker.fail_running_tasks(f"Worker lost: {reason}")
+        logger.info(f"Removed: {worker.target_string}, {reason}")
+
     @event_handler
     def task_done(self, command: dict[str, Any]):
         host, port = command["host"], command["port"]
         for worker in self.workers:
             if worker.target_host == host and worker.target_port == port:
-                worker.put_last_result(command["data"])
-                worker.task_done.set()
+                worker.put_task_result(command["data"]["task_id"], command["data"])
 
-    def map_reduce(self, input_file: str, map_fn_file: str, reduce_fn_file: str):
+    @query_handler
+    def map_outputs(self, command: dict[str, Any]) -> bytes:
+        data = command["data"]
+        job = self.jobs[data["job_id"]]
+        return json.dumps(job.map_outputs(data["partition"])).encode()
+
+    def map_reduce(
+        self,
+        input_file: str,
+        map_fn_file: str,
+        reduce_fn_file: str,
+        combine_fn_file: Optional[str] = None,
+        **options: Any,
+    ) -> list[str]:
+        mr = self.create_job(
+            input_file, map_fn_file, reduce_fn_file, combine_fn_file, **options
+        )
+        return self.submit_job(mr)
+
+    def create_job(
+        self,
+        input_file: str,
+        map_fn_file: str,
+        reduce_fn_file: str,
+        combine_fn_file: Optional[str] = None,
+        **options: Any,
+    ) -> MapReduce:
         with open(map_fn_file, "r") as map_file:
             map_function = FunctionLoader.from_file(map_file)
 
         with open(reduce_fn_file, "r") as reduce_file:
             reduce_function = FunctionLoader.from_file(reduce_file)
 
-        mr = MapReduce(input_file, map_function, reduce_function)
-        mr.run(self.workers)
+        if combine_fn_file:
+            with open(combine_fn_file, "r") as combine_file:
+                options["combine_function"] = FunctionLoader.from_file(combine_file)
+
+        options.setdefault("task_sizing", self.task_sizing)
+        options.setdefault("scheduler", self.scheduler)
+        return self.map_reduce_type(
+            input_file, map_function, reduce_function, **options
+        )
+
+    def resume_job(self, journal_file: str) -> list[str]:
+        """
+        Runs job logged in journal again, e.g. after master restart. Tasks
+        completed before are not run again, unless their outputs were lost.
+        """
+        mr = self.map_reduce_type.from_journal(
+            journal_file, task_sizing=self.task_sizing, scheduler=self.scheduler
+        )
+        return self.submit_job(mr)
+
+    def submit_job(self, mr: MapReduce) -> list[str]:
+        """Queues the job and waits until it finishes, returns reduce output files"""
+        return self.job_manager.wait(self.job_manager.submit(mr))
+
+    def execute_job(self, mr: MapReduce) -> list[str]:
+        """Runs the job on connected workers, called by job manager"""
+        self.jobs[mr.job_id] = mr
+        self.last_job = mr
+        try:
+            results = self.run_job(mr)
+        finally:
+            del self.jobs[mr.job_id]
+        logger.info(f"Job {mr.job_id} results: {results}")
+        return results
+
+    def run_job(self, mr: MapReduce) -> list[str]:
+        # Workers connecting or lost during the job change self.workers,
+        # the job keeps the ones it started with, lost ones stop being alive
+        return mr.run(list(self.workers))
 
 
 def run_master_thread(master: MasterNode):
@@ -64,15 +174,70 @@ def run_master_thread(master: MasterNode):
     master.wait_finished()
 
 
-if __name__ == "__main__":
-    master = MasterNode(host=MASTER_HOST, port=MASTER_PORT)
+def metrics_table(mr: MapReduce) -> Table:
+    MiB = 1024 * 1024
+    table = Table(title=f"Job {mr.job_id}")
+    for column in ["Stage", "Worker", "Tasks", "Records in/out", "MiB in/out"]:
+        table.add_column(column)
+    for column in ["Function", "Serialization", "Fetch", "Queue wait"]:
+        table.add_column(column, justify="right")
+
+    def add_row(stage: str, worker: str, metrics: TaskMetrics):
+        table.add_row(
+            stage,
+            worker,
+            str(metrics.tasks),
+            f"{metrics.records_in}/{metrics.records_out}",
+            f"{metrics.bytes_read / MiB:.1f}/{metrics.bytes_written / MiB:.1f}",
+            f"{metrics.function_time:.2f}s",
+            f"{metrics.serialization_time:.2f}s",
+            f"{metrics.fetch_time:.2f}s",
+            f"{metrics.queue_wait:.2f}s",
+        )
+
+    for stage, metrics in mr.metrics.stages.items():
+        wall_time = mr.stage_times.get(stage, 0.0)
+        add_row(f"{stage} {wall_time:.2f}s", "all", metrics)
+        for worker, worker_metrics in mr.metrics.workers[stage].items():
+            add_row("", worker, worker_metrics)
+
+    return table
+
+
+def jobs_table(master: MasterNode) -> Table:
+    table = Table(title="Jobs")
+    for column in ["Job", "Input", "State", "Running tasks", "Run time"]:
+        table.add_column(column)
+
+    running_tasks = master.scheduler.running_jobs
+    for job in list(master.job_manager.jobs.values()):
+        table.add_row(
+            job.job_id,
+            job.mr.input_file,
+            job.state,
+            str(running_tasks.get(job.job_id, 0)),
+            f"{job.run_time:.2f}s",
+        )
+
+    return table
+
+
+def run_console(master: MasterNode):
     master_thread = threading.Thread(target=run_master_thread, args=[master])
     master_thread.start()
 
     print()
     print("Master console, usage:")
     print("w    Print list of all connected workers")
-    print("mr   Run map reduce from files: files/map.py, files/reduce.py on data: words.txt")
+    print(
+        "mr   Run map reduce from files: files/map.py, files/reduce.py, files/combine.py on data: words.txt"
+    )
+    print("mrp  Same as mr, but map outputs are partitioned and grouped by workers")
+    print("mrpp Same as mrp, but reducers fetch map outputs while map is running")
+    print("mrb  Same as mr, but the job is queued and runs in background")
+    print("r    Resume job from its journal, e.g. after master restart")
+    print("j    Print submitted jobs")
+    print("m    Print metrics of the last job, per stage and worker")
     print()
 
     try:
@@ -84,21 +249,61 @@ if __name__ == "__main__":
                 break
 
             elif user_input == "w":
-                print(master.workers)
+                for worker in master.workers:
+                    print(
+                        f"{worker}  slots: {worker.slots}, load: {worker.load:.0%}, "
+                        f"last heartbeat: {worker.health.since_last_heartbeat:.1f}s ago"
+                    )
+
+            elif user_input == "j":
+                print(jobs_table(master))
+
+            elif user_input == "r":
+                master.resume_job(input("journal file: "))
+
+            elif user_input == "m":
+                if master.last_job is None:
+                    print("No job was run")
+                else:
+                    print(metrics_table(master.last_job))
 
             elif user_input == "map_reduce":
                 map_function_file = input("map function file: ")
                 reduce_function_file = input("reduce function file: ")
+                combine_function_file = input("combine function file (optional): ")
                 file = input("data file: ")
-                master.map_reduce(file, map_function_file, reduce_function_file)
+                master.map_reduce(
+                    file, map_function_file, reduce_function_file, combine_function_file
+                )
 
-            elif user_input == "mr":
+            elif user_input == "mrb":
+                mr = master.create_job(
+                    "./files/words.txt",
+                    "./files/map.py",
+                    "./files/reduce.py",
+                    "./files/combine.py",
+                )
+                print(f"Job {master.job_manager.submit(mr)} queued")
+
+            elif user_input in ["mr", "mrp", "mrpp"]:
                 map_function_file = "./files/map.py"
                 reduce_function_file = "./files/reduce.py"
+                combine_function_file = "./files/combine.py"
                 file = "./files/words.txt"
-                master.map_reduce(file, map_function_file, reduce_function_file)
+                master.map_reduce(
+                    file,
+                    map_function_file,
+                    reduce_function_file,
+                    combine_function_file,
+                    partitioned=user_input == "mrp",
+                    pipelined=user_input == "mrpp",
+                )
 
     except KeyboardInterrupt:
         master.exit_flag.set()
 
     master_thread.join()
+
+
+if __name__ == "__main__":
+    run_console(MasterNode(host=MASTER_HOST, port=MASTER_PORT))
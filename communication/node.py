@@ -1,21 +1,32 @@
 import json
+import socket
 import socketserver
 import threading
 from queue import Queue
 from typing import Any, Callable, Optional
 
 from loguru import logger
+from protocol import recv_frame, send_frame
+
+
+class NodeTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    # Restarted master binds its port while old connections are in TIME_WAIT
+    allow_reuse_address = True
 
 
 class Node:
     handlers: dict[str, Callable] = {}
+    query_handlers: dict[str, Callable] = {}
 
     def __init__(self, host: str, port: int) -> None:
         self.host = host
         self.port = port
 
         self.server_thread: Optional[threading.Thread] = None
-        self.server: Optional[socketserver.TCPServer] = None
+        self.server: Optional[NodeTCPServer] = None
+        self.connections: set[socket.socket] = set()
+        self.connections_lock = threading.Lock()
 
         self.server_created = threading.Event()
         self.command_semaphore = threading.Semaphore(0)
@@ -49,6 +60,19 @@ class Node:
         except KeyError:
             logger.error(f"Command '{cmd_name}' not implemented")
 
+    def run_query(self, command: dict[str, Any]) -> tuple[dict[str, Any], bytes]:
+        """Queries are answered immediately, with handler result as response body"""
+        if not self.validate_command(command):
+            logger.error(f"Invalid query: {command}")
+            return {"status": "REJECT"}, b""
+
+        try:
+            body = Node.query_handlers[command["name"]](self, command)
+        except Exception as e:
+            logger.error(f"Query '{command['name']}' failed: {e!r}")
+            return {"status": "REJECT", "error": repr(e)}, b""
+        return {"status": "ACCEPT"}, body
+
     def run_server(self):
         logger.info(f"Starting server at: host={self.host}, port={self.port}")
         self.server_thread = threading.Thread(target=self.__run_server_thread)
@@ -56,21 +80,56 @@ class Node:
 
     def __run_server_thread(self):
         class NodeServer(socketserver.BaseRequestHandler):
-            def handle(s):
-                s.data = s.request.recv(16 * 1024).strip()
-                s.store_command(s.data)
-                s.request.sendall(b"ACCEPT")
+            """Serves framed requests over a persistent connection"""
+
+            def setup(s):
+                with self.connections_lock:
+                    self.connections.add(s.request)
 
-            def store_command(s, rawdata: str):
+            def handle(s):
+                while True:
+                    try:
+                        frame = recv_frame(s.request)
+                    except OSError as e:
+                        logger.error(f"Connection error: {e}")
+                        break
+
+                    if frame is None:
+                        break
+
+                    request_id, rawdata, _ = frame
+                    response, body = s.process_command(rawdata)
+                    try:
+                        send_frame(
+                            s.request, request_id, json.dumps(response).encode(), body
+                        )
+                    except OSError as e:
+                        logger.error(f"Connection error: {e}")
+                        break
+
+            def finish(s):
+                with self.connections_lock:
+                    self.connections.discard(s.request)
+
+            def process_command(s, rawdata: bytes) -> tuple[dict[str, Any], bytes]:
                 try:
                     command = json.loads(rawdata)
-                    self.commands.put(command)
-                    self.command_semaphore.release()
-                    logger.debug(f"Received data: {command}")
                 except ValueError:
-                    logger.error(f"Received invalid data: {rawdata}")
+                    logger.error(f"Received invalid data: {rawdata!r}")
+                    return {"status": "REJECT"}, b""
+
+                if (
+                    isinstance(command, dict)
+                    and command.get("name") in Node.query_handlers
+                ):
+                    return self.run_query(command)
+
+                self.commands.put(command)
+                self.command_semaphore.release()
+                logger.debug(f"Received data: {command}")
+                return {"status": "ACCEPT"}, b""
 
-        with socketserver.TCPServer((self.host, self.port), NodeServer) as server:
+        with NodeTCPServer((self.host, self.port), NodeServer) as server:
             logger.info("Server started")
             self.server = server
             self.server_created.set()
@@ -78,9 +137,22 @@ class Node:
 
         logger.info("Server has been shut down")
 
+    def server_address(self) -> tuple[str, int]:
+        if self.server is None:
+            raise RuntimeError("Server was not created")
+        host, port = self.server.socket.getsockname()[:2]
+        return host, port
+
     def shutdown_server(self):
         self.server.shutdown()
 
+        with self.connections_lock:
+            for connection in self.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
     def wait_finished(self):
         self.server_thread.join()
 
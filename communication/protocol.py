@@ -0,0 +1,308 @@
+import asyncio
+import itertools
+import json
+import socket
+import struct
+import threading
+from typing import Any, Optional
+
+from loguru import logger
+
+# Every frame starts with request id, length of JSON payload and length
+# of raw body following it, body carries bulk data such as shuffle files
+FRAME_HEADER = struct.Struct("!QII")
+RECV_BUFFER_SIZE = 1024 * 1024
+
+
+def send_frame(sock: socket.socket, request_id: int, payload: bytes, body: bytes = b""):
+    header = FRAME_HEADER.pack(request_id, len(payload), len(body))
+    sock.sendall(header + payload)
+    if body:
+        sock.sendall(body)
+
+
+def recv_frame(sock: socket.socket) -> Optional[tuple[int, bytes, bytes]]:
+    """Returns (request_id, payload, body) or None if connection was closed"""
+    header = recv_exactly(sock, FRAME_HEADER.size)
+    if header is None:
+        return None
+
+    request_id, length, body_length = FRAME_HEADER.unpack(header)
+    data = recv_exactly(sock, length + body_length) if length + body_length else b""
+    if data is None:
+        raise ConnectionError("Connection closed in the middle of a frame")
+
+    return request_id, data[:length], data[length:]
+
+
+def recv_exactly(sock: socket.socket, size: int) -> Optional[bytes]:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(min(size - len(data), RECV_BUFFER_SIZE))
+        if not chunk:
+            if not data:
+                return None
+            raise ConnectionError("Connection closed in the middle of a frame")
+        data.extend(chunk)
+    return bytes(data)
+
+
+async def read_frame(
+    reader: asyncio.StreamReader,
+) -> Optional[tuple[int, bytes, bytes]]:
+    """Asyncio version of recv_frame"""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ConnectionError("Connection closed in the middle of a frame")
+        return None
+
+    request_id, length, body_length = FRAME_HEADER.unpack(header)
+    try:
+        data = await reader.readexactly(length + body_length)
+    except asyncio.IncompleteReadError:
+        raise ConnectionError("Connection closed in the middle of a frame")
+
+    return request_id, data[:length], data[length:]
+
+
+async def write_frame(
+    writer: asyncio.StreamWriter, request_id: int, payload: bytes, body: bytes = b""
+):
+    writer.write(FRAME_HEADER.pack(request_id, len(payload), len(body)) + payload)
+    if body:
+        writer.write(body)
+    await writer.drain()
+
+
+class PendingResponse:
+    def __init__(self) -> None:
+        self.received = threading.Event()
+        self.response: Optional[dict[str, Any]] = None
+        self.body = b""
+
+
+class Connection:
+    """
+    Long-lived connection multiplexing many requests.
+
+    Requests may be sent concurrently from many threads, responses are
+    matched to requests by id in a background reader thread.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float) -> None:
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.settimeout(None)
+
+        self.send_lock = threading.Lock()
+        self.pending_lock = threading.Lock()
+        self.pending: dict[int, PendingResponse] = {}
+        self.request_ids = itertools.count()
+        self.closed = threading.Event()
+
+        self.reader_thread = threading.Thread(target=self.__read_responses, daemon=True)
+        self.reader_thread.start()
+
+    def request(self, payload: dict[str, Any], timeout: float) -> dict[str, Any]:
+        return self.request_with_body(payload, timeout)[0]
+
+    def request_with_body(
+        self, payload: dict[str, Any], timeout: float
+    ) -> tuple[dict[str, Any], bytes]:
+        """Returns response and raw body sent with it"""
+        pending = PendingResponse()
+        with self.pending_lock:
+            if self.closed.is_set():
+                raise ConnectionError("Connection is closed")
+            request_id = next(self.request_ids)
+            self.pending[request_id] = pending
+
+        try:
+            try:
+                with self.send_lock:
+                    send_frame(self.socket, request_id, json.dumps(payload).encode())
+            except OSError as e:
+                # Frame may be sent partially, so the connection is unusable
+                self.close()
+                raise ConnectionError(f"Cannot send request {request_id}: {e!r}")
+
+            # Timeout fails only this request, the connection stays open
+            # for other requests, e.g. long commands sent from other threads
+            if not pending.received.wait(timeout):
+                raise TimeoutError(f"No response to request {request_id}")
+        finally:
+            with self.pending_lock:
+                self.pending.pop(request_id, None)
+
+        if pending.response is None:
+            raise ConnectionError("Connection closed before response was received")
+        return pending.response, pending.body
+
+    def close(self):
+        with self.pending_lock:
+            self.closed.set()
+            pending, self.pending = self.pending, {}
+
+        for response in pending.values():
+            response.received.set()
+
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+
+    def __read_responses(self):
+        try:
+            while True:
+                frame = recv_frame(self.socket)
+                if frame is None:
+                    break
+
+                request_id, payload, body = frame
+                with self.pending_lock:
+                    pending = self.pending.get(request_id)
+
+                if pending is not None:
+                    pending.response = json.loads(payload)
+                    pending.body = body
+                    pending.received.set()
+        except (OSError, ValueError) as e:
+            logger.debug(f"Connection reader stopped: {e}")
+        finally:
+            self.close()
+
+
+class ConnectionPool:
+    """Keeps one connection per target node, reopening closed ones"""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.connections: dict[tuple[str, int], Connection] = {}
+
+    def get(self, host: str, port: int, timeout: float) -> Connection:
+        with self.lock:
+            connection = self.connections.get((host, port))
+            if connection is None or connection.closed.is_set():
+                connection = Connection(host, port, timeout)
+                self.connections[(host, port)] = connection
+            return connection
+
+    def discard(self, host: str, port: int):
+        with self.lock:
+            connection = self.connections.pop((host, port), None)
+
+        if connection is not None:
+            connection.close()
+
+    def close_all(self):
+        with self.lock:
+            connections, self.connections = self.connections, {}
+
+        for connection in connections.values():
+            connection.close()
+
+
+connection_pool = ConnectionPool()
+# Heartbeats have their own connections, so they are not answered only
+# after long requests sent before them
+heartbeat_connection_pool = ConnectionPool()
+
+
+class AsyncConnection:
+    """Asyncio version of Connection, must be used from a single event loop"""
+
+    def __init__(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.pending: dict[int, asyncio.Future] = {}
+        self.request_ids = itertools.count()
+        self.closed = False
+        self.reader_task = asyncio.create_task(self.__read_responses())
+
+    @staticmethod
+    async def open(host: str, port: int, timeout: float) -> "AsyncConnection":
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout
+        )
+        return AsyncConnection(reader, writer)
+
+    async def request(self, payload: dict[str, Any], timeout: float) -> dict[str, Any]:
+        if self.closed:
+            raise ConnectionError("Connection is closed")
+
+        request_id = next(self.request_ids)
+        response = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = response
+
+        try:
+            try:
+                await write_frame(self.writer, request_id, json.dumps(payload).encode())
+            except OSError as e:
+                self.close()
+                raise ConnectionError(f"Cannot send request {request_id}: {e!r}")
+            return await asyncio.wait_for(response, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"No response to request {request_id}")
+        finally:
+            self.pending.pop(request_id, None)
+
+    def close(self):
+        self.closed = True
+        pending, self.pending = self.pending, {}
+        for response in pending.values():
+            if not response.done():
+                response.set_exception(
+                    ConnectionError("Connection closed before response was received")
+                )
+        self.writer.close()
+
+    async def __read_responses(self):
+        try:
+            while True:
+                frame = await read_frame(self.reader)
+                if frame is None:
+                    break
+
+                request_id, payload, _ = frame
+                response = self.pending.get(request_id)
+                if response is not None and not response.done():
+                    response.set_result(json.loads(payload))
+        except (OSError, ValueError) as e:
+            logger.debug(f"Connection reader stopped: {e}")
+        finally:
+            self.close()
+
+
+class AsyncConnectionPool:
+    """Asyncio version of ConnectionPool"""
+
+    def __init__(self) -> None:
+        self.connections: dict[tuple[str, int], AsyncConnection] = {}
+        self.opening: dict[tuple[str, int], asyncio.Lock] = {}
+
+    async def get(self, host: str, port: int, timeout: float) -> AsyncConnection:
+        lock = self.opening.setdefault((host, port), asyncio.Lock())
+        async with lock:
+            connection = self.connections.get((host, port))
+            if connection is None or connection.closed:
+                connection = await AsyncConnection.open(host, port, timeout)
+                self.connections[(host, port)] = connection
+            return connection
+
+    def discard(self, host: str, port: int):
+        connection = self.connections.pop((host, port), None)
+        if connection is not None:
+            connection.close()
+
+    def close_all(self):
+        connections, self.connections = self.connections, {}
+        for connection in connections.values():
+            connection.close()
+
+
+async_connection_pool = AsyncConnectionPool()
+async_heartbeat_connection_pool = AsyncConnectionPool()
@@ -0,0 +1,157 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Optional
+
+from communicator import DEFAULT_TIMEOUT
+from loguru import logger
+from protocol import connection_pool
+
+# Files are fetched in chunks, so a single response never holds a whole file
+FETCH_CHUNK_SIZE = 4 * 1024 * 1024
+MAX_PARALLEL_FETCHES = 8
+# Interval of polling master for new map outputs in pipelined jobs
+POLL_INTERVAL = 0.2
+MAX_FETCH_FAILURES = 10
+
+# Source of shuffle data: {"host", "port", "path"} of a file
+# served by the shuffle service of worker which wrote it
+Source = dict[str, Any]
+
+
+class FetchError(ConnectionError):
+    """Source cannot be fetched, e.g. its worker was lost with the file"""
+
+    # Source defaults to None, so that the error can be unpickled
+    def __init__(self, message: str, source: Optional[Source] = None) -> None:
+        super().__init__(message)
+        self.source = source
+
+
+def fetch_file(
+    host: str, port: int, path: str, destination: str, timeout: float = DEFAULT_TIMEOUT
+):
+    """Downloads file served by shuffle service of worker at host:port"""
+    data: dict[str, Any] = {"path": path}
+    command = {"host": "", "port": 0, "name": "fetch", "data": data}
+
+    connection = connection_pool.get(host, port, timeout)
+    with open(destination, "wb") as file:
+        offset = 0
+        while True:
+            data.update(offset=offset, length=FETCH_CHUNK_SIZE)
+            response, body = connection.request_with_body(command, timeout)
+            if response.get("status") != "ACCEPT":
+                raise ConnectionError(
+                    f"Cannot fetch {path} from {host}:{port}: {response.get('error')}"
+                )
+
+            file.write(body)
+            offset += len(body)
+            if len(body) < FETCH_CHUNK_SIZE:
+                return
+
+
+def fetch_sources(
+    sources: dict[int, Source],
+    destination_prefix: str,
+    local_address: Optional[tuple[str, int]] = None,
+) -> dict[int, tuple[str, bool]]:
+    """
+    Fetches sources, keyed by map task, from their workers in parallel.
+    Sources written by worker at local_address and sources without host,
+    which are on storage shared by all nodes, are read in place.
+
+    Returns (path, fetched) of every source, fetched files are
+    temporary and should be removed by caller.
+    """
+    local = tuple(local_address) if local_address is not None else None
+
+    paths: dict[int, tuple[str, bool]] = {}
+    fetches: list[tuple[Source, str]] = []
+    for index, source in sources.items():
+        if not source["host"] or (source["host"], source["port"]) == local:
+            paths[index] = (source["path"], False)
+        else:
+            destination = f"{destination_prefix}.fetch{index}"
+            fetches.append((source, destination))
+            paths[index] = (destination, True)
+
+    try:
+        with ThreadPoolExecutor(MAX_PARALLEL_FETCHES) as executor:
+            futures = [
+                executor.submit(
+                    fetch_file,
+                    source["host"],
+                    source["port"],
+                    source["path"],
+                    destination,
+                )
+                for source, destination in fetches
+            ]
+            for (source, _), future in zip(fetches, futures):
+                try:
+                    future.result()
+                except (OSError, TimeoutError) as e:
+                    raise FetchError(
+                        f"Cannot fetch {source['path']} from "
+                        f"{source['host']}:{source['port']}: {e!r}",
+                        source,
+                    ) from e
+    except Exception:
+        remove_fetched(paths.values())
+        raise
+
+    return paths
+
+
+def fetch_incrementally(
+    poll: Callable[[], dict[str, Any]],
+    destination_prefix: str,
+    local_address: Optional[tuple[str, int]] = None,
+) -> list[tuple[str, bool]]:
+    """
+    Fetches map outputs as soon as map tasks complete, until outputs of
+    all map tasks are fetched. poll returns state of map stage:
+        {"outputs": {index: source}, "map_tasks": count, "map_finished": bool}
+    where map_tasks is None until map stage is started.
+
+    Fetch failures are retried on next polls, as outputs of lost workers
+    are produced again by rescheduled map tasks.
+    """
+    fetched: dict[int, tuple[str, bool]] = {}
+    failures = 0
+    try:
+        while True:
+            state = poll()
+            new_sources = {
+                int(index): source
+                for index, source in state["outputs"].items()
+                if int(index) not in fetched
+            }
+
+            try:
+                fetched.update(
+                    fetch_sources(new_sources, destination_prefix, local_address)
+                )
+            except (OSError, TimeoutError) as e:
+                failures += 1
+                if failures >= MAX_FETCH_FAILURES:
+                    raise
+                logger.warning(f"Fetching map outputs failed, retrying: {e!r}")
+
+            if len(fetched) == state["map_tasks"]:
+                return [fetched[index] for index in sorted(fetched)]
+            if state["map_finished"] and not new_sources:
+                raise RuntimeError("Map stage finished without all outputs")
+
+            time.sleep(POLL_INTERVAL)
+    except Exception:
+        remove_fetched(fetched.values())
+        raise
+
+
+def remove_fetched(paths: Iterable[tuple[str, bool]]):
+    for path, fetched in paths:
+        if fetched and os.path.exists(path):
+            os.remove(path)
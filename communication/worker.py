@@ -1,13 +1,27 @@
 import threading
-from queue import Queue
-from typing import Any
+import uuid
+from typing import Any, Optional
 
 from communicator import DEFAULT_TIMEOUT, Communicator
+from heartbeat import WorkerHealth
+
+from mapreduce.function_registry import function_digest
+
+
+class RunningTask:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Optional[dict[str, Any]] = None
 
 
 class Worker(Communicator):
     def __init__(
-        self, self_host: str, self_port: int, target_host: str, target_port: int
+        self,
+        self_host: str,
+        self_port: int,
+        target_host: str,
+        target_port: int,
+        slots: int = 1,
     ):
         self.self_host = self_host
         self.self_port = self_port
@@ -15,27 +29,119 @@ class Worker(Communicator):
         self.target_port = target_port
 
         self.timeout: int = DEFAULT_TIMEOUT
-        self.task_done: threading.Event = threading.Event()
-        self.last_results: Queue[dict[str, Any]] = Queue()
+        self.slots = slots
+        self.running_tasks: dict[str, RunningTask] = {}
+        self.running_tasks_lock = threading.Lock()
+        self.registered_functions: set[str] = set()
+        self.registration_lock = threading.Lock()
+        self.health = WorkerHealth()
+
+    def start_task(self) -> str:
+        task_id = uuid.uuid4().hex
+        with self.running_tasks_lock:
+            self.running_tasks[task_id] = RunningTask()
+        return task_id
+
+    def put_task_result(self, task_id: str, data: dict[str, Any]):
+        # Worker has evicted these functions, they are registered again on retry
+        self.registered_functions.difference_update(data.get("missing_functions", []))
+
+        with self.running_tasks_lock:
+            task = self.running_tasks.get(task_id)
+
+        if task is not None:
+            task.result = data
+            task.done.set()
+
+    def wait_task(self, task_id: str, timeout: float) -> Optional[dict[str, Any]]:
+        """
+        Returns task result or None on timeout.
+        Task timed out is still running and may be waited for again.
+        """
+        with self.running_tasks_lock:
+            task = self.running_tasks[task_id]
+
+        if not task.done.wait(timeout):
+            return None
+
+        self.forget_task(task_id)
+        return task.result
 
-    def put_last_result(self, data: dict[str, Any]):
-        self.last_results.put(data)
+    def forget_task(self, task_id: str):
+        with self.running_tasks_lock:
+            self.running_tasks.pop(task_id, None)
 
-    def get_last_result(self) -> dict[str, Any]:
-        return self.last_results.get()
+    def fail_running_tasks(self, error: str):
+        """Wakes up everyone waiting for tasks of this worker"""
+        with self.running_tasks_lock:
+            tasks = list(self.running_tasks.values())
 
-    def ping(self) -> bool:
-        return self.communicate("ping")
+        for task in tasks:
+            task.result = {"error": error}
+            task.done.set()
+
+    @property
+    def load(self) -> float:
+        """Fraction of slots running tasks"""
+        return len(self.running_tasks) / self.slots
+
+    def ping(self, timeout: Optional[float] = None) -> bool:
+        return self.communicate("ping", timeout=timeout)
 
     def terminate(self) -> bool:
         return self.communicate("terminate")
 
-    def map(self, map_function: str, filename: str) -> bool:
-        return self.communicate(
-            "map", {"map_function": map_function, "filename": filename}
-        )
+    def discard_task(self, task_id: str) -> bool:
+        """Removes outputs of task attempt which lost to another attempt"""
+        return self.communicate("discard", {"task_id": task_id})
+
+    def job_done(self, job_dir: str, keep: list[str]) -> bool:
+        """Removes outputs of tasks of the job, except keep"""
+        data = {"job_dir": job_dir, "keep": keep}
+        return self.communicate("job_done", data)
+
+    def register_function(self, source: str) -> Optional[str]:
+        """Sends function source to worker once, returns its digest"""
+        digest = function_digest(source)
+        with self.registration_lock:
+            if digest in self.registered_functions:
+                return digest
+
+            data = {"digest": digest, "source": source}
+            if not self.communicate("register_function", data):
+                return None
+
+            self.registered_functions.add(digest)
+        return digest
+
+    def map(
+        self,
+        map_function: str,
+        split: dict[str, Any],
+        combine_function: Optional[str] = None,
+        **options: Any,
+    ) -> bool:
+        functions = {"map_function": map_function, "combine_function": combine_function}
+        return self.__run_task("map", functions, {"split": split, **options})
+
+    def reduce(self, reduce_function: str, filename: str, **options: Any) -> bool:
+        functions: dict[str, Optional[str]] = {"reduce_function": reduce_function}
+        return self.__run_task("reduce", functions, {"filename": filename, **options})
+
+    def __run_task(
+        self,
+        command_name: str,
+        functions: dict[str, Optional[str]],
+        data: dict[str, Any],
+    ) -> bool:
+        """Task commands carry only digests of (registered) functions"""
+        for name, source in functions.items():
+            if source is None:
+                continue
+
+            digest = self.register_function(source)
+            if digest is None:
+                return False
+            data[f"{name}_digest"] = digest
 
-    def reduce(self, reduce_function: str, filename: str):
-        return self.communicate(
-            "reduce", {"reduce_function": reduce_function, "filename": filename}
-        )
+        return self.communicate(command_name, data)
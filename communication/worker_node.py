@@ -1,111 +1,326 @@
-import json
+import argparse
+import multiprocessing
 import os
 import threading
-from typing import Any, Optional
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional
 
 from command_validator import CommandValidator
-from event_handler import event_handler
+from event_handler import event_handler, query_handler
 from loguru import logger
 from master import Master
 from master_node import MASTER_HOST, MASTER_PORT
 from node import Node
 
-from mapreduce.map_task import MapTask
-from mapreduce.reduce_task import ReduceTask
+# Imported from the package like in task_runner, which raises its errors
+from communication.shuffle import FetchError, fetch_incrementally
+from mapreduce import task_runner
+from mapreduce.function_registry import LRUCache
+from mapreduce.input_split import InputSplit
+
+DEFAULT_SLOTS = os.cpu_count() or 1
+FINISHED_TASKS_SIZE = 1024
+# Master which stopped pinging for this long is connected again, so
+# a restarted master gets its workers back
+MASTER_TIMEOUT = 10.0
+MASTER_CHECK_INTERVAL = 2.0
 
 
 class WorkerNode(Node):
-    def __init__(self, host: str, port: int) -> None:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        slots: int = DEFAULT_SLOTS,
+        data_dir: Optional[str] = None,
+    ) -> None:
         super().__init__(host, port)
         self.master: Optional[Master] = None
+        self.last_ping = time.monotonic()
+
+        # Task outputs are written to data_dir (e.g. local disk) if set,
+        # otherwise next to task inputs, in directory of their job if given
+        self.data_dir = data_dir
+        if data_dir is not None:
+            os.makedirs(data_dir, exist_ok=True)
+
+        # Sources of user functions registered by master, by their digest
+        self.functions: LRUCache[str] = LRUCache()
+
+        # Outputs of finished tasks, removed if master discards the task
+        self.finished_tasks: LRUCache[list[str]] = LRUCache(FINISHED_TASKS_SIZE)
+        # Discarded tasks still running, or never received if master lost them
+        self.discarded_tasks: LRUCache[bool] = LRUCache(FINISHED_TASKS_SIZE)
+        self.tasks_lock = threading.Lock()
+
+        # Outputs of finished tasks served to other workers by fetch, with
+        # name of their job directory, until the job is done
+        self.shuffle_files: dict[str, Optional[str]] = {}
+
+        self.slots = slots
+        # Tasks run in separate processes, one per slot. Spawn is used
+        # since forking a multithreaded process is unsafe.
+        self.executor = ProcessPoolExecutor(
+            slots, mp_context=multiprocessing.get_context("spawn")
+        )
 
     def validate_command(self, command: dict[str, Any]) -> bool:
         return CommandValidator.validate_worker(command)
 
     def set_master(self, host: str, port: int):
-        if not self.server_created.is_set() or self.server is None:
+        if not self.server_created.is_set():
             raise Exception("Cannot set master when self server was not created")
 
-        server_host, server_port = self.server.socket.getsockname()
+        server_host, server_port = self.server_address()
         self.master = Master(server_host, server_port, host, port)
 
     def connect_master(self):
-        self.master.connect()
+        self.master.connect(self.slots)
 
     def disconnect_master(self):
         self.master.disconnect()
 
+    def watch_master(self):
+        """Connects to master again when its heartbeat pings stop"""
+        while not self.exit_flag.wait(MASTER_CHECK_INTERVAL):
+            if time.monotonic() - self.last_ping < MASTER_TIMEOUT:
+                continue
+            logger.warning("No ping from master, connecting again")
+            if self.master.connect(self.slots):
+                self.last_ping = time.monotonic()
+
     @event_handler
     def ping(self, command: dict[str, Any]):
-        pass
+        self.last_ping = time.monotonic()
 
     @event_handler
-    def map(self, command: dict[str, Any]):
-        if self.master is None:
-            raise AttributeError("Master not set.")
+    def register_function(self, command: dict[str, Any]):
+        self.functions.put(command["data"]["digest"], command["data"]["source"])
 
-        function_str: str = command["data"]["map_function"]
-        input_file: str = command["data"]["filename"]
-        output_filename = self.__output_filename(input_file, command)
+    @event_handler
+    def discard(self, command: dict[str, Any]):
+        task_id: str = command["data"]["task_id"]
+        with self.tasks_lock:
+            output_files = self.finished_tasks.get(task_id)
+            if output_files is None:
+                # Still running, outputs are removed when it finishes
+                self.discarded_tasks.put(task_id, True)
+                return
 
-        task = MapTask()
-        task.load_function(function_str)
+        self.__remove_outputs(output_files)
 
-        with open(input_file, "r") as file:
-            task.execute(input_file, file.read())
+    @event_handler
+    def job_done(self, command: dict[str, Any]):
+        """Stops serving outputs of the job and removes them, except kept ones"""
+        job = os.path.basename(command["data"]["job_dir"])
+        keep = set(command["data"]["keep"])
+        with self.tasks_lock:
+            output_files = [
+                path for path, path_job in self.shuffle_files.items() if path_job == job
+            ]
+        self.__remove_outputs([path for path in output_files if path not in keep])
+        with self.tasks_lock:
+            for path in output_files:
+                self.shuffle_files.pop(path, None)
+
+    @query_handler
+    def fetch(self, command: dict[str, Any]) -> bytes:
+        """Shuffle service, returns chunk of an output of finished task"""
+        data = command["data"]
+        with self.tasks_lock:
+            served = data["path"] in self.shuffle_files
+
+        if not served:
+            raise FileNotFoundError(f"Not an output of finished task: {data['path']}")
+
+        with open(data["path"], "rb") as file:
+            file.seek(data["offset"])
+            return file.read(data["length"])
 
-        task.store_results(output_filename)
+    @event_handler
+    def map(self, command: dict[str, Any]):
+        if self.master is None:
+            raise AttributeError("Master not set.")
 
-        logger.debug(f"Map results stored to file: {output_filename}")
-        self.master.task_done(output_filename)
+        split = InputSplit.from_dict(command["data"]["split"])
+        output_filename = self.__output_filename(split.name, command)
+        self.__submit_task(task_runner.run_map, command, output_filename)
 
     @event_handler
     def reduce(self, command: dict[str, Any]):
         if self.master is None:
             raise AttributeError("Master not set.")
 
-        function_str: str = command["data"]["reduce_function"]
         input_file: str = command["data"]["filename"]
         output_filename = self.__output_filename(input_file, command)
+        if "job_id" in command["data"]:
+            # Fetching map outputs of pipelined job does not take a slot
+            threading.Thread(
+                target=self.__fetch_and_reduce,
+                args=[command, output_filename],
+                daemon=True,
+            ).start()
+        else:
+            self.__submit_task(task_runner.run_reduce, command, output_filename)
+
+    def __fetch_and_reduce(self, command: dict[str, Any], output_filename: str):
+        if self.master is None:
+            raise AttributeError("Master not set.")
 
-        task = ReduceTask()
-        task.load_function(function_str)
-
-        with open(input_file, "r") as file:
-            data = json.load(file)
-            for key, values in data.items():
-                task.execute(key, values)
+        data = command["data"]
+        master = self.master
+        started = time.perf_counter()
+        try:
+            fetched_partitions = fetch_incrementally(
+                lambda: master.map_outputs(data["job_id"], data["partition"]),
+                output_filename,
+                (master.self_host, master.self_port),
+            )
+        except Exception as e:
+            logger.error(
+                f"Fetching map outputs of task {data['task_id']} failed: {e!r}"
+            )
+            master.task_done(None, data["task_id"], error=repr(e))
+            return
+
+        if self.exit_flag.is_set():
+            return
+
+        command = {
+            **command,
+            "data": {
+                **data,
+                "fetched_partitions": fetched_partitions,
+                "fetch_time": time.perf_counter() - started,
+            },
+        }
+        self.__submit_task(task_runner.run_reduce, command, output_filename)
+
+    def __submit_task(
+        self, task_function: Callable, command: dict[str, Any], output_filename: str
+    ):
+        if self.master is None:
+            raise AttributeError("Master not set.")
 
-        task.store_results(output_filename)
+        task_id: str = command["data"]["task_id"]
+        data = dict(command["data"])
+        digests = [v for k, v in data.items() if k.endswith("_function_digest")]
+
+        data["functions"] = {digest: self.functions.get(digest) for digest in digests}
+        data["local_address"] = (self.master.self_host, self.master.self_port)
+        data["submitted"] = time.time()
+        missing = [k for k, v in data["functions"].items() if v is None]
+        if missing:
+            logger.error(f"Task {task_id} uses unknown functions: {missing}")
+            self.master.task_done(
+                None,
+                task_id,
+                error=f"Unknown functions: {missing}",
+                missing_functions=missing,
+            )
+            return
+
+        output_files = task_runner.task_outputs(data, output_filename)
+        job = os.path.basename(data["job_dir"]) if "job_dir" in data else None
+        future = self.executor.submit(task_function, data, output_filename)
+        future.add_done_callback(
+            lambda future: self.__report_task(future, task_id, output_files, job)
+        )
+
+    def __report_task(
+        self,
+        future: Future,
+        task_id: str,
+        output_files: list[str],
+        job: Optional[str],
+    ):
+        if self.master is None:
+            raise AttributeError("Master not set.")
 
-        logger.debug(f"Map results stored to file: {output_filename}")
-        self.master.task_done(output_filename)
+        error = future.exception()
+        with self.tasks_lock:
+            discarded = self.discarded_tasks.pop(task_id) is not None
+            if error is None and not discarded:
+                self.finished_tasks.put(task_id, output_files)
+                self.shuffle_files.update(dict.fromkeys(output_files, job))
+
+        if discarded:
+            logger.info(f"Task {task_id} was discarded")
+            if error is None:
+                self.__remove_outputs(output_files)
+            return
+
+        if error is not None:
+            logger.error(f"Task {task_id} failed: {error!r}")
+            # Partial outputs are not served, retries write their own files
+            self.__remove_outputs(output_files)
+            details: dict[str, Any] = {}
+            if isinstance(error, FetchError):
+                # Master runs map tasks which wrote lost outputs again
+                details["lost_source"] = error.source
+            self.master.task_done(None, task_id, error=repr(error), **details)
+            return
+
+        output_file, metrics = future.result()
+        logger.debug(f"Task results stored to file: {output_file}")
+        self.master.task_done(output_file, task_id, metrics=metrics)
+
+    def __remove_outputs(self, output_files: list[str]):
+        with self.tasks_lock:
+            for output_file in output_files:
+                self.shuffle_files.pop(output_file, None)
+
+        for output_file in output_files:
+            if os.path.exists(output_file):
+                os.remove(output_file)
 
     def __output_filename(self, input_filename: str, command: dict[str, Any]) -> str:
         node_name: str = ""
         if self.master:
             node_name = f"{self.master.self_host}_{self.master.self_port}"
 
-        filename = f"{command['name']}_{node_name}_{os.path.basename(input_filename)}"
-        return f"{os.path.dirname(input_filename)}/{filename}"
+        # Attempts of a task retried on the same worker must not share files
+        task_id: str = command["data"]["task_id"]
+        input_name = os.path.basename(input_filename)
+        filename = f"{command['name']}_{node_name}_{task_id}_{input_name}"
+        job_dir: Optional[str] = command["data"].get("job_dir")
+        if job_dir is None:
+            return f"{self.data_dir or os.path.dirname(input_filename)}/{filename}"
+
+        if self.data_dir is not None:
+            job_dir = f"{self.data_dir}/{os.path.basename(job_dir)}"
+        os.makedirs(job_dir, exist_ok=True)
+        return f"{job_dir}/{filename}"
 
 
-def run_worker_thread(worker: WorkerNode):
+def run_worker_thread(
+    worker: WorkerNode, master_host: str = MASTER_HOST, master_port: int = MASTER_PORT
+):
     worker.run_server()
     worker.wait_server_initialized()
 
-    worker.set_master(host=MASTER_HOST, port=MASTER_PORT)
+    worker.set_master(host=master_host, port=master_port)
     worker.connect_master()
+    threading.Thread(target=worker.watch_master, daemon=True).start()
 
     worker.main_loop()
 
     worker.disconnect_master()
+    worker.executor.shutdown()
     worker.shutdown_server()
     worker.wait_finished()
 
 
 if __name__ == "__main__":
-    worker = WorkerNode("localhost", 0)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slots", type=int, default=DEFAULT_SLOTS)
+    parser.add_argument(
+        "--data-dir", help="directory for task outputs, e.g. local disk"
+    )
+    args = parser.parse_args()
+
+    worker = WorkerNode("localhost", 0, args.slots, args.data_dir)
     worker_thread = threading.Thread(target=run_worker_thread, args=[worker])
     worker_thread.start()
 
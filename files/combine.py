@@ -0,0 +1,18 @@
+""" Combine function template, enter your code below '### START ###' """
+
+
+def emit(v: str) -> None:
+    """
+    Combine stage runs on map results of a single task, before they are stored:
+        (k2,list(v2)) -> list(v2)
+    """
+    return None
+
+
+key = ""  # key
+values = ""  # values associated with key by a single map task
+
+### User code:
+### START ###
+result = sum(int(value) for value in values)
+emit(str(result))
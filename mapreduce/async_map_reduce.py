@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import os
+import time
+from typing import TYPE_CHECKING, Any, Optional
+
+import attr
+from loguru import logger
+
+from mapreduce.map_reduce import MAX_TASK_FAILS, MapReduce
+from mapreduce.scheduler import WAIT_INTERVAL, AsyncFairScheduler
+from mapreduce.stage import Stage, TaskOutput
+from mapreduce.task_timeouts import TaskTimeouts
+
+if TYPE_CHECKING:
+    from communication.async_worker import AsyncWorker
+
+
+@attr.s(auto_attribs=True)
+class AsyncMapReduce(MapReduce):
+    """
+    MapReduce with stages scheduled on an asyncio event loop.
+
+    Every worker slot is served by a coroutine instead of a thread,
+    blocking shuffle work runs in the default executor.
+    """
+
+    scheduler: AsyncFairScheduler = attr.ib(factory=AsyncFairScheduler, repr=False)
+
+    def run(self, workers: list[AsyncWorker]):  # type: ignore[override]
+        raise RuntimeError("AsyncMapReduce has to be started with run_async")
+
+    async def run_async(self, workers: list[AsyncWorker]) -> list[str]:
+        # Journal is synced to disk, which must not block the loop
+        loop = asyncio.get_running_loop()
+        os.makedirs(self.job_dir, exist_ok=True)
+        await loop.run_in_executor(None, self.open_journal)
+        try:
+            results = await self.__run_async(workers)
+            await loop.run_in_executor(None, self.log_results, results)
+        except Exception:
+            if not self.journaled:
+                await self.remove_outputs_async(workers, keep=[])
+            raise
+        finally:
+            self.scheduler.remove_job(self.job_id)
+            await loop.run_in_executor(None, self.close_journal)
+            await loop.run_in_executor(None, self.remove_intermediates)
+        await self.remove_outputs_async(workers, keep=results)
+        await loop.run_in_executor(None, self.store_metrics)
+        return results
+
+    async def remove_outputs_async(self, workers: list[AsyncWorker], keep: list[str]):
+        """See MapReduce.remove_outputs"""
+        await asyncio.gather(
+            *[
+                worker.job_done(self.job_dir, keep)
+                for worker in workers
+                if worker.health.alive
+            ]
+        )
+
+    async def __run_async(self, workers: list[AsyncWorker]) -> list[str]:
+        loop = asyncio.get_running_loop()
+        state = self.journal_state
+        if state is not None and state.results is not None:
+            logger.info(f"Job {self.job_id} already finished")
+            return state.results
+
+        # Planning partitions runs map function on samples of input
+        map_tasks = await loop.run_in_executor(
+            None, self.stage_tasks, "map", lambda: self.map_tasks(workers)
+        )
+        if self.pipelined:
+            reduce_tasks = self.stage_tasks("reduce", self.pipelined_reduce_tasks)
+            # Reducers fail soon after failed map stage, whose error is raised
+            map_results, results = await asyncio.gather(
+                self.run_stage("map", workers, map_tasks),
+                self.run_stage("reduce", workers, reduce_tasks),
+                return_exceptions=True,
+            )
+            if isinstance(map_results, BaseException):
+                raise map_results
+            if isinstance(results, BaseException):
+                raise results
+            logger.info(f"Map and reduce done")
+            return await loop.run_in_executor(None, self.merge_hot_keys, results)
+
+        cached = await loop.run_in_executor(None, self.cached_map_outputs, map_tasks)
+        map_results = await self.run_stage("map", workers, map_tasks, cached)
+        await loop.run_in_executor(None, self.store_map_outputs, map_tasks, cached)
+        logger.info(f"Map done")
+
+        if self.partitioned:
+            tasks = self.stage_tasks(
+                "reduce", lambda: self.partitioned_reduce_tasks(workers)
+            )
+            results = await self.run_stage("reduce", workers, tasks)
+            logger.info(f"Reduce done")
+            return await loop.run_in_executor(None, self.merge_hot_keys, results)
+
+        tasks = await loop.run_in_executor(
+            None,
+            self.stage_tasks,
+            "reduce",
+            lambda: self.reduce_tasks(self.shuffle(map_results), workers),
+        )
+        results = await self.run_stage("reduce", workers, tasks)
+        logger.info(f"Reduce done")
+        return await loop.run_in_executor(None, self.merge_hot_keys, results)
+
+    async def run_stage(
+        self,
+        stage: str,
+        workers: list[AsyncWorker],
+        stage_tasks: list[dict[str, Any]],
+        completed: Optional[dict[int, TaskOutput]] = None,
+    ) -> list[TaskOutput]:
+        if stage not in ["map", "reduce"]:
+            raise RuntimeError("Invalid stage: " + stage)
+
+        loop = asyncio.get_running_loop()
+        tasks = await loop.run_in_executor(
+            None, self.create_stage, stage, stage_tasks, workers, completed
+        )
+        started = time.monotonic()
+        await self.__run_tasks(stage, workers, tasks)
+        for reruns in itertools.count():
+            map_stage = self.lost_map_stage(tasks, reruns)
+            if map_stage is None:
+                break
+            await self.__run_tasks("map", workers, map_stage)
+            tasks.suspended = not map_stage.done
+            await self.__run_tasks(stage, workers, tasks)
+
+        self.finish_stage(stage, tasks, started)
+        await loop.run_in_executor(None, self.log_stage_done, stage, tasks)
+        return tasks.results
+
+    async def __run_tasks(self, stage: str, workers: list[AsyncWorker], tasks: Stage):
+        tasks_changed = asyncio.Condition()
+        timeouts = TaskTimeouts(
+            self.task_timeout, pause_while=self.waiting_for_map(stage)
+        )
+        await asyncio.gather(
+            *[
+                self.__process_tasks(stage, worker, tasks, tasks_changed, timeouts)
+                for worker in workers
+                for _ in range(worker.slots)
+            ]
+        )
+
+    async def __process_tasks(
+        self,
+        stage: str,
+        worker: AsyncWorker,
+        tasks: Stage,
+        tasks_changed: asyncio.Condition,
+        timeouts: TaskTimeouts,
+    ):
+        """See MapReduce.next_attempt"""
+        loop = asyncio.get_running_loop()
+        stage_function: str = getattr(self, f"{stage}_function")
+        worker_function = getattr(worker, stage)
+
+        fails = 0
+        while fails < MAX_TASK_FAILS:
+            async with tasks_changed:
+                attempt = self.next_attempt(worker, tasks)
+                while attempt is None and not self.slot_finished(worker, tasks):
+                    await tasks_changed.wait()
+                    attempt = self.next_attempt(worker, tasks)
+
+                if attempt is None:
+                    tasks_changed.notify_all()
+                    return
+
+            index, task, task_id = attempt
+            slot = self.scheduler.slot_async(
+                worker, self.job_id, self.uses_slots(stage)
+            )
+            async with slot as granted:
+                started = time.monotonic()
+                if not granted or not await worker_function(
+                    stage_function, **self.attempt_data(stage, task, task_id)
+                ):
+                    worker.forget_task(task_id)
+                    result = None
+                elif not self.uses_slots(stage):
+                    result = await self.__wait_pipelined_task(
+                        worker, task_id, index, tasks, tasks_changed, timeouts
+                    )
+                else:
+                    result = await self.__wait_task(
+                        worker, task_id, index, tasks, tasks_changed, timeouts
+                    )
+
+            async with tasks_changed:
+                finished = self.finish_attempt(
+                    stage, worker, tasks, index, task_id, result
+                )
+                tasks_changed.notify_all()
+
+            if finished.failed:
+                fails += 1
+            elif result is not None and "output" in result:
+                timeouts.observe(time.monotonic() - started)
+            if finished.output is not None:
+                # Journal is synced to disk, which must not block the loop
+                await loop.run_in_executor(
+                    None, self.log_task, stage, index, finished.output
+                )
+
+            for attempt_worker, attempt_id in finished.discarded:
+                logger.info(f"Discarding attempt on worker: {attempt_worker}")
+                attempt_worker.put_task_result(attempt_id, {"discarded": True})
+                await attempt_worker.discard_task(attempt_id)
+
+    async def __wait_pipelined_task(
+        self,
+        worker: AsyncWorker,
+        task_id: str,
+        index: int,
+        tasks: Stage,
+        tasks_changed: asyncio.Condition,
+        timeouts: TaskTimeouts,
+    ) -> Optional[dict[str, Any]]:
+        """See MapReduce.__wait_pipelined_task"""
+        while not self.map_finished:
+            result = await worker.wait_task(task_id, WAIT_INTERVAL)
+            if result is not None:
+                return result
+
+        async with self.scheduler.slot_async(worker, self.job_id) as granted:
+            if not granted:
+                worker.forget_task(task_id)
+                return None
+            return await self.__wait_task(
+                worker, task_id, index, tasks, tasks_changed, timeouts
+            )
+
+    async def __wait_task(
+        self,
+        worker: AsyncWorker,
+        task_id: str,
+        index: int,
+        tasks: Stage,
+        tasks_changed: asyncio.Condition,
+        timeouts: TaskTimeouts,
+    ) -> Optional[dict[str, Any]]:
+        expirations = 0
+        while True:
+            timeout = timeouts.timeout
+            result = await worker.wait_task(task_id, timeout)
+            if result is not None:
+                return result
+            if timeouts.paused:
+                continue
+
+            expirations += 1
+            async with tasks_changed:
+                waiting = self.attempt_expired(
+                    worker, index, tasks, timeout, expirations
+                )
+                tasks_changed.notify_all()
+            if not waiting:
+                worker.forget_task(task_id)
+                return None
@@ -0,0 +1,167 @@
+import bz2
+import io
+import lzma
+import struct
+import zlib
+from typing import BinaryIO, Optional
+
+# Compressed files are sequences of blocks, each holding BLOCK_SIZE bytes
+# of data: unsigned 32-bit big endian length, compressed block
+BLOCK_SIZE = 256 * 1024
+BLOCK_HEADER = struct.Struct("!I")
+
+
+class Codec:
+    """
+    Compression of intermediate files. Data is compressed in independent
+    blocks, so files are written and read as streams. New codecs only
+    implement compress and decompress of a block and are added to CODECS.
+    """
+
+    name: str = ""
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError()
+
+    def decompress(self, data: bytes) -> bytes:
+        raise NotImplementedError()
+
+    def open(self, filename: str, mode: str) -> BinaryIO:
+        """Opens file for streaming read ("rb") or write ("wb")"""
+        if mode == "rb":
+            return io.BufferedReader(BlockReader(open(filename, "rb"), self))  # type: ignore[return-value]
+        if mode == "wb":
+            return BlockWriter(open(filename, "wb"), self)  # type: ignore[return-value]
+        raise ValueError(f"Unsupported mode: {mode}")
+
+    @staticmethod
+    def from_name(name: str) -> "Codec":
+        try:
+            return CODECS[name]()
+        except KeyError:
+            raise ValueError(f"Unknown compression: {name}")
+
+
+class NoCodec(Codec):
+    name = "none"
+
+    def compress(self, data: bytes) -> bytes:
+        return data
+
+    def decompress(self, data: bytes) -> bytes:
+        return data
+
+    def open(self, filename: str, mode: str) -> BinaryIO:
+        return open(filename, mode)  # type: ignore[return-value]
+
+
+class ZlibCodec(Codec):
+    """Fast, moderate ratio"""
+
+    name = "zlib"
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, 6)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class Bz2Codec(Codec):
+    name = "bz2"
+
+    def compress(self, data: bytes) -> bytes:
+        return bz2.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return bz2.decompress(data)
+
+
+class LzmaCodec(Codec):
+    """Slow, best ratio"""
+
+    name = "lzma"
+
+    def compress(self, data: bytes) -> bytes:
+        return lzma.compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return lzma.decompress(data)
+
+
+class BlockWriter(io.RawIOBase):
+    """Buffers written data and writes it as compressed blocks"""
+
+    def __init__(self, file: BinaryIO, codec: Codec):
+        self.file = file
+        self.codec = codec
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:  # type: ignore[override]
+        self.buffer += data
+        if len(self.buffer) >= BLOCK_SIZE:
+            self.__write_block()
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            if self.buffer:
+                self.__write_block()
+            self.file.close()
+        super().close()
+
+    def __write_block(self):
+        block = self.codec.compress(bytes(self.buffer))
+        self.file.write(BLOCK_HEADER.pack(len(block)) + block)
+        self.buffer = bytearray()
+
+
+class BlockReader(io.RawIOBase):
+    """Reads blocks of file written by BlockWriter, decompressing them"""
+
+    def __init__(self, file: BinaryIO, codec: Codec):
+        self.file = file
+        self.codec = codec
+        self.block = b""
+        self.position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:  # type: ignore[override]
+        if self.position >= len(self.block):
+            block = self.__read_block()
+            if block is None:
+                return 0
+            self.block, self.position = block, 0
+
+        size = min(len(buffer), len(self.block) - self.position)
+        buffer[:size] = self.block[self.position : self.position + size]
+        self.position += size
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+        super().close()
+
+    def __read_block(self) -> Optional[bytes]:
+        header = self.file.read(BLOCK_HEADER.size)
+        if not header:
+            return None
+
+        (length,) = BLOCK_HEADER.unpack(header)
+        return self.codec.decompress(self.file.read(length))
+
+
+CODECS: dict[str, type[Codec]] = {
+    NoCodec.name: NoCodec,
+    ZlibCodec.name: ZlibCodec,
+    Bz2Codec.name: Bz2Codec,
+    LzmaCodec.name: LzmaCodec,
+}
+
+DEFAULT_COMPRESSION = NoCodec.name
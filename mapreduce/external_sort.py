@@ -0,0 +1,116 @@
+import heapq
+import itertools
+import os
+import sys
+from operator import itemgetter
+from typing import Iterable, Iterator, Sequence
+
+import attr
+
+from mapreduce.compression import Codec, NoCodec
+from mapreduce.serialization import BinarySerializer, Serializer
+
+DEFAULT_MEMORY_LIMIT = 64 * 1024 * 1024
+DEFAULT_MERGE_FACTOR = 64
+
+# Approximate size of the tuple holding a single (key, value) record
+RECORD_OVERHEAD = 64
+
+
+@attr.s(auto_attribs=True)
+class ExternalSorter:
+    """
+    Sorts (key, value) records that do not fit in memory.
+
+    Records are buffered until memory_limit (estimated bytes) is reached,
+    then sorted by key and spilled to a run file. Runs are k-way merged
+    with heapq, at most merge_factor files at once. Records with equal
+    keys keep their insertion order.
+    """
+
+    run_prefix: str
+    memory_limit: int = DEFAULT_MEMORY_LIMIT
+    merge_factor: int = DEFAULT_MERGE_FACTOR
+    serializer: Serializer = attr.Factory(BinarySerializer)
+    codec: Codec = attr.Factory(NoCodec)
+
+    runs: list[str] = attr.ib(factory=list, init=False)
+    buffer: list[tuple[str, str]] = attr.ib(factory=list, init=False)
+    buffer_size: int = attr.ib(default=0, init=False)
+    run_counter: int = attr.ib(default=0, init=False)
+
+    def add(self, key: str, value: str):
+        self.buffer.append((key, value))
+        self.buffer_size += sys.getsizeof(key) + sys.getsizeof(value) + RECORD_OVERHEAD
+
+        if self.buffer_size >= self.memory_limit:
+            self.spill()
+
+    def add_all(self, records: Iterable[Sequence[str]]):
+        for key, value in records:
+            self.add(key, value)
+
+    def spill(self):
+        if not self.buffer:
+            return
+
+        self.buffer.sort(key=itemgetter(0))
+        self.runs.append(self.__write_run(self.buffer))
+        self.buffer = []
+        self.buffer_size = 0
+
+    def sorted(self) -> Iterator[tuple[str, str]]:
+        self.spill()
+
+        while len(self.runs) > self.merge_factor:
+            merged_runs: list[str] = []
+            for i in range(0, len(self.runs), self.merge_factor):
+                runs = self.runs[i : i + self.merge_factor]
+                merged_runs.append(self.__write_run(self.__merge(runs)))
+                self.__remove(runs)
+            self.runs = merged_runs
+
+        return self.__merge(self.runs)
+
+    def grouped(self) -> Iterator[tuple[str, list[str]]]:
+        for key, values in self.streamed_groups():
+            yield key, list(values)
+
+    def streamed_groups(self) -> Iterator[tuple[str, Iterator[str]]]:
+        """
+        Like grouped, but values are read lazily, so a key may have more
+        values than fit in memory. Values of a key are no longer available
+        once the next key is requested.
+        """
+        for key, records in itertools.groupby(self.sorted(), key=itemgetter(0)):
+            yield key, (value for _, value in records)
+
+    def cleanup(self):
+        self.__remove(self.runs)
+        self.runs = []
+        self.buffer = []
+        self.buffer_size = 0
+
+    def __merge(self, runs: list[str]) -> Iterator[tuple[str, str]]:
+        return heapq.merge(*[self.__read_run(run) for run in runs], key=itemgetter(0))
+
+    def __write_run(self, records: Iterable[tuple[str, str]]) -> str:
+        run_filename = f"{self.run_prefix}.run{self.run_counter}"
+        self.run_counter += 1
+
+        with self.codec.open(run_filename, "wb") as run_file:
+            for key, value in records:
+                self.serializer.write(run_file, [key, value])
+
+        return run_filename
+
+    def __read_run(self, run_filename: str) -> Iterator[tuple[str, str]]:
+        with self.codec.open(run_filename, "rb") as run_file:
+            for key, value in self.serializer.read(run_file):
+                yield key, value
+
+    @staticmethod
+    def __remove(runs: list[str]):
+        for run in runs:
+            if os.path.exists(run):
+                os.remove(run)
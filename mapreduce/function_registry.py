@@ -0,0 +1,47 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Generic, Hashable, Optional, TypeVar
+
+DEFAULT_REGISTRY_SIZE = 256
+
+V = TypeVar("V")
+
+
+def function_digest(source: str) -> str:
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+class LRUCache(Generic[V]):
+    """Thread safe mapping evicting least recently used items above max_size"""
+
+    def __init__(self, max_size: int = DEFAULT_REGISTRY_SIZE) -> None:
+        self.max_size = max_size
+        self.items: OrderedDict[Hashable, V] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self.lock:
+            if key not in self.items:
+                return None
+            self.items.move_to_end(key)
+            return self.items[key]
+
+    def put(self, key: Hashable, value: V):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[V]:
+        with self.lock:
+            return self.items.pop(key, None)
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self.lock:
+            return key in self.items
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.items)
@@ -0,0 +1,124 @@
+import csv
+import glob
+import itertools
+import json
+import os
+import re
+from typing import Any, Iterable, Iterator
+
+# Intermediate files of jobs are kept in directories with this prefix
+# next to their input, files inside them are not input
+JOB_DIR_PREFIX = "job_"
+# Names of job directories, job ids are uuid4 hex digests
+JOB_DIR_NAME = re.compile(rf"{JOB_DIR_PREFIX}[0-9a-f]{{32}}")
+
+
+class InputFormat:
+    """
+    Parses records of input splits read on workers. Splits are snapped to
+    lines (see InputSplit), so every record is a single line. New formats
+    only implement records and are added to INPUT_FORMATS.
+    """
+
+    name: str = ""
+
+    def records(self, lines: Iterable[str]) -> Iterator[Any]:
+        """Records of split from its lines, without line endings"""
+        raise NotImplementedError()
+
+    @staticmethod
+    def from_name(name: str) -> "InputFormat":
+        try:
+            return INPUT_FORMATS[name]()
+        except KeyError:
+            raise ValueError(f"Unknown input format: {name}")
+
+
+class TextFormat(InputFormat):
+    """Every line is a record"""
+
+    name = "text"
+
+    def records(self, lines: Iterable[str]) -> Iterator[Any]:
+        return iter(lines)
+
+
+class JsonLinesFormat(InputFormat):
+    """Every non-empty line is a JSON value"""
+
+    name = "jsonl"
+
+    def records(self, lines: Iterable[str]) -> Iterator[Any]:
+        return (json.loads(line) for line in lines if line.strip())
+
+
+class CsvFormat(InputFormat):
+    """
+    Every line is a list of fields. Header is not treated specially, and
+    quoted fields must not contain line breaks.
+    """
+
+    name = "csv"
+
+    def records(self, lines: Iterable[str]) -> Iterator[Any]:
+        return csv.reader(lines)
+
+
+INPUT_FORMATS: dict[str, type[InputFormat]] = {
+    format.name: format for format in [TextFormat, JsonLinesFormat, CsvFormat]
+}
+
+
+def input_dir(pattern: str) -> str:
+    """Directory of input: the directory itself or the one containing files"""
+    if os.path.isdir(pattern):
+        return os.path.abspath(pattern)
+
+    if not glob.has_magic(pattern):
+        return os.path.dirname(os.path.abspath(pattern))
+
+    # Longest leading path without wildcards
+    parts = pattern.split(os.sep)
+    fixed = os.sep.join(
+        itertools.takewhile(lambda part: not glob.has_magic(part), parts)
+    )
+    if not fixed:
+        fixed = os.sep if pattern.startswith(os.sep) else os.curdir
+    return os.path.abspath(fixed)
+
+
+def input_files(pattern: str) -> list[str]:
+    """
+    Files of input given as a file, a directory or a glob pattern (** matches
+    subdirectories), in sorted order. Files of a directory starting with .
+    or _ and files of job directories are skipped.
+    """
+    if os.path.isdir(pattern):
+        paths = [os.path.join(pattern, name) for name in os.listdir(pattern)]
+        paths = [path for path in paths if not is_hidden(os.path.basename(path))]
+    elif glob.has_magic(pattern):
+        base = input_dir(pattern)
+        paths = [
+            path
+            for path in glob.glob(pattern, recursive=True)
+            if not any(
+                is_job_dir(part)
+                for part in os.path.relpath(path, base).split(os.sep)[:-1]
+            )
+        ]
+    else:
+        paths = [pattern]
+
+    files = sorted(path for path in paths if os.path.isfile(path))
+    if not files:
+        raise FileNotFoundError(f"No input files: {pattern}")
+    return files
+
+
+def is_job_dir(name: str) -> bool:
+    """Whether directory of that name holds intermediate files of a job"""
+    return JOB_DIR_NAME.fullmatch(name) is not None
+
+
+def is_hidden(name: str) -> bool:
+    return name.startswith(".") or name.startswith("_")
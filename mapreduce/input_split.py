@@ -0,0 +1,98 @@
+import gzip
+import hashlib
+import math
+import os
+from typing import Any, BinaryIO, Iterator
+
+import attr
+
+# Gzip files can not be read from an offset, each is a single split
+GZIP_SUFFIX = ".gz"
+
+
+@attr.s(auto_attribs=True)
+class InputSplit:
+    """
+    Byte range of an input file processed by a single map task.
+
+    Split boundaries are not aligned to records, readers snap them to
+    newlines instead: a split owns every line that starts inside
+    [offset, offset + length). The line crossing the end of the split is
+    read past the boundary, the line crossing its start belongs to the
+    previous split. Splits of gzip files span whole files and are read
+    decompressed.
+    """
+
+    path: str
+    offset: int
+    length: int
+
+    @property
+    def name(self) -> str:
+        """Unique file-like name of split, used to name task outputs"""
+        # Inputs of a job may have the same name in different directories
+        digest = hashlib.md5(self.path.encode()).hexdigest()[:8]
+        return f"{os.path.dirname(self.path)}/split_{self.offset}_{digest}_{os.path.basename(self.path)}"
+
+    @property
+    def compressed(self) -> bool:
+        return self.path.endswith(GZIP_SUFFIX)
+
+    def to_dict(self) -> dict[str, Any]:
+        return attr.asdict(self)
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> "InputSplit":
+        return InputSplit(data["path"], data["offset"], data["length"])
+
+    @staticmethod
+    def split_file(path: str, split_size: int) -> list["InputSplit"]:
+        file_size = os.path.getsize(path)
+        if path.endswith(GZIP_SUFFIX):
+            return [InputSplit(path, 0, file_size)]
+
+        split_count = max(math.ceil(file_size / split_size), 1)
+        return [
+            InputSplit(
+                path, i * split_size, min(split_size, file_size - i * split_size)
+            )
+            for i in range(split_count)
+        ]
+
+    @staticmethod
+    def split_files(paths: list[str], split_size: int) -> list["InputSplit"]:
+        return [
+            split for path in paths for split in InputSplit.split_file(path, split_size)
+        ]
+
+    def open(self) -> BinaryIO:
+        """Opens input file of split, gzip files are decompressed as a stream"""
+        if self.compressed:
+            return gzip.open(self.path, "rb")  # type: ignore[return-value]
+        return open(self.path, "rb")
+
+    def read(self) -> str:
+        with self.open() as file:
+            return b"".join(self.lines(file)).decode()
+
+    def lines(self, file: BinaryIO) -> Iterator[bytes]:
+        """Lines of split in file, opened by open or as raw bytes"""
+        if self.compressed:
+            yield from file
+            return
+
+        end = self.offset + self.length
+
+        if self.offset > 0:
+            file.seek(self.offset - 1)
+            file.readline()
+        else:
+            file.seek(0)
+
+        position = file.tell()
+        while position < end:
+            line = file.readline()
+            if not line:
+                break
+            position += len(line)
+            yield line
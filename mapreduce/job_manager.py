@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import attr
+from loguru import logger
+
+from mapreduce.map_reduce import MapReduce
+
+DEFAULT_MAX_RUNNING_JOBS = 4
+# Older finished jobs are forgotten
+MAX_FINISHED_JOBS = 100
+
+
+@attr.s(auto_attribs=True)
+class Job:
+    """Submitted job: queued, running, done or failed"""
+
+    mr: MapReduce
+    state: str = "queued"
+    results: Optional[list[str]] = None
+    error: Optional[Exception] = None
+    submitted: float = attr.Factory(time.monotonic)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+
+    @property
+    def job_id(self) -> str:
+        return self.mr.job_id
+
+    @property
+    def finished_running(self) -> bool:
+        return self.state in ["done", "failed"]
+
+    @property
+    def run_time(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+
+class JobManager:
+    """
+    Queue of submitted jobs, started in submission order. Up to max_running
+    jobs run at the same time, each on its own thread, and share workers
+    through the FairScheduler of their master.
+    """
+
+    def __init__(
+        self,
+        run_job: Callable[[MapReduce], list[str]],
+        max_running: int = DEFAULT_MAX_RUNNING_JOBS,
+    ) -> None:
+        self.run_job = run_job
+        self.max_running = max_running
+        self.jobs: dict[str, Job] = {}
+        self.queue: deque[Job] = deque()
+        self.running = 0
+        self.changed = threading.Condition()
+
+    def submit(self, mr: MapReduce) -> str:
+        """Queues the job, returns its id"""
+        with self.changed:
+            job = Job(mr)
+            self.jobs[job.job_id] = job
+            self.queue.append(job)
+            logger.info(f"Job {job.job_id} queued")
+            self.__start_queued()
+        return job.job_id
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> list[str]:
+        """Reduce output files of the job, raises its error if it failed"""
+        with self.changed:
+            job = self.jobs[job_id]
+            if not self.changed.wait_for(lambda: job.finished_running, timeout):
+                raise TimeoutError(f"Job {job_id} is still {job.state}")
+
+        if job.error is not None:
+            raise job.error
+        return job.results or []
+
+    def __start_queued(self):
+        while self.queue and self.running < self.max_running:
+            job = self.queue.popleft()
+            job.state = "running"
+            job.started = time.monotonic()
+            self.running += 1
+            threading.Thread(target=self.__run, args=[job], daemon=True).start()
+
+    def __run(self, job: Job):
+        results: Optional[list[str]] = None
+        error: Optional[Exception] = None
+        try:
+            results = self.run_job(job.mr)
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {e!r}")
+            error = e
+
+        with self.changed:
+            job.results, job.error = results, error
+            job.state = "failed" if error is not None else "done"
+            job.finished = time.monotonic()
+            self.running -= 1
+            self.__forget_finished()
+            self.__start_queued()
+            self.changed.notify_all()
+
+    def __forget_finished(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished_running]
+        for job_id in finished[:-MAX_FINISHED_JOBS]:
+            del self.jobs[job_id]
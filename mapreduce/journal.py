@@ -0,0 +1,97 @@
+import json
+import os
+import threading
+from typing import Any, Optional
+
+import attr
+
+from mapreduce.stage import TaskOutput
+
+JOURNAL_NAME = "journal.jsonl"
+
+
+@attr.s(auto_attribs=True)
+class JournalState:
+    """Progress of a job replayed from its journal"""
+
+    job: dict[str, Any] = attr.Factory(dict)
+    # Tasks of started stages and outputs of their completed tasks by index
+    tasks: dict[str, list[dict[str, Any]]] = attr.Factory(dict)
+    outputs: dict[str, dict[int, TaskOutput]] = attr.Factory(dict)
+    finished_stages: list[str] = attr.Factory(list)
+    results: Optional[list[str]] = None
+
+    def apply(self, record: dict[str, Any]):
+        event = record["event"]
+        if event == "job":
+            self.job = record["job"]
+        elif event == "stage":
+            self.tasks[record["stage"]] = record["tasks"]
+            self.outputs[record["stage"]] = {}
+        elif event == "task":
+            output = TaskOutput(**record["output"])
+            self.outputs[record["stage"]][record["index"]] = output
+        elif event == "stage_done":
+            self.finished_stages.append(record["stage"])
+        elif event == "done":
+            self.results = record["results"]
+
+
+class JobJournal:
+    """
+    Append-only file of job progress, one JSON record per line:
+        job         options of the job, to create it again
+        stage       tasks of a stage when it starts
+        task        output of a completed task of a stage
+        stage_done  all tasks of a stage completed
+        done        results of the job
+    Every record is on disk before the append returns, so a restarted
+    master can resume the job from its last completed task.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.lock = threading.Lock()
+        # Journal of a job started before, its state is resumed
+        self.state: Optional[JournalState] = None
+        if os.path.exists(filename):
+            self.state = self.replay()
+        self.file = open(filename, "a")
+
+    def append(self, event: str, **data: Any):
+        line = json.dumps({"event": event, **data})
+        with self.lock:
+            self.file.write(line + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def replay(self) -> JournalState:
+        """
+        Reads state of the job, the last record is incomplete if master
+        died while writing it, so it is truncated.
+        """
+        state = JournalState()
+        valid_size = 0
+        with open(self.filename, "rb") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                if not line.endswith(b"\n"):
+                    break
+                state.apply(record)
+                valid_size += len(line)
+
+        os.truncate(self.filename, valid_size)
+        return state
+
+    @staticmethod
+    def read_job(filename: str) -> dict[str, Any]:
+        """Options of the job logged in journal"""
+        with open(filename, "r") as file:
+            return json.loads(file.readline())["job"]
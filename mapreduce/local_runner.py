@@ -0,0 +1,193 @@
+import argparse
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Optional, Sequence
+
+import attr
+from loguru import logger
+
+from mapreduce.function_loader import FunctionLoader
+from mapreduce.input_format import INPUT_FORMATS, input_files
+from mapreduce.input_split import InputSplit
+from mapreduce.map_reduce import MapReduce
+from mapreduce.map_task import MAP_MODES, MapTask
+from mapreduce.partitioner import Partitioner
+from mapreduce.reduce_task import ReduceTask
+
+# Intermediate records of a single partition
+Records = list[tuple[str, str]]
+
+# Functions of the job compiled once by every pool process, see init_process
+process_functions: dict[str, Any] = {}
+
+
+def init_process(
+    map_function: str,
+    reduce_function: str,
+    combine_function: Optional[str],
+    partitioner: dict[str, Any],
+):
+    process_functions["map"] = MapTask.compile_function(map_function)
+    process_functions["reduce"] = ReduceTask.compile_function(reduce_function)
+    process_functions["combine"] = (
+        ReduceTask.compile_function(combine_function) if combine_function else None
+    )
+    process_functions["partitioner"] = Partitioner.from_dict(partitioner)
+
+
+def run_map(
+    split: InputSplit, partitions: int, mode: str, input_format: str
+) -> list[Records]:
+    """Returns map results of split divided into partitions"""
+    task = MapTask()
+    task.load_compiled(process_functions["map"])
+    if process_functions["combine"] is not None:
+        task.load_compiled_combiner(process_functions["combine"])
+
+    task.execute_split(split, mode, input_format)
+    task.combine()
+
+    partitioner: Partitioner = process_functions["partitioner"]
+    results: list[Records] = [[] for _ in range(partitions)]
+    for key, value in task.results:
+        results[partitioner.partition(key, partitions)].append((key, value))
+    return results
+
+
+def run_reduce(
+    records: list[Records], output_filename: Optional[str]
+) -> dict[str, list[str]]:
+    """
+    Reduces partition gathered from all map tasks, results are stored
+    to output_filename or returned if it is None.
+    """
+    task = ReduceTask()
+    task.load_compiled(process_functions["reduce"])
+
+    # Stable sort keeps values of a key in map task order, as shuffle does
+    partition = sorted(
+        (record for part in records for record in part), key=itemgetter(0)
+    )
+    for key, group in groupby(partition, key=itemgetter(0)):
+        task.execute(key, [value for _, value in group])
+
+    if output_filename is None:
+        return task.results
+
+    task.store_results(output_filename)
+    return {}
+
+
+@attr.s(auto_attribs=True)
+class LocalRunner:
+    """
+    Runs MapReduce job on a local process pool, without master, workers
+    and sockets. Intermediate results are passed between processes in
+    memory through the pool pipes, so whole map output has to fit in it.
+
+    Pool processes are spawned by default, fork starts faster but is
+    safe only if the calling process runs no other threads.
+    """
+
+    processes: int = os.cpu_count() or 1
+    start_method: str = "spawn"
+
+    def run(self, mr: MapReduce) -> list[str]:
+        """Runs the job, returns reduce output files like MapReduce.run"""
+        os.makedirs(mr.job_dir, exist_ok=True)
+        outputs = [
+            self.output_filename(mr, partition)
+            for partition in range(self.partitions(mr))
+        ]
+        self.__execute(mr, outputs)
+        return outputs
+
+    def collect(self, mr: MapReduce) -> dict[str, list[str]]:
+        """Runs the job, returns merged reduce results instead of storing them"""
+        results: dict[str, list[str]] = {}
+        for partition_results in self.__execute(mr, [None] * self.partitions(mr)):
+            results.update(partition_results)
+        return results
+
+    def partitions(self, mr: MapReduce) -> int:
+        return mr.partitions or self.processes
+
+    @staticmethod
+    def output_filename(mr: MapReduce, partition: int) -> str:
+        partition_filename = mr.partition_filename(partition)
+        return f"{os.path.dirname(partition_filename)}/reduce_local_{os.path.basename(partition_filename)}"
+
+    def __execute(
+        self, mr: MapReduce, outputs: Sequence[Optional[str]]
+    ) -> list[dict[str, list[str]]]:
+        splits = InputSplit.split_files(input_files(mr.input_file), mr.chunk_size)
+        partitions = len(outputs)
+
+        with ProcessPoolExecutor(
+            self.processes,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=init_process,
+            initargs=(
+                mr.map_function,
+                mr.reduce_function,
+                mr.combine_function,
+                mr.partitioner.to_dict(),
+            ),
+        ) as executor:
+            map_results = list(
+                executor.map(
+                    run_map,
+                    splits,
+                    [partitions] * len(splits),
+                    [mr.map_mode] * len(splits),
+                    [mr.input_format] * len(splits),
+                )
+            )
+            logger.info(f"Map done: {len(splits)} tasks")
+
+            partition_records = [
+                [results[partition] for results in map_results]
+                for partition in range(partitions)
+            ]
+            del map_results
+
+            results = list(executor.map(run_reduce, partition_records, outputs))
+            logger.info(f"Reduce done: {partitions} tasks")
+
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run map reduce on local processes")
+    parser.add_argument("input_file", help="file, directory or glob pattern")
+    parser.add_argument("map_file")
+    parser.add_argument("reduce_file")
+    parser.add_argument("--combine-file")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=1024 * 1024)
+    parser.add_argument("--map-mode", choices=MAP_MODES, default="document")
+    parser.add_argument("--input-format", choices=INPUT_FORMATS, default="text")
+    args = parser.parse_args()
+
+    def load(filename: str) -> str:
+        with open(filename, "r") as file:
+            return FunctionLoader.from_file(file)
+
+    mr = MapReduce(
+        args.input_file,
+        load(args.map_file),
+        load(args.reduce_file),
+        chunk_size=args.chunk_size,
+        map_mode=args.map_mode,
+        input_format=args.input_format,
+        combine_function=load(args.combine_file) if args.combine_file else None,
+    )
+    print(json.dumps(LocalRunner(args.processes).run(mr)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import Any, Iterable, Optional
+
+from loguru import logger
+
+from mapreduce.input_split import InputSplit
+from mapreduce.map_task import MapTask
+
+DEFAULT_CACHE_SIZE = 10 * 1024 * 1024 * 1024
+# Entries hold output of a map task under this name, partitioned
+# outputs are stored as its partition files
+OUTPUT_NAME = "map"
+# Directory of digests of split contents, see MapOutputCache.split_digest
+DIGESTS_DIR = "splits"
+
+
+def output_files(output: str, partitions: Optional[int]) -> list[str]:
+    """Files written by map task with output, see task_runner.task_outputs"""
+    if partitions is None:
+        return [output]
+    return [
+        MapTask.partition_filename(output, partition) for partition in range(partitions)
+    ]
+
+
+def split_key(split: InputSplit, content_digest: str, config: dict[str, Any]) -> str:
+    """
+    Key of map outputs of split: digest of its path, its lines and the job
+    config. Map function gets the path as key, so it is a part of the key.
+    """
+    key = {"path": split.path, "content": content_digest, "config": config}
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+
+def content_digest(split: InputSplit) -> str:
+    """Digest of lines of split, gzip files are hashed compressed"""
+    digest = hashlib.sha256()
+    with open(split.path, "rb") as file:
+        for line in split.lines(file):
+            digest.update(line)
+    return digest.hexdigest()
+
+
+class MapOutputCache:
+    """
+    Outputs of map tasks kept between jobs, so that splits with the same
+    content are not mapped again, e.g. in appended logs. Every entry is a
+    directory named by the key of its split. Entries are read in place by
+    master and reducers, so the directory has to be on storage shared by
+    all nodes. Least recently used entries are evicted above max_size bytes.
+    Digests of splits are kept by size and modification time of their
+    files, so unchanged inputs are not read again to look up their keys.
+    """
+
+    def __init__(self, directory: str, max_size: int = DEFAULT_CACHE_SIZE) -> None:
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(f"{directory}/{DIGESTS_DIR}", exist_ok=True)
+
+    def entry(self, key: str) -> str:
+        return f"{self.directory}/{key}"
+
+    def split_digest(self, split: InputSplit) -> str:
+        """
+        Digest of lines of split. Files are read only if they changed since
+        their splits were hashed, judging by their size and modification time.
+        """
+        stat = os.stat(split.path)
+        metadata = [split.to_dict(), stat.st_size, stat.st_mtime_ns, stat.st_ino]
+        metadata_digest = hashlib.sha256(json.dumps(metadata).encode()).hexdigest()
+        digest_file = f"{self.directory}/{DIGESTS_DIR}/{metadata_digest}"
+        try:
+            with open(digest_file, "r") as file:
+                digest = file.read()
+            os.utime(digest_file)
+            return digest
+        except FileNotFoundError:
+            pass
+
+        digest = content_digest(split)
+        temp_file = f"{digest_file}.{uuid.uuid4().hex}.tmp"
+        with open(temp_file, "w") as file:
+            file.write(digest)
+        os.replace(temp_file, digest_file)
+        return digest
+
+    def get(self, key: str) -> Optional[str]:
+        """Output of map task cached under key, None if it is not"""
+        entry = self.entry(key)
+        try:
+            # Modification time of entries orders them for eviction
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return f"{entry}/{OUTPUT_NAME}"
+
+    def put(
+        self,
+        key: str,
+        output: str,
+        partitions: Optional[int] = None,
+        move: bool = False,
+    ):
+        """
+        Stores files of map task output under key. They are moved if move
+        is set, otherwise linked or copied if they are on another device.
+        """
+        entry = self.entry(key)
+        if os.path.exists(entry):
+            return
+
+        # Entry appears at once, jobs storing the same key keep the first one
+        temp_entry = f"{entry}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(temp_entry)
+        try:
+            for source, destination in zip(
+                output_files(output, partitions),
+                output_files(f"{temp_entry}/{OUTPUT_NAME}", partitions),
+            ):
+                if move:
+                    shutil.move(source, destination)
+                else:
+                    link_or_copy(source, destination)
+            os.rename(temp_entry, entry)
+        except OSError as e:
+            logger.warning(f"Map output not cached: {e!r}")
+            shutil.rmtree(temp_entry, ignore_errors=True)
+
+    def evict(self, keep: Iterable[str] = ()):
+        """
+        Removes least recently used entries, except keep, above max_size,
+        and digests of splits not used since the evicted entries were
+        """
+        entries: list[tuple[float, int, str]] = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or entry.name.endswith(".tmp"):
+                continue
+            if entry.name == DIGESTS_DIR:
+                continue
+            size = sum(file.stat().st_size for file in os.scandir(entry.path))
+            entries.append((entry.stat().st_mtime, size, entry.name))
+
+        total = sum(size for _, size, _ in entries)
+        kept = set(keep)
+        evicted_until: Optional[float] = None
+        for mtime, size, key in sorted(entries):
+            if total <= self.max_size:
+                break
+            if key in kept:
+                continue
+            shutil.rmtree(self.entry(key), ignore_errors=True)
+            total -= size
+            evicted_until = mtime
+
+        if evicted_until is None:
+            return
+        for digest in os.scandir(f"{self.directory}/{DIGESTS_DIR}"):
+            with contextlib.suppress(FileNotFoundError):
+                if digest.stat().st_mtime <= evicted_until:
+                    os.remove(digest.path)
+
+
+def link_or_copy(source: str, destination: str):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
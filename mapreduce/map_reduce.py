@@ -1,167 +1,1170 @@
+from __future__ import annotations
+
+import contextlib
+import heapq
 import itertools
 import json
-import math
 import os
-from queue import Empty, Queue
-from threading import Thread
-from typing import Callable
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+from threading import Condition, Thread
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Optional
 
 import attr
 from loguru import logger
 
-from communication.worker import Worker
+from mapreduce.compression import DEFAULT_COMPRESSION, Codec
+from mapreduce.external_sort import DEFAULT_MEMORY_LIMIT, ExternalSorter
+from mapreduce.function_registry import function_digest
+from mapreduce.input_format import INPUT_FORMATS, JOB_DIR_PREFIX, input_dir, input_files
+from mapreduce.input_split import InputSplit
+from mapreduce.journal import JOURNAL_NAME, JobJournal, JournalState
+from mapreduce.map_cache import (
+    DEFAULT_CACHE_SIZE,
+    MapOutputCache,
+    output_files,
+    split_key,
+)
+from mapreduce.map_task import MAP_MODES, MapTask
+from mapreduce.partition_planner import (
+    HOT_KEY_SHARE,
+    plan_partitions,
+    sample_key_volumes,
+)
+from mapreduce.partitioner import HashPartitioner, Partitioner
+from mapreduce.reduce_task import ReduceOutputWriter, ReduceTask
+from mapreduce.scheduler import WAIT_INTERVAL, FairScheduler, address
+from mapreduce.serialization import DEFAULT_SERIALIZATION, Serializer
+from mapreduce.stage import Attempt, Stage, TaskOutput
+from mapreduce.task_metrics import JobMetrics, TaskMetrics
+from mapreduce.task_sizing import TaskSizing
+from mapreduce.task_timeouts import DEFAULT_TASK_TIMEOUT, TaskTimeouts
+
+if TYPE_CHECKING:
+    from communication.worker import Worker
+
+MAX_TASK_FAILS = 3
+# Attempt running for this many timeouts is given up even if its worker
+# is alive, e.g. user function hangs, its task had a backup attempt meanwhile
+MAX_ATTEMPT_TIMEOUTS = 4
+
+
+@attr.s(auto_attribs=True)
+class FinishedAttempt:
+    """Outcome of a task attempt for the worker slot which ran it"""
+
+    failed: bool = False
+    # Output to journal, if the attempt completed its task
+    output: Optional[TaskOutput] = None
+    # Attempts of the task to discard on their workers
+    discarded: list[Attempt] = attr.Factory(list)
 
 
 @attr.s(auto_attribs=True)
 class MapReduce:
+    # Input file, directory or glob pattern of files, gzip files are read
+    # decompressed but each of them is mapped by a single task
     input_file: str
     map_function: str
     reduce_function: str
     chunk_size: int = 8 * 1024
     max_reduce_workers: int = 4
+    partitioned: bool = False
+    partitioner: Partitioner = attr.Factory(HashPartitioner)
+    combine_function: Optional[str] = None
+    shuffle_memory_limit: int = DEFAULT_MEMORY_LIMIT
+    serialization: str = DEFAULT_SERIALIZATION
+    # Codec of intermediate files, see CODECS. Map outputs are fetched
+    # compressed, so it saves both disk and network bandwidth.
+    compression: str = DEFAULT_COMPRESSION
+    # Fraction of finished tasks after which backup attempts of running
+    # tasks are started on idle workers, None disables speculative execution
+    speculative_threshold: Optional[float] = 0.75
+    # Timeout of tasks until first tasks of a stage finish, later it is
+    # derived from durations of finished tasks
+    task_timeout: float = DEFAULT_TASK_TIMEOUT
+    # Whether workers store task outputs on their local disks, so they are
+    # lost with them. Partitioned map outputs always are, since reducers
+    # fetch them from shuffle services of map workers.
+    worker_local_outputs: bool = False
+    # Number of partitions of map outputs, fixed when map tasks are created
+    # so that losing workers during the job does not change it
+    partitions: Optional[int] = None
+    # Reduce tasks start together with map tasks and fetch partitions of
+    # map outputs as soon as they are completed, implies partitioned
+    pipelined: bool = False
+    # Metrics of the job are written to this JSON file when it finishes
+    metrics_file: Optional[str] = None
+    # How map function is called on input splits, see MAP_MODES. Tasks in
+    # lines and iterator modes stream their outputs, so memory use does
+    # not grow with chunk_size.
+    map_mode: str = "document"
+    # How records of map tasks in lines and iterator modes are parsed from
+    # lines of input, see INPUT_FORMATS
+    input_format: str = "text"
+    # Reduce function gets values of a key as an iterator instead of a list
+    # and its results are written key by key, so hot keys with more values
+    # than fit in memory can be reduced. Master shuffle then keeps a record
+    # per value instead of grouping them.
+    streaming_reduce: bool = False
+    # If set, split size and number of reduce partitions are chosen so that
+    # tasks take about this many seconds, from input size, worker slots and
+    # throughput observed by task_sizing. chunk_size and max_reduce_workers
+    # are ignored then.
+    target_task_duration: Optional[float] = None
+    # Estimates of task throughput, shared by master between jobs
+    task_sizing: TaskSizing = attr.ib(factory=TaskSizing, repr=False)
+    # Partitioned jobs replace partitioner by ranges of keys with similar
+    # volume of values, estimated by running map on samples of input.
+    # Master shuffle always balances chunks by number of values.
+    balance_partitions: bool = False
+    # Values of keys too big for a single reducer are spread over all of
+    # them and partial results are reduced again on master, so the reduce
+    # function has to accept its own results as values, like a combiner.
+    # Implies balance_partitions.
+    split_hot_keys: bool = False
+    # Slots of workers, shared by master between jobs running at once
+    scheduler: FairScheduler = attr.ib(factory=FairScheduler, repr=False)
+    # Map outputs are cached in this directory on storage shared by all
+    # nodes, keyed by path and content of splits and by the job config, and
+    # splits found there are not mapped again. Least recently used outputs
+    # are evicted above map_cache_size bytes. Not used by pipelined jobs.
+    map_cache_dir: Optional[str] = None
+    map_cache_size: int = DEFAULT_CACHE_SIZE
+    # Progress of the job is logged to journal in its directory, so that
+    # a restarted master resumes it from completed tasks, see from_journal
+    journaled: bool = False
+    job_id: str = attr.Factory(lambda: uuid.uuid4().hex)
+
+    # State of map stage, read by reducers of pipelined job
+    map_stage: Optional[Stage] = attr.ib(default=None, init=False, repr=False)
+    map_finished: bool = attr.ib(default=False, init=False, repr=False)
+    # Wall time of stages in seconds, stages of pipelined job overlap
+    stage_times: dict[str, float] = attr.ib(factory=dict, init=False, repr=False)
+    # Metrics reported by workers with completed tasks
+    metrics: JobMetrics = attr.ib(factory=JobMetrics, init=False, repr=False)
+    # Keys split over reducers, known once reduce tasks are created
+    hot_keys: list[str] = attr.ib(factory=list, init=False, repr=False)
+    # Map tasks found in and missing from map cache
+    map_cache_hits: int = attr.ib(default=0, init=False, repr=False)
+    map_cache_misses: int = attr.ib(default=0, init=False, repr=False)
+    map_cache_keys: list[str] = attr.ib(factory=list, init=False, repr=False)
+    # Files of master shuffle, removed once job is done unless it is journaled
+    intermediate_files: list[str] = attr.ib(factory=list, init=False, repr=False)
+    shuffle_bytes: int = attr.ib(default=0, init=False, repr=False)
+    journal: Optional[JobJournal] = attr.ib(default=None, init=False, repr=False)
+
+    def __attrs_post_init__(self):
+        if self.map_mode not in MAP_MODES:
+            raise ValueError(f"Unknown map mode: {self.map_mode}")
+        if self.input_format not in INPUT_FORMATS:
+            raise ValueError(f"Unknown input format: {self.input_format}")
+        if self.pipelined:
+            self.partitioned = True
+        if self.split_hot_keys:
+            self.balance_partitions = True
+
+    @classmethod
+    def from_journal(cls, filename: str, **options: Any) -> MapReduce:
+        """Job logged in journal, run resumes it from its completed tasks"""
+        job = JobJournal.read_job(filename)
+        job["partitioner"] = Partitioner.from_dict(job["partitioner"])
+        return cls(**{**job, **options})
+
+    def run(self, workers: list[Worker]) -> list[str]:
+        """Runs the job, returns reduce output files"""
+        os.makedirs(self.job_dir, exist_ok=True)
+        self.open_journal()
+        try:
+            results = self.__run(workers)
+            self.log_results(results)
+        except Exception:
+            # Journaled job is resumed from outputs kept on workers
+            if not self.journaled:
+                self.remove_outputs(workers, keep=[])
+            raise
+        finally:
+            self.scheduler.remove_job(self.job_id)
+            self.close_journal()
+            self.remove_intermediates()
+        self.remove_outputs(workers, keep=results)
+        self.store_metrics()
+        return results
+
+    def remove_outputs(self, workers: list[Worker], keep: list[str]):
+        """Workers remove outputs of tasks of the job, except keep"""
+        for worker in workers:
+            if worker.health.alive:
+                worker.job_done(self.job_dir, keep)
+
+    def remove_intermediates(self):
+        """
+        Removes files of master shuffle, and job directory if nothing else
+        is left there. Reduce outputs are kept, as well as everything of
+        journaled jobs, which are resumed from them.
+        """
+        if self.journaled:
+            return
+
+        for filename in self.intermediate_files:
+            if os.path.exists(filename):
+                os.remove(filename)
+        self.intermediate_files.clear()
+        with contextlib.suppress(OSError):
+            os.rmdir(self.job_dir)
+
+    def __run(self, workers: list[Worker]) -> list[str]:
+        state = self.journal_state
+        if state is not None and state.results is not None:
+            logger.info(f"Job {self.job_id} already finished")
+            return state.results
+
+        if self.pipelined:
+            results = self.run_pipelined(workers)
+            logger.info(f"Map and reduce done")
+            return results
 
-    def run(self, workers: list[Worker]):
         map_results = self.run_map(workers)
         logger.info(f"Map done")
 
-        shuffle_results_filename = self.shuffle(map_results)
-        logger.info(f"Shuffle done")
+        if self.partitioned:
+            results = self.run_partitioned_reduce(workers)
+            logger.info(f"Reduce done")
+            return results
 
-        self.run_reduce(shuffle_results_filename, workers)
+        results = self.run_reduce(map_results, workers)
         logger.info(f"Reduce done")
+        return results
 
-    def run_map(self, workers: list[Worker]) -> list[str]:
-        chunk_files = self.__split_file(self.input_file, self.chunk_size)
-        results: list[str] = self.__run_stage("map", workers, chunk_files)
+    def run_map(self, workers: list[Worker]) -> list[TaskOutput]:
+        tasks = self.stage_tasks("map", lambda: self.map_tasks(workers))
+        cached = self.cached_map_outputs(tasks)
+        results = self.__run_stage("map", workers, tasks, cached)
+        self.store_map_outputs(tasks, cached)
         return results
 
     def run_reduce(
-        self, shuffle_results_filename: str, workers: list[Worker]
+        self, map_results: list[TaskOutput], workers: list[Worker]
     ) -> list[str]:
+        tasks = self.stage_tasks(
+            "reduce", lambda: self.reduce_tasks(self.shuffle(map_results), workers)
+        )
+        results = self.__run_stage("reduce", workers, tasks)
+        return self.merge_hot_keys(results)
+
+    def run_partitioned_reduce(self, workers: list[Worker]) -> list[str]:
+        tasks = self.stage_tasks(
+            "reduce", lambda: self.partitioned_reduce_tasks(workers)
+        )
+        results = self.__run_stage("reduce", workers, tasks)
+        return self.merge_hot_keys(results)
+
+    def run_pipelined(self, workers: list[Worker]) -> list[str]:
+        map_tasks = self.stage_tasks("map", lambda: self.map_tasks(workers))
+        with ThreadPoolExecutor(1) as executor:
+            map_stage = executor.submit(self.__run_stage, "map", workers, map_tasks)
+
+            reduce_tasks = self.stage_tasks("reduce", self.pipelined_reduce_tasks)
+            try:
+                results = self.__run_stage("reduce", workers, reduce_tasks)
+            finally:
+                # Failed map stage fails reducers too, its error is raised
+                map_stage.result()
+        return self.merge_hot_keys(results)
+
+    def map_tasks(self, workers: list[Worker]) -> list[dict[str, Any]]:
+        splits = InputSplit.split_files(
+            input_files(self.input_file), self.split_size(workers)
+        )
+
+        options: dict[str, Any] = {
+            "serialization": self.serialization,
+            "compression": self.compression,
+            "map_mode": self.map_mode,
+            "input_format": self.input_format,
+            "job_dir": self.job_dir,
+        }
+        if self.combine_function is not None:
+            options["combine_function"] = self.combine_function
+
+        if self.partitioned:
+            if self.partitions is None:
+                self.partitions = self.reduce_partitions(workers)
+            if self.balance_partitions:
+                self.partitioner = self.plan_partitioner(self.partitions, splits)
+            options["partitions"] = self.partitions
+            options["partitioner"] = self.partitioner.to_dict()
+
+        return [{"split": split.to_dict(), **options} for split in splits]
+
+    def cached_map_outputs(self, tasks: list[dict[str, Any]]) -> dict[int, TaskOutput]:
+        """Outputs of map tasks found in map cache, by index of task"""
+        if self.map_cache_dir is None:
+            return {}
+
+        started = time.monotonic()
+        cache = MapOutputCache(self.map_cache_dir, self.map_cache_size)
+        self.map_cache_keys = [self.map_cache_key(cache, task) for task in tasks]
+        outputs: dict[int, TaskOutput] = {}
+        for index, key in enumerate(self.map_cache_keys):
+            output = cache.get(key)
+            if output is not None:
+                outputs[index] = TaskOutput.shared(output)
+
+        self.map_cache_hits = len(outputs)
+        self.map_cache_misses = len(tasks) - len(outputs)
+        logger.info(
+            f"Map cache: {self.map_cache_hits} hits, {self.map_cache_misses} misses"
+        )
+        self.record_time("cache", started)
+        return outputs
+
+    def store_map_outputs(
+        self, tasks: list[dict[str, Any]], cached: dict[int, TaskOutput]
+    ):
+        """Stores outputs of map tasks, which were not cached, to map cache"""
+        if self.map_cache_dir is None or self.map_stage is None:
+            return
+
+        started = time.monotonic()
+        cache = MapOutputCache(self.map_cache_dir, self.map_cache_size)
+        for index, output in self.map_stage.outputs.items():
+            if index not in cached:
+                self.__store_map_output(
+                    cache, self.map_cache_keys[index], output, tasks[index]
+                )
+        cache.evict(keep=self.map_cache_keys)
+        self.record_time("cache", started)
+
+    def map_cache_key(self, cache: MapOutputCache, task: dict[str, Any]) -> str:
+        config = {
+            "map_function": function_digest(self.map_function),
+            "combine_function": (
+                function_digest(self.combine_function)
+                if self.combine_function is not None
+                else None
+            ),
+            **{
+                name: task.get(name)
+                for name in [
+                    "map_mode",
+                    "input_format",
+                    "serialization",
+                    "compression",
+                    "partitions",
+                    "partitioner",
+                ]
+            },
+        }
+        split = InputSplit.from_dict(task["split"])
+        return split_key(split, cache.split_digest(split), config)
+
+    def __store_map_output(
+        self, cache: MapOutputCache, key: str, output: TaskOutput, task: dict[str, Any]
+    ):
+        partitions: Optional[int] = task.get("partitions")
+        if not self.outputs_on_workers("map"):
+            cache.put(key, output.path, partitions)
+            return
+
+        # Outputs kept on workers are fetched from the worker which wrote them
+        from communication.shuffle import fetch_file
+
+        cached_output = f"{self.job_dir}/cached_{os.path.basename(output.path)}"
+        try:
+            for path, destination in zip(
+                output_files(output.path, partitions),
+                output_files(cached_output, partitions),
+            ):
+                fetch_file(output.host, output.port, path, destination)
+        except (OSError, TimeoutError) as e:
+            logger.warning(f"Map output not cached: {e!r}")
+            return
+        cache.put(key, cached_output, partitions, move=True)
+
+    def reduce_tasks(
+        self, shuffle_results_filename: str, workers: list[Worker]
+    ) -> list[dict[str, Any]]:
         chunk_files = self.__split_shuffle(
-            shuffle_results_filename, min(len(workers), self.max_reduce_workers)
+            shuffle_results_filename, self.reduce_partitions(workers)
         )
-        results: list[str] = self.__run_stage("reduce", workers, chunk_files)
-        return results
+        self.intermediate_files.extend(chunk_files)
+        self.shuffle_bytes += sum(os.path.getsize(file) for file in chunk_files)
+        return [{"filename": file, **self.reduce_options()} for file in chunk_files]
 
-    def shuffle(self, map_results_files: list[str]) -> str:
-        shuffle_results: dict[str, list[str]] = {}
-        for file in map_results_files:
-            with open(file, "r") as input:
-                data = json.load(input)
+    def partitioned_reduce_tasks(self, workers: list[Worker]) -> list[dict[str, Any]]:
+        """
+        Each reduce task fetches its partition of every map output from
+        the map worker, so no global shuffle is performed on the master.
+        Sources of map outputs are given to attempts, see attempt_data,
+        since lost outputs are written again by other workers.
+        """
+        partitions = self.partitions or self.reduce_partitions(workers)
+        return [
+            {
+                "filename": self.partition_filename(partition),
+                "partition": partition,
+                **self.reduce_options(),
+            }
+            for partition in range(partitions)
+        ]
 
-            for k, v in data:
-                if k in shuffle_results:
-                    shuffle_results[k].append(v)
-                else:
-                    shuffle_results[k] = [v]
+    def pipelined_reduce_tasks(self) -> list[dict[str, Any]]:
+        """Reduce tasks polling master for map outputs, see map_outputs"""
+        if self.partitions is None:
+            raise RuntimeError("Map tasks have to be created first")
+
+        return [
+            {
+                "filename": self.partition_filename(partition),
+                "job_id": self.job_id,
+                "partition": partition,
+                **self.reduce_options(),
+            }
+            for partition in range(self.partitions)
+        ]
+
+    def reduce_options(self) -> dict[str, Any]:
+        options: dict[str, Any] = {
+            "serialization": self.serialization,
+            "compression": self.compression,
+            "streaming": self.streaming_reduce,
+            "job_dir": self.job_dir,
+        }
+        if self.hot_keys:
+            options["hot_keys"] = self.hot_keys
+        return options
+
+    def plan_partitioner(
+        self, partitions: int, splits: list[InputSplit]
+    ) -> Partitioner:
+        """Range partitioner balanced by key volumes sampled from input splits"""
+        started = time.monotonic()
+        volumes = sample_key_volumes(
+            splits,
+            self.map_function,
+            self.map_mode,
+            self.combine_function,
+            self.input_format,
+        )
+        partitioner = plan_partitions(volumes, partitions, self.split_hot_keys)
+        self.hot_keys = partitioner.hot_keys
+        self.record_time("plan", started)
+        logger.info(f"Partition boundaries: {partitioner.boundaries}")
+        logger.info(f"Hot keys: {self.hot_keys}")
+        return partitioner
+
+    def merge_hot_keys(self, results: list[TaskOutput]) -> list[str]:
+        """
+        Reducers write partial results of hot keys to side files, which are
+        fetched and reduced again into one more output file. Returns paths
+        of all reduce outputs.
+        """
+        paths = [result.path for result in results]
+        if not self.hot_keys:
+            return paths
+
+        # Only master nodes fetch files, local runner has no communication path
+        from communication.shuffle import fetch_sources, remove_fetched
+
+        started = time.monotonic()
+        hot_keys_filename = f"{self.job_dir}/hot_keys_{self.input_name}"
+        sources = {
+            index: result.source(ReduceTask.hot_keys_filename(result.path))
+            for index, result in enumerate(results)
+        }
+        fetched = fetch_sources(sources, hot_keys_filename)
+
+        try:
+            partial_results: dict[str, list[str]] = {}
+            for path, _ in fetched.values():
+                with open(path, "r") as file:
+                    for key, values in json.load(file).items():
+                        partial_results.setdefault(key, []).extend(values)
+
+            task = ReduceTask()
+            task.load_function(self.reduce_function)
+            with ReduceOutputWriter(hot_keys_filename) as output:
+                task.stream_to(output)
+                for key in sorted(partial_results):
+                    task.execute(key, partial_results.pop(key))
+        finally:
+            remove_fetched(fetched.values())
+
+        self.record_time("merge", started)
+        return paths + [hot_keys_filename]
+
+    def map_outputs(self, partition: int) -> dict[str, Any]:
+        """Sources of partition of map outputs completed so far"""
+        outputs: dict[int, TaskOutput] = {}
+        map_tasks: Optional[int] = None
+        if self.map_stage is not None:
+            outputs = dict(self.map_stage.outputs)
+            map_tasks = len(self.map_stage.tasks)
+
+        return {
+            "outputs": {
+                index: output.source(MapTask.partition_filename(output.path, partition))
+                for index, output in outputs.items()
+            },
+            "map_tasks": map_tasks,
+            "map_finished": self.map_finished,
+        }
+
+    def open_journal(self):
+        if not self.journaled:
+            return
+
+        self.journal = JobJournal(f"{self.job_dir}/{JOURNAL_NAME}")
+        if self.journal.state is None:
+            self.journal.append("job", job=self.job_spec())
+        else:
+            logger.info(f"Resuming job {self.job_id} from journal")
+
+    def close_journal(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    @property
+    def journal_state(self) -> Optional[JournalState]:
+        """Progress of resumed job, None if it was not started before"""
+        return self.journal.state if self.journal is not None else None
+
+    def job_spec(self) -> dict[str, Any]:
+        """Options of the job, objects shared by master are not logged"""
+        spec = {
+            field.name: getattr(self, field.name)
+            for field in attr.fields(type(self))
+            if field.init and field.name not in ["task_sizing", "scheduler"]
+        }
+        spec["partitioner"] = self.partitioner.to_dict()
+        return spec
+
+    def stage_tasks(
+        self, stage: str, create: Callable[[], list[dict[str, Any]]]
+    ) -> list[dict[str, Any]]:
+        """Tasks of stage from journal of resumed job, otherwise created"""
+        state = self.journal_state
+        if state is None or stage not in state.tasks:
+            return create()
+
+        # Later stages use state set while tasks were created
+        tasks = state.tasks[stage]
+        if stage == "map" and self.partitioned:
+            self.partitions = tasks[0]["partitions"]
+            self.partitioner = Partitioner.from_dict(tasks[0]["partitioner"])
+            self.hot_keys = getattr(self.partitioner, "hot_keys", [])
+        elif stage == "reduce":
+            self.hot_keys = tasks[0].get("hot_keys", [])
+        return tasks
+
+    def create_stage(
+        self,
+        stage: str,
+        stage_tasks: list[dict[str, Any]],
+        workers: list[Any],
+        completed: Optional[dict[int, TaskOutput]] = None,
+    ) -> Stage:
+        tasks = Stage(
+            stage_tasks, self.speculative_threshold, self.outputs_on_workers(stage)
+        )
+        for index, output in (completed or {}).items():
+            tasks.restore(index, output)
+
+        state = self.journal_state
+        if state is not None and stage in state.tasks:
+            self.restore_outputs(tasks, state.outputs[stage], workers)
+            logger.info(
+                f"Stage {stage} resumed with {len(tasks.outputs)}/{len(stage_tasks)} tasks"
+            )
+        elif self.journal is not None:
+            self.journal.append("stage", stage=stage, tasks=stage_tasks)
+
+        if stage == "map":
+            self.map_stage = tasks
+        return tasks
+
+    def restore_outputs(
+        self, tasks: Stage, outputs: dict[int, TaskOutput], workers: list[Any]
+    ):
+        """
+        Completes tasks by outputs logged in journal, unless they were lost:
+        workers which wrote them are not connected, or files are missing.
+        """
+        workers_by_address = {address(worker): worker for worker in workers}
+        for index, output in outputs.items():
+            if index in tasks.outputs:
+                continue
+            worker = None
+            if tasks.outputs_on_workers:
+                worker = workers_by_address.get((output.host, output.port))
+                if worker is None:
+                    continue
+            elif not os.path.exists(output.path):
+                continue
+            tasks.restore(index, output, worker)
+
+    def log_task(self, stage: str, index: int, output: TaskOutput):
+        if self.journal is not None:
+            self.journal.append(
+                "task", stage=stage, index=index, output=attr.asdict(output)
+            )
 
-        shuffle_results_filename = (
-            f"{os.path.dirname(map_results_files[0])}/shuffle_results.txt"
+    def log_stage_done(self, stage: str, tasks: Stage):
+        state = self.journal_state
+        if state is not None and stage in state.finished_stages:
+            return
+        if self.journal is not None and tasks.done:
+            self.journal.append("stage_done", stage=stage)
+
+    def log_results(self, results: list[str]):
+        state = self.journal_state
+        if self.journal is not None and (state is None or state.results is None):
+            self.journal.append("done", results=results)
+
+    @property
+    def job_dir(self) -> str:
+        """Intermediate files of the job, so that jobs run at once do not collide"""
+        return f"{input_dir(self.input_file)}/{JOB_DIR_PREFIX}{self.job_id}"
+
+    @property
+    def input_name(self) -> str:
+        """Name of input in names of intermediate files"""
+        if os.path.isfile(self.input_file):
+            return os.path.basename(self.input_file)
+        return os.path.basename(input_dir(self.input_file))
+
+    @property
+    def input_size(self) -> int:
+        """Size of input files, gzip files are counted compressed"""
+        return sum(os.path.getsize(path) for path in input_files(self.input_file))
+
+    def partition_filename(self, partition: int) -> str:
+        return f"{self.job_dir}/partition_{partition}_{self.input_name}"
+
+    def split_size(self, workers: list[Worker]) -> int:
+        if self.target_task_duration is None:
+            return self.chunk_size
+
+        split_size = self.task_sizing.split_size(
+            self.input_size,
+            sum(worker.slots for worker in workers),
+            self.target_task_duration,
+        )
+        logger.info(f"Split size: {split_size}")
+        return split_size
+
+    def reduce_partitions(self, workers: list[Worker]) -> int:
+        if self.target_task_duration is None:
+            return min(len(workers), self.max_reduce_workers)
+
+        # Size of map outputs is known once map stage finishes
+        map_metrics = self.metrics.stages.get("map")
+        if self.map_finished and map_metrics is not None:
+            reduce_input_size = float(map_metrics.bytes_written)
+        else:
+            reduce_input_size = self.task_sizing.reduce_input_size(self.input_size)
+
+        partitions = self.task_sizing.partitions(
+            reduce_input_size,
+            sum(worker.slots for worker in workers),
+            self.target_task_duration,
+        )
+        logger.info(f"Reduce partitions: {partitions}")
+        return partitions
+
+    def metrics_report(self) -> dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "stage_times": dict(self.stage_times),
+            "map_cache": {"hits": self.map_cache_hits, "misses": self.map_cache_misses},
+            **self.metrics.to_dict(),
+        }
+
+    def store_metrics(self):
+        if self.metrics_file is None:
+            return
+
+        with open(self.metrics_file, "w") as file:
+            json.dump(self.metrics_report(), file, indent=2)
+
+    def record_metrics(self, stage: str, worker: Worker, result: dict[str, Any]):
+        if "metrics" in result:
+            self.metrics.record(
+                stage,
+                f"{worker.target_host}:{worker.target_port}",
+                TaskMetrics.from_dict(result["metrics"]),
+            )
+
+    def record_time(self, stage: str, started: float):
+        """Adds time since monotonic started to wall time of stage"""
+        elapsed = time.monotonic() - started
+        self.stage_times[stage] = self.stage_times.get(stage, 0.0) + elapsed
+
+    def shuffle(self, map_results: list[TaskOutput]) -> str:
+        """
+        External sort-merge shuffle: map outputs are sorted into runs spilled
+        to disk within shuffle_memory_limit, then merged into key-sorted
+        file with one [key, *values] record per key, or [key, value]
+        records in key order for streaming reduce.
+
+        Map outputs kept on workers are fetched from their shuffle services
+        one at a time, others are read directly from storage shared with
+        workers.
+        """
+        started = time.monotonic()
+        serializer = Serializer.from_name(self.serialization)
+        codec = Codec.from_name(self.compression)
+        sorter = ExternalSorter(
+            f"{self.job_dir}/shuffle",
+            memory_limit=self.shuffle_memory_limit,
+            serializer=serializer,
+            codec=codec,
         )
-        with open(shuffle_results_filename, "w") as shuffle_results_file:
-            json.dump(shuffle_results, shuffle_results_file)
 
+        shuffle_results_filename = f"{self.job_dir}/shuffle_results.txt"
+        self.intermediate_files.append(shuffle_results_filename)
+        try:
+            for index, result in enumerate(map_results):
+                with self.__map_output(index, result) as path:
+                    with codec.open(path, "rb") as input:
+                        sorter.add_all(serializer.read(input))
+
+            with codec.open(shuffle_results_filename, "wb") as shuffle_results_file:
+                if self.streaming_reduce:
+                    for key, value in sorter.sorted():
+                        serializer.write(shuffle_results_file, [key, value])
+                else:
+                    for key, values in sorter.grouped():
+                        serializer.write(shuffle_results_file, [key, *values])
+        finally:
+            sorter.cleanup()
+
+        self.shuffle_bytes += os.path.getsize(shuffle_results_filename)
+        self.record_time("shuffle", started)
+        logger.info(f"Shuffle done")
         return shuffle_results_filename
 
+    @contextlib.contextmanager
+    def __map_output(self, index: int, output: TaskOutput) -> Iterator[str]:
+        """Path of map output readable by master, removed after use if fetched"""
+        if not self.outputs_on_workers("map"):
+            yield output.path
+            return
+
+        # Only master nodes fetch files, local runner has no communication path
+        from communication.shuffle import fetch_sources, remove_fetched
+
+        fetched = fetch_sources({index: output.source()}, f"{self.job_dir}/shuffle")
+        try:
+            yield fetched[index][0]
+        finally:
+            remove_fetched(fetched.values())
+
+    def outputs_on_workers(self, stage: str) -> bool:
+        return self.worker_local_outputs or (self.partitioned and stage == "map")
+
+    def uses_slots(self, stage: str) -> bool:
+        """
+        Whether tasks take a worker slot before they are sent. Reducers of
+        pipelined job take it once map stage finishes, as they only fetch
+        map outputs until then and must not hold slots needed by map tasks.
+        """
+        return not (self.pipelined and stage == "reduce")
+
+    def waiting_for_map(self, stage: str) -> Optional[Callable[[], bool]]:
+        """Reduce tasks of pipelined job are not timed out until map finishes"""
+        if self.pipelined and stage == "reduce":
+            return lambda: not self.map_finished
+        return None
+
     def __run_stage(
-        self, stage: str, workers: list[Worker], chunk_files: list[str]
-    ) -> list[str]:
+        self,
+        stage: str,
+        workers: list[Worker],
+        stage_tasks: list[dict[str, Any]],
+        completed: Optional[dict[int, TaskOutput]] = None,
+    ) -> list[TaskOutput]:
         if stage not in ["map", "reduce"]:
             raise RuntimeError("Invalid stage: " + stage)
 
-        tasks: Queue[str] = Queue()
-        results_files: Queue[str] = Queue()
+        tasks = self.create_stage(stage, stage_tasks, workers, completed)
+        started = time.monotonic()
+        self.__run_tasks(stage, workers, tasks)
+        for reruns in itertools.count():
+            map_stage = self.lost_map_stage(tasks, reruns)
+            if map_stage is None:
+                break
+            self.__run_tasks("map", workers, map_stage)
+            tasks.suspended = not map_stage.done
+            self.__run_tasks(stage, workers, tasks)
+
+        self.finish_stage(stage, tasks, started)
+        self.log_stage_done(stage, tasks)
+        return tasks.results
+
+    def __run_tasks(self, stage: str, workers: list[Worker], tasks: Stage):
+        tasks_changed = Condition()
+        timeouts = TaskTimeouts(
+            self.task_timeout, pause_while=self.waiting_for_map(stage)
+        )
 
-        for file in chunk_files:
-            tasks.put_nowait(file)
+        stage_function: str = getattr(self, f"{stage}_function")
+        worker_function = lambda worker, task: getattr(worker, stage)(
+            stage_function, **task
+        )
 
+        # One watcher per worker slot, so each worker runs up to slots tasks
         worker_watchers: list[Thread] = []
         for worker in workers:
-            stage_function: str = getattr(self, f"{stage}_function")
-            worker_function = lambda worker, task: getattr(worker, stage)(
-                stage_function, task
-            )
-            watcher = Thread(
-                target=self.__process_tasks,
-                args=[worker, worker_function, tasks, results_files],
-            )
-            worker_watchers.append(watcher)
-            watcher.start()
+            for _ in range(worker.slots):
+                watcher = Thread(
+                    target=self.__process_tasks,
+                    args=[
+                        stage,
+                        worker,
+                        worker_function,
+                        tasks,
+                        tasks_changed,
+                        timeouts,
+                    ],
+                )
+                worker_watchers.append(watcher)
+                watcher.start()
 
         for watcher in worker_watchers:
             watcher.join()
 
-        results: list[str] = []
-        while not results_files.empty():
-            results.append(results_files.get_nowait())
-
-        return results
-
     def __process_tasks(
         self,
+        stage: str,
         worker: Worker,
         worker_function: Callable,
-        tasks: Queue[str],
-        results: Queue[str],
+        tasks: Stage,
+        tasks_changed: Condition,
+        timeouts: TaskTimeouts,
     ):
         fails = 0
-        while not tasks.empty() and fails < 3:
-            worker.task_done.clear()
-            try:
-                task = tasks.get(timeout=2)
-            except Empty:
-                return
+        while fails < MAX_TASK_FAILS:
+            with tasks_changed:
+                attempt = self.next_attempt(worker, tasks)
+                while attempt is None and not self.slot_finished(worker, tasks):
+                    tasks_changed.wait()
+                    attempt = self.next_attempt(worker, tasks)
 
-            if worker_function(worker, task) is False:
-                tasks.put(task)
-                fails += 1
-                continue
+                if attempt is None:
+                    tasks_changed.notify_all()
+                    return
+
+            index, task, task_id = attempt
+            slot = self.scheduler.slot(worker, self.job_id, self.uses_slots(stage))
+            with slot as granted:
+                started = time.monotonic()
+                if (
+                    not granted
+                    or worker_function(worker, self.attempt_data(stage, task, task_id))
+                    is False
+                ):
+                    worker.forget_task(task_id)
+                    result = None
+                elif not self.uses_slots(stage):
+                    result = self.__wait_pipelined_task(
+                        worker, task_id, index, tasks, tasks_changed, timeouts
+                    )
+                else:
+                    result = self.__wait_task(
+                        worker, task_id, index, tasks, tasks_changed, timeouts
+                    )
+
+            with tasks_changed:
+                finished = self.finish_attempt(
+                    stage, worker, tasks, index, task_id, result
+                )
+                tasks_changed.notify_all()
 
-            is_done = worker.task_done.wait(worker.timeout)
-            if is_done is False:
-                tasks.put(task)
+            if finished.failed:
                 fails += 1
-                logger.error(f"Timeout waiting for worker: {worker}")
+            elif result is not None and "output" in result:
+                timeouts.observe(time.monotonic() - started)
+            if finished.output is not None:
+                self.log_task(stage, index, finished.output)
+
+            for attempt_worker, attempt_id in finished.discarded:
+                logger.info(f"Discarding attempt on worker: {attempt_worker}")
+                attempt_worker.put_task_result(attempt_id, {"discarded": True})
+                attempt_worker.discard_task(attempt_id)
+
+    def __wait_pipelined_task(
+        self,
+        worker: Worker,
+        task_id: str,
+        index: int,
+        tasks: Stage,
+        tasks_changed: Condition,
+        timeouts: TaskTimeouts,
+    ) -> Optional[dict[str, Any]]:
+        """Waits for reducer of pipelined job, taking its slot once map finishes"""
+        while not self.map_finished:
+            result = worker.wait_task(task_id, WAIT_INTERVAL)
+            if result is not None:
+                return result
+
+        with self.scheduler.slot(worker, self.job_id) as granted:
+            if not granted:
+                worker.forget_task(task_id)
+                return None
+            return self.__wait_task(
+                worker, task_id, index, tasks, tasks_changed, timeouts
+            )
+
+    def __wait_task(
+        self,
+        worker: Worker,
+        task_id: str,
+        index: int,
+        tasks: Stage,
+        tasks_changed: Condition,
+        timeouts: TaskTimeouts,
+    ) -> Optional[dict[str, Any]]:
+        expirations = 0
+        while True:
+            timeout = timeouts.timeout
+            result = worker.wait_task(task_id, timeout)
+            if result is not None:
+                return result
+            if timeouts.paused:
                 continue
 
-            result = worker.get_last_result()
-            logger.debug(f"Result: {result}")
-            results.put(result["output"])
+            expirations += 1
+            with tasks_changed:
+                waiting = self.attempt_expired(
+                    worker, index, tasks, timeout, expirations
+                )
+                tasks_changed.notify_all()
+            if not waiting:
+                worker.forget_task(task_id)
+                return None
 
-    def __split_file(self, filename: str, chunk_size: int) -> list[str]:
-        chunk_files: list[str] = []
-        file_size = os.path.getsize(filename)
-        split_count = math.ceil(file_size / chunk_size)
+    # Scheduling of stage tasks shared by threaded and asyncio engines. Worker
+    # slots run a loop of next_attempt, sending the task and waiting for it,
+    # with attempt_expired on every expired timeout, and finish_attempt.
+    # Methods taking tasks are called with the stage locked.
 
-        with open(filename, "r") as file:
-            for i in range(split_count):
-                data = file.read(chunk_size)
-                chunk_filename = f"{os.path.dirname(filename)}/chunk_{i}_{os.path.basename(filename)}"
-                chunk_files.append(chunk_filename)
-                with open(chunk_filename, "w") as chunk_file:
-                    chunk_file.write(data)
+    def next_attempt(
+        self, worker: Any, tasks: Stage
+    ) -> Optional[tuple[int, dict[str, Any], str]]:
+        """
+        Starts attempt of the next task on worker, returns its index, task and
+        id, or None if worker has nothing to do now, see slot_finished
+        """
+        if not worker.health.alive:
+            return None
 
-        return chunk_files
+        next_task = tasks.next_task(worker)
+        if next_task is None:
+            return None
 
-    def __split_shuffle(self, filename: str, split_count: int) -> list[str]:
-        chunk_files: list[str] = []
+        index, task = next_task
+        task_id = worker.start_task()
+        tasks.start(index, worker, task_id)
+        return index, task, task_id
 
-        with open(filename, "r") as file:
-            contents = json.load(file)
+    def slot_finished(self, worker: Any, tasks: Stage) -> bool:
+        """
+        Whether slot of worker, which got no attempt, stops, otherwise it
+        waits until tasks change. Tasks of lost worker are requeued.
+        """
+        if not worker.health.alive:
+            tasks.worker_lost(worker)
+            return True
+        return tasks.done or not tasks.running
 
-        items = len(contents)
-        chunk_size = items // split_count
+    def attempt_expired(
+        self, worker: Any, index: int, tasks: Stage, timeout: float, expirations: int
+    ) -> bool:
+        """
+        Slow task is not failed on timeout, a backup attempt is started
+        instead while this one keeps running. Attempt is given up once its
+        worker stops heartbeating or after MAX_ATTEMPT_TIMEOUTS expirations.
+        Returns whether to keep waiting for it.
+        """
+        if not worker.health.alive:
+            return False
+        if expirations >= MAX_ATTEMPT_TIMEOUTS:
+            logger.error(f"Task on worker {worker} exceeded {expirations} timeouts")
+            return False
 
-        for i in range(split_count):
-            chunk_filename = (
-                f"{os.path.dirname(filename)}/chunk_{i}_{os.path.basename(filename)}"
+        logger.warning(f"Task on worker {worker} exceeded {timeout:.1f}s")
+        tasks.mark_slow(index)
+        return True
+
+    def finish_attempt(
+        self,
+        stage: str,
+        worker: Any,
+        tasks: Stage,
+        index: int,
+        task_id: str,
+        result: Optional[dict[str, Any]],
+    ) -> FinishedAttempt:
+        """Completes or fails task by result of attempt, None if it timed out"""
+        if result is None:
+            logger.error(f"Timeout waiting for worker: {worker}")
+        elif "error" in result:
+            logger.error(f"Task failed on worker: {worker}: {result['error']}")
+        elif result.get("discarded"):
+            return FinishedAttempt()
+
+        if result is None or "error" in result:
+            tasks.fail(index, worker, task_id)
+            if result is not None and "lost_source" in result:
+                self.map_output_lost(result["lost_source"], tasks)
+            # Worker removes outputs of failed tasks, abandoned attempts may
+            # still be running there
+            abandoned = result is None and worker.health.alive
+            return FinishedAttempt(
+                failed=True, discarded=[(worker, task_id)] if abandoned else []
             )
-            data = itertools.islice(
-                contents.items(), i * chunk_size, (i + 1) * chunk_size
+
+        logger.debug(f"Result: {result}")
+        output = TaskOutput(result["output"], worker.target_host, worker.target_port)
+        other_attempts = tasks.complete(index, worker, task_id, output)
+        if other_attempts is None:
+            return FinishedAttempt(discarded=[(worker, task_id)])
+
+        self.record_metrics(stage, worker, result)
+        return FinishedAttempt(output=output, discarded=other_attempts)
+
+    def attempt_data(
+        self, stage: str, task: dict[str, Any], task_id: str
+    ) -> dict[str, Any]:
+        """Command data of attempt, reducers get map outputs completed now"""
+        data = {**task, "task_id": task_id}
+        if stage == "reduce" and "partition" in task and "job_id" not in task:
+            map_outputs = self.map_stage.results if self.map_stage is not None else []
+            data["partition_sources"] = [
+                output.source(
+                    MapTask.partition_filename(output.path, task["partition"])
+                )
+                for output in map_outputs
+            ]
+        return data
+
+    def map_output_lost(self, source: dict[str, Any], tasks: Stage):
+        """
+        Reducer could not fetch map output, e.g. its worker was lost after
+        map stage. Map tasks completed by the worker are run again, reduce
+        stage is suspended until they finish, see lost_map_stage.
+        """
+        map_stage = self.map_stage
+        if map_stage is None or self.pipelined:
+            return
+
+        for worker in list(map_stage.completed_by.values()):
+            if address(worker) == (source["host"], source["port"]):
+                map_stage.worker_lost(worker)
+        if not map_stage.done:
+            tasks.suspended = True
+
+    def lost_map_stage(self, tasks: Stage, reruns: int) -> Optional[Stage]:
+        """Map stage to run again before suspended reduce stage continues"""
+        if not tasks.suspended or self.map_stage is None:
+            return None
+        if reruns >= MAX_TASK_FAILS:
+            logger.error(f"Map outputs lost {reruns} times, giving up")
+            return None
+
+        missing = len(self.map_stage.tasks) - len(self.map_stage.outputs)
+        logger.warning(f"Map outputs lost, running {missing} map tasks again")
+        return self.map_stage
+
+    def finish_stage(self, stage: str, tasks: Stage, started: float):
+        self.record_time(stage, started)
+        self.task_sizing.observe(stage, self.metrics.stages.get(stage))
+        if stage == "map":
+            self.map_finished = True
+
+        # Job must not succeed, nor be journaled as done, with missing outputs
+        if not tasks.done:
+            raise RuntimeError(
+                f"Stage {stage} finished {len(tasks.outputs)}/{len(tasks.tasks)} tasks"
             )
-            with open(chunk_filename, "w") as chunk_file:
-                json.dump(dict(data), chunk_file)
-            chunk_files.append(chunk_filename)
 
+    def __split_shuffle(self, filename: str, split_count: int) -> list[str]:
+        """
+        Splits key-sorted shuffle file into chunks with similar number of
+        values, ending on key boundaries. With split_hot_keys, values of keys
+        bigger than HOT_KEY_SHARE of a chunk are sliced over chunks instead.
+        """
+        started = time.monotonic()
+        serializer = Serializer.from_name(self.serialization)
+        codec = Codec.from_name(self.compression)
+
+        # Records hold all values of a key, or a single one for streaming
+        # reduce, so volume of a key is known at the end of its records
+        total = 0
+        biggest_keys: list[tuple[int, str]] = []
+        with codec.open(filename, "rb") as file:
+            groups = itertools.groupby(serializer.read(file), key=itemgetter(0))
+            for key, group in groups:
+                volume = sum(len(record) - 1 for record in group)
+                total += volume
+                if self.split_hot_keys and split_count > 1:
+                    heapq.heappush(biggest_keys, (volume, key))
+                    # Only this many keys can be hot
+                    if len(biggest_keys) > split_count / HOT_KEY_SHARE:
+                        heapq.heappop(biggest_keys)
+
+        hot_share = total / split_count * HOT_KEY_SHARE
+        hot_keys = {key for volume, key in biggest_keys if volume > hot_share}
+        self.hot_keys = sorted(hot_keys)
+        if self.hot_keys:
+            logger.info(f"Hot keys: {self.hot_keys}")
+
+        chunk_files = [
+            f"{os.path.dirname(filename)}/chunk_{i}_{os.path.basename(filename)}"
+            for i in range(split_count)
+        ]
+        chunk_ends = [(i + 1) * total // split_count for i in range(split_count)]
+        with codec.open(filename, "rb") as file:
+            chunk = 0
+            written = 0
+            chunk_file = codec.open(chunk_files[chunk], "wb")
+            try:
+                groups = itertools.groupby(serializer.read(file), key=itemgetter(0))
+                for key, group in groups:
+                    for record in group:
+                        values = record[1:]
+                        # Hot key fills up the chunk and continues in next one
+                        while (
+                            key in hot_keys
+                            and chunk < split_count - 1
+                            and written + len(values) > chunk_ends[chunk]
+                        ):
+                            size = chunk_ends[chunk] - written
+                            if size > 0:
+                                serializer.write(chunk_file, [key, *values[:size]])
+                                values, written = values[size:], written + size
+                            chunk_file.close()
+                            chunk += 1
+                            chunk_file = codec.open(chunk_files[chunk], "wb")
+
+                        if values:
+                            serializer.write(chunk_file, [key, *values])
+                            written += len(values)
+
+                    if chunk < split_count - 1 and written >= chunk_ends[chunk]:
+                        chunk_file.close()
+                        chunk += 1
+                        chunk_file = codec.open(chunk_files[chunk], "wb")
+            finally:
+                chunk_file.close()
+
+        # Chunks left empty by big keys at the end of the file
+        for chunk_filename in chunk_files[chunk + 1 :]:
+            codec.open(chunk_filename, "wb").close()
+
+        self.record_time("shuffle", started)
         return chunk_files
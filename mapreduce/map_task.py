@@ -1,6 +1,72 @@
-import json
-from functools import partial  # NOQA
-from typing import Callable
+import time
+from functools import partial
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+from mapreduce.compression import DEFAULT_COMPRESSION, Codec, NoCodec
+from mapreduce.input_format import InputFormat
+from mapreduce.input_split import InputSplit
+from mapreduce.partitioner import Partitioner
+from mapreduce.reduce_task import ReduceTask
+from mapreduce.serialization import DEFAULT_SERIALIZATION, Serializer
+
+# How map function is called on a split:
+#   document  once, with contents of the whole split as value
+#   lines     once per record of the split, with the record as value
+#   iterator  once, with an iterator over records of the split as value
+# Records are parsed from lines by input format, see INPUT_FORMATS.
+MAP_MODES = ["document", "lines", "iterator"]
+
+# Emitted pairs of streaming map tasks are combined and written in batches
+STREAM_BATCH_SIZE = 64 * 1024
+
+
+class MapOutputWriter:
+    """Writes map results to output file or to files of its partitions"""
+
+    def __init__(
+        self,
+        output_name: str,
+        serializer: Serializer,
+        partitioner: Optional[Partitioner] = None,
+        partitions: int = 1,
+        codec: Optional[Codec] = None,
+    ):
+        self.serializer = serializer
+        self.partitioner = partitioner
+        self.partitions = partitions
+        self.records = 0
+        self.write_time = 0.0
+
+        if partitioner is None:
+            self.filenames = [output_name]
+        else:
+            self.filenames = [
+                MapTask.partition_filename(output_name, partition)
+                for partition in range(partitions)
+            ]
+        codec = codec or NoCodec()
+        self.files: list[BinaryIO] = [codec.open(name, "wb") for name in self.filenames]
+
+    def __enter__(self) -> "MapOutputWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def write(self, results: Iterable[tuple[str, str]]):
+        started = time.perf_counter()
+        for key, value in results:
+            partition = 0
+            if self.partitioner is not None:
+                partition = self.partitioner.partition(key, self.partitions)
+            self.serializer.write(self.files[partition], [key, value])
+            self.records += 1
+        self.write_time += time.perf_counter() - started
+
+    def close(self) -> list[str]:
+        for file in self.files:
+            file.close()
+        return self.filenames
 
 
 class MapTask:
@@ -17,20 +83,137 @@ class MapTask:
     def __init__(self):
         self.call: Callable = lambda k, v: None
         self.results: list[tuple[str, str]] = []
+        self.combiner: Optional[ReduceTask] = None
+        # Streaming tasks write results in batches instead of keeping them
+        self.output: Optional[MapOutputWriter] = None
+        self.batch_size = STREAM_BATCH_SIZE
+        self.records_read = 0
 
     def execute(self, filename: str, contents: str):
         self.call(filename, contents)
 
+    def execute_split(
+        self, split: InputSplit, mode: str = "document", input_format: str = "text"
+    ):
+        """
+        Calls map function on split as selected by mode, see MAP_MODES.
+        Key is the path of input file of split.
+        """
+        if mode == "document":
+            self.records_read += 1
+            self.execute(split.path, split.read())
+            return
+
+        with split.open() as file:
+            records = InputFormat.from_name(input_format).records(
+                self.read_lines(split, file)
+            )
+            if mode == "lines":
+                for record in records:
+                    self.execute(split.path, record)
+            elif mode == "iterator":
+                self.call(split.path, records)
+            else:
+                raise ValueError(f"Unknown map mode: {mode}")
+
+    def read_lines(self, split: InputSplit, file: BinaryIO) -> Iterator[str]:
+        for line in split.lines(file):
+            self.records_read += 1
+            yield line.decode().rstrip("\r\n")
+
+    def stream_to(self, output: MapOutputWriter, batch_size: int = STREAM_BATCH_SIZE):
+        """Emitted pairs are combined and written to output in batches"""
+        self.output = output
+        self.batch_size = batch_size
+
+    def flush(self):
+        if self.output is None:
+            return
+
+        self.combine()
+        self.output.write(self.results)
+        self.results = []
+
     def load_function(self, map_func: str):
+        self.load_compiled(MapTask.compile_function(map_func))
+
+    def load_compiled(self, map_function: Callable):
+        self.call = partial(map_function, self)
+
+    @staticmethod
+    def compile_function(map_func: str) -> Callable:
+        """Returns map_function(self, key, value) defined by user code"""
         map_func = map_func.replace("emit", "self.emit")
         header = ["def map_function(self, key, value):"]
         contents = [" " * 4 + line.rstrip() for line in map_func.strip().splitlines()]
-        footer = ["self.call = partial(map_function, self)"]
-        exec("\n".join(header + contents + footer))
+        namespace: dict[str, Callable] = {}
+        exec("\n".join(header + contents), globals(), namespace)
+        return namespace["map_function"]
+
+    def load_combiner(self, combine_func: str):
+        self.load_compiled_combiner(ReduceTask.compile_function(combine_func))
+
+    def load_compiled_combiner(self, combine_function: Callable):
+        self.combiner = ReduceTask()
+        self.combiner.load_compiled(combine_function)
+
+    def combine(self):
+        """
+        Runs combiner (reduce-like function) over results grouped by key,
+        replacing results with combined values.
+        """
+        if self.combiner is None:
+            return
+
+        grouped: dict[str, list[str]] = {}
+        for key, value in self.results:
+            if key in grouped:
+                grouped[key].append(value)
+            else:
+                grouped[key] = [value]
+
+        for key, values in grouped.items():
+            self.combiner.execute(key, values)
+
+        self.results = [
+            (key, value)
+            for key, values in self.combiner.results.items()
+            for value in values
+        ]
+        self.combiner.results = {}
 
     def emit(self, key: str, value: str):
         self.results.append((key, value))
+        if self.output is not None and len(self.results) >= self.batch_size:
+            self.flush()
+
+    def store_results(
+        self,
+        output_name: str,
+        serialization: str = DEFAULT_SERIALIZATION,
+        compression: str = DEFAULT_COMPRESSION,
+    ):
+        serializer = Serializer.from_name(serialization)
+        codec = Codec.from_name(compression)
+        with MapOutputWriter(output_name, serializer, codec=codec) as output:
+            output.write(self.results)
+
+    def store_partitioned_results(
+        self,
+        output_name: str,
+        partitioner: Partitioner,
+        partitions: int,
+        serialization: str = DEFAULT_SERIALIZATION,
+        compression: str = DEFAULT_COMPRESSION,
+    ) -> list[str]:
+        serializer = Serializer.from_name(serialization)
+        codec = Codec.from_name(compression)
+        output = MapOutputWriter(
+            output_name, serializer, partitioner, partitions, codec
+        )
+        output.write(self.results)
+        return output.close()
 
-    def store_results(self, output_name: str):
-        with open(output_name, "w") as output:
-            json.dump(self.results, output)
+    @staticmethod
+    def partition_filename(output_name: str, partition: int) -> str:
+        return f"{output_name}.part{partition}"
@@ -0,0 +1,105 @@
+import bisect
+import itertools
+from collections import Counter
+from typing import Optional
+
+from mapreduce.input_split import InputSplit
+from mapreduce.map_task import MapTask
+from mapreduce.partitioner import RangePartitioner
+
+# Map function is run on the master on this many evenly spaced samples,
+# gzip files are sampled whole
+SAMPLE_SPLITS = 16
+SAMPLE_SIZE = 256 * 1024
+# Key is hot if it holds more than this fraction of the values
+# a single partition should get
+HOT_KEY_SHARE = 0.5
+
+
+def sample_key_volumes(
+    splits: list[InputSplit],
+    map_function: str,
+    map_mode: str = "document",
+    combine_function: Optional[str] = None,
+    input_format: str = "text",
+) -> Counter[str]:
+    """Estimates number of values of keys by running map on input samples"""
+    task = MapTask()
+    task.load_function(map_function)
+    if combine_function is not None:
+        task.load_combiner(combine_function)
+
+    volumes: Counter[str] = Counter()
+    for sample in sample_splits(splits):
+        task.execute_split(sample, map_mode, input_format)
+        task.combine()
+        volumes.update(key for key, _ in task.results)
+        task.results = []
+
+    return volumes
+
+
+def sample_splits(splits: list[InputSplit]) -> list[InputSplit]:
+    """Evenly spaced byte ranges of input files of splits"""
+    ends = list(itertools.accumulate(split.length for split in splits))
+    total = ends[-1] if ends else 0
+    step = max(total // SAMPLE_SPLITS, 1)
+
+    samples: list[InputSplit] = []
+    for position in range(0, total, step)[:SAMPLE_SPLITS]:
+        index = bisect.bisect_right(ends, position)
+        split = splits[index]
+        if split.compressed:
+            if split not in samples:
+                samples.append(split)
+            continue
+
+        offset = position - (ends[index] - split.length)
+        length = min(SAMPLE_SIZE, step, split.length - offset)
+        samples.append(InputSplit(split.path, split.offset + offset, length))
+    return samples
+
+
+def find_hot_keys(volumes: Counter[str], partitions: int) -> list[str]:
+    """Keys which would make their partition much bigger than others"""
+    if partitions < 2:
+        return []
+
+    share = sum(volumes.values()) / partitions
+    return sorted(
+        key for key, volume in volumes.items() if volume > share * HOT_KEY_SHARE
+    )
+
+
+def plan_partitions(
+    volumes: Counter[str], partitions: int, split_hot_keys: bool = False
+) -> RangePartitioner:
+    """
+    Chooses key ranges with similar volume of values. Hot keys are spread
+    over all partitions evenly, so only the other keys are balanced.
+    """
+    hot_keys = find_hot_keys(volumes, partitions) if split_hot_keys else []
+    hot_key_set = set(hot_keys)
+
+    ranged = sorted(
+        (key, volume) for key, volume in volumes.items() if key not in hot_key_set
+    )
+    total = sum(volume for _, volume in ranged)
+
+    # Volume left after a key bigger than its share is divided among
+    # the remaining partitions, so none of them stays empty
+    boundaries: list[str] = []
+    filled = 0
+    partition_start = 0
+    for key, volume in ranged:
+        if len(boundaries) == partitions - 1:
+            break
+        share = (total - partition_start) / (partitions - len(boundaries))
+        size = filled - partition_start
+        # Key starts next partition if this one is closer to its share without it
+        if size > 0 and size + volume / 2 >= share:
+            boundaries.append(key)
+            partition_start = filled
+        filled += volume
+
+    return RangePartitioner(boundaries, hot_keys)
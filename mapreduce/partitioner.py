@@ -0,0 +1,88 @@
+import bisect
+import random
+import zlib
+from typing import Any
+
+
+class Partitioner:
+    """
+    Assigns intermediate keys to reduce partitions.
+
+    Partitioners are sent to workers with the map command, so they
+    have to be described by a plain dict (see to_dict/from_dict).
+    """
+
+    name: str = ""
+
+    def partition(self, key: str, partitions: int) -> int:
+        raise NotImplementedError()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"name": self.name}
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> "Partitioner":
+        try:
+            partitioner_type = PARTITIONERS[data["name"]]
+        except KeyError:
+            raise ValueError(f"Unknown partitioner: {data.get('name')}")
+        return partitioner_type.from_params(data)
+
+    @classmethod
+    def from_params(cls, data: dict[str, Any]) -> "Partitioner":
+        return cls()
+
+
+class HashPartitioner(Partitioner):
+    """
+    Default partitioner: hash(key) mod R.
+
+    Uses crc32 instead of builtin hash, which is randomized per process
+    and would send the same key to different partitions on each worker.
+    """
+
+    name = "hash"
+
+    def partition(self, key: str, partitions: int) -> int:
+        return zlib.crc32(key.encode()) % partitions
+
+
+class RangePartitioner(Partitioner):
+    """
+    Assigns sorted ranges of keys to partitions, keys from boundaries[i - 1]
+    up to, but excluding, boundaries[i] go to partition i. Values of hot keys
+    are spread over all partitions at random, reducers produce partial
+    results of them, which are merged after reduce stage.
+
+    Boundaries are chosen by partition_planner, so partitions get similar
+    volume of values.
+    """
+
+    name = "range"
+
+    def __init__(self, boundaries: list[str], hot_keys: list[str]):
+        self.boundaries = boundaries
+        self.hot_keys = hot_keys
+        self.hot_key_set = set(hot_keys)
+
+    def partition(self, key: str, partitions: int) -> int:
+        if key in self.hot_key_set:
+            return random.randrange(partitions)
+        return min(bisect.bisect_right(self.boundaries, key), partitions - 1)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "boundaries": self.boundaries,
+            "hot_keys": self.hot_keys,
+        }
+
+    @classmethod
+    def from_params(cls, data: dict[str, Any]) -> "Partitioner":
+        return cls(data["boundaries"], data["hot_keys"])
+
+
+PARTITIONERS: dict[str, type[Partitioner]] = {
+    HashPartitioner.name: HashPartitioner,
+    RangePartitioner.name: RangePartitioner,
+}
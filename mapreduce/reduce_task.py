@@ -1,6 +1,37 @@
 import json
-from functools import partial  # NOQA
-from typing import Callable
+from functools import partial
+from typing import Callable, Iterable, Optional
+
+
+class ReduceOutputWriter:
+    """
+    Writes reduce results key by key into a JSON object, the same file
+    as ReduceTask.store_results writes, without keeping all of them.
+    """
+
+    def __init__(self, output_name: str):
+        self.file = open(output_name, "w")
+        self.file.write("{")
+        self.keys = 0
+        self.records = 0
+
+    def __enter__(self) -> "ReduceOutputWriter":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def write(self, key: str, values: list[str]):
+        if self.keys:
+            self.file.write(", ")
+        self.file.write(f"{json.dumps(key)}: {json.dumps(values)}")
+        self.keys += 1
+        self.records += len(values)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.write("}")
+            self.file.close()
 
 
 class ReduceTask:
@@ -16,19 +47,58 @@ class ReduceTask:
         self.call: Callable = lambda k, v: None
         self.results: dict[str, list[str]] = {}
         self.key = ""
+        # Streaming tasks write results of every key once it is reduced,
+        # results of hot keys go to hot_output
+        self.output: Optional[ReduceOutputWriter] = None
+        self.hot_output: Optional[ReduceOutputWriter] = None
+        self.hot_keys: set[str] = set()
 
-    def execute(self, key: str, values: list[str]):
+    def execute(self, key: str, values: Iterable[str]):
         self.key = key
         self.call(key, values)
+        if self.output is not None and key in self.results:
+            output = self.output
+            if self.hot_output is not None and key in self.hot_keys:
+                output = self.hot_output
+            output.write(key, self.results.pop(key))
+
+    def stream_to(
+        self,
+        output: ReduceOutputWriter,
+        hot_output: Optional[ReduceOutputWriter] = None,
+        hot_keys: Iterable[str] = (),
+    ):
+        self.output = output
+        self.hot_output = hot_output
+        self.hot_keys = set(hot_keys)
+
+    def write_results(self, output: ReduceOutputWriter, keys: Iterable[str]):
+        """Moves results of keys to output"""
+        for key in keys:
+            if key in self.results:
+                output.write(key, self.results.pop(key))
+
+    @staticmethod
+    def hot_keys_filename(output_name: str) -> str:
+        return f"{output_name}.hot"
 
     def load_function(self, reduce_func: str):
+        self.load_compiled(ReduceTask.compile_function(reduce_func))
+
+    def load_compiled(self, reduce_function: Callable):
+        self.call = partial(reduce_function, self)
+
+    @staticmethod
+    def compile_function(reduce_func: str) -> Callable:
+        """Returns reduce_function(self, key, values) defined by user code"""
         reduce_func = reduce_func.replace("emit", "self.emit")
         header = ["def reduce_function(self, key, values):"]
         contents = [
             " " * 4 + line.rstrip() for line in reduce_func.strip().splitlines()
         ]
-        footer = ["self.call = partial(reduce_function, self)"]
-        exec("\n".join(header + contents + footer))
+        namespace: dict[str, Callable] = {}
+        exec("\n".join(header + contents), globals(), namespace)
+        return namespace["reduce_function"]
 
     def emit(self, value: str):
         if self.key in self.results:
@@ -0,0 +1,149 @@
+import asyncio
+import itertools
+import threading
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator, Optional
+
+# Waiting for a slot is rechecked this often, so lost workers are noticed
+WAIT_INTERVAL = 1.0
+
+Address = tuple[str, int]
+
+
+def address(worker: Any) -> Address:
+    return (worker.target_host, worker.target_port)
+
+
+class FairScheduler:
+    """
+    Shares slots of workers between jobs running at the same time. Tasks
+    take a slot of their worker before they are sent to it. A freed slot
+    goes to the waiting job with the fewest running tasks, then to the
+    earliest submitted one, so every running job gets an equal share of
+    the cluster and small jobs are not queued behind big ones.
+    """
+
+    def __init__(self) -> None:
+        self.changed = threading.Condition()
+        self.job_order: dict[str, int] = {}
+        self.order = itertools.count()
+        # Running tasks by job and taken slots by worker address
+        self.running: Counter[str] = Counter()
+        self.taken: Counter[Address] = Counter()
+        # Tasks waiting for a slot by worker address and job
+        self.waiting: dict[Address, Counter[str]] = {}
+
+    @contextmanager
+    def slot(self, worker: Any, job_id: str, needed: bool = True) -> Iterator[bool]:
+        """
+        Holds a slot of worker for job while the block runs. Yields False
+        if worker was lost while waiting. Tasks which do not run in a slot
+        of worker right away, like reducers of pipelined jobs waiting for
+        map outputs, are not needed to take one.
+        """
+        if not needed:
+            yield True
+            return
+
+        with self.changed:
+            self.add_waiting(worker, job_id)
+            try:
+                while worker.health.alive and self.next_job(worker) != job_id:
+                    self.changed.wait(WAIT_INTERVAL)
+            finally:
+                self.remove_waiting(worker, job_id)
+
+            granted = worker.health.alive
+            if granted:
+                self.take(worker, job_id)
+            self.changed.notify_all()
+
+        try:
+            yield granted
+        finally:
+            if granted:
+                with self.changed:
+                    self.release(worker, job_id)
+                    self.changed.notify_all()
+
+    def next_job(self, worker: Any) -> Optional[str]:
+        """Job which gets the next free slot of worker"""
+        waiting = self.waiting.get(address(worker))
+        if not waiting or self.taken[address(worker)] >= worker.slots:
+            return None
+        return min(waiting, key=lambda job: (self.running[job], self.job_order[job]))
+
+    def remove_job(self, job_id: str):
+        self.job_order.pop(job_id, None)
+
+    @property
+    def running_jobs(self) -> dict[str, int]:
+        """Running tasks of jobs, read from other threads"""
+        return dict(self.running)
+
+    def add_waiting(self, worker: Any, job_id: str):
+        self.job_order.setdefault(job_id, next(self.order))
+        self.waiting.setdefault(address(worker), Counter())[job_id] += 1
+
+    def remove_waiting(self, worker: Any, job_id: str):
+        waiting = self.waiting[address(worker)]
+        waiting[job_id] -= 1
+        if waiting[job_id] == 0:
+            del waiting[job_id]
+        if not waiting:
+            del self.waiting[address(worker)]
+
+    def take(self, worker: Any, job_id: str):
+        self.running[job_id] += 1
+        self.taken[address(worker)] += 1
+
+    def release(self, worker: Any, job_id: str):
+        self.running[job_id] -= 1
+        self.taken[address(worker)] -= 1
+        # Counters do not keep finished jobs and lost workers
+        if self.running[job_id] == 0:
+            del self.running[job_id]
+        if self.taken[address(worker)] == 0:
+            del self.taken[address(worker)]
+
+
+class AsyncFairScheduler(FairScheduler):
+    """FairScheduler of jobs running on an asyncio event loop"""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.async_changed = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot_async(
+        self, worker: Any, job_id: str, needed: bool = True
+    ) -> AsyncIterator[bool]:
+        """See FairScheduler.slot"""
+        if not needed:
+            yield True
+            return
+
+        async with self.async_changed:
+            self.add_waiting(worker, job_id)
+            try:
+                while worker.health.alive and self.next_job(worker) != job_id:
+                    try:
+                        await asyncio.wait_for(self.async_changed.wait(), WAIT_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.remove_waiting(worker, job_id)
+
+            granted = worker.health.alive
+            if granted:
+                self.take(worker, job_id)
+            self.async_changed.notify_all()
+
+        try:
+            yield granted
+        finally:
+            if granted:
+                async with self.async_changed:
+                    self.release(worker, job_id)
+                    self.async_changed.notify_all()
@@ -0,0 +1,86 @@
+import json
+import struct
+from typing import BinaryIO, Iterable, Iterator
+
+# Records are lists of strings, e.g. [key, value] for map outputs
+# or [key, *values] for grouped shuffle results
+Record = list[str]
+
+LENGTH = struct.Struct("!I")
+
+
+class Serializer:
+    """Streaming format of intermediate files, always opened in binary mode"""
+
+    name: str = ""
+
+    def write(self, file: BinaryIO, record: Record):
+        raise NotImplementedError()
+
+    def read(self, file: BinaryIO) -> Iterator[Record]:
+        raise NotImplementedError()
+
+    def write_all(self, file: BinaryIO, records: Iterable[Record]):
+        for record in records:
+            self.write(file, record)
+
+    @staticmethod
+    def from_name(name: str) -> "Serializer":
+        try:
+            return SERIALIZERS[name]()
+        except KeyError:
+            raise ValueError(f"Unknown serialization: {name}")
+
+
+class JsonSerializer(Serializer):
+    """One JSON list per line, human readable, useful for debugging"""
+
+    name = "json"
+
+    def write(self, file: BinaryIO, record: Record):
+        file.write(json.dumps(record).encode() + b"\n")
+
+    def read(self, file: BinaryIO) -> Iterator[Record]:
+        for line in file:
+            yield json.loads(line)
+
+
+class BinarySerializer(Serializer):
+    """
+    Length-prefixed records:
+        field count, length of every field, utf-8 encoded fields
+    All integers are unsigned 32-bit big endian.
+    """
+
+    name = "binary"
+
+    def write(self, file: BinaryIO, record: Record):
+        fields = [field.encode() for field in record]
+        lengths = [len(field) for field in fields]
+        header = struct.pack(f"!I{len(fields)}I", len(fields), *lengths)
+        file.write(header + b"".join(fields))
+
+    def read(self, file: BinaryIO) -> Iterator[Record]:
+        while True:
+            header = file.read(LENGTH.size)
+            if not header:
+                return
+
+            (count,) = LENGTH.unpack(header)
+            lengths = struct.unpack(f"!{count}I", file.read(count * LENGTH.size))
+            data = file.read(sum(lengths))
+
+            record: Record = []
+            position = 0
+            for length in lengths:
+                record.append(data[position : position + length].decode())
+                position += length
+            yield record
+
+
+SERIALIZERS: dict[str, type[Serializer]] = {
+    JsonSerializer.name: JsonSerializer,
+    BinarySerializer.name: BinarySerializer,
+}
+
+DEFAULT_SERIALIZATION = BinarySerializer.name
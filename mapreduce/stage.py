@@ -0,0 +1,164 @@
+from collections import deque
+from typing import Any, Optional
+
+import attr
+
+# Attempt of a task: (worker, task_id)
+Attempt = tuple[Any, str]
+
+
+@attr.s(auto_attribs=True)
+class TaskOutput:
+    """Output file of a task and address of worker which wrote it"""
+
+    path: str
+    host: str
+    port: int
+
+    def source(self, path: Optional[str] = None) -> dict[str, Any]:
+        """Source of file written by the same task, for shuffle service"""
+        return {"host": self.host, "port": self.port, "path": path or self.path}
+
+    @staticmethod
+    def shared(path: str) -> "TaskOutput":
+        """Output on storage shared by all nodes, not served by any worker"""
+        return TaskOutput(path, "", 0)
+
+
+class Stage:
+    """
+    Tasks of a single map/reduce stage shared by all worker slots.
+
+    Every task may run as several attempts. When no task is pending and
+    at least speculative_threshold of tasks are finished, idle workers
+    get backup attempts of still running tasks. Tasks exceeding their
+    timeout get backup attempts regardless of the threshold. The first
+    finished attempt wins, the others should be discarded.
+
+    If outputs_on_workers is set, outputs are lost with the worker
+    which wrote them and its completed tasks are run again.
+
+    While suspended, e.g. until lost inputs of its tasks are produced
+    again, no attempts are started.
+
+    Stage is not thread safe, schedulers have to synchronize access.
+    """
+
+    MAX_ATTEMPTS = 2
+
+    def __init__(
+        self,
+        tasks: list[dict[str, Any]],
+        speculative_threshold: Optional[float],
+        outputs_on_workers: bool = False,
+    ) -> None:
+        self.tasks = tasks
+        self.speculative_threshold = speculative_threshold
+        self.outputs_on_workers = outputs_on_workers
+        self.pending: deque[int] = deque(range(len(tasks)))
+        self.running: dict[int, list[Attempt]] = {}
+        self.outputs: dict[int, TaskOutput] = {}
+        self.completed_by: dict[int, Any] = {}
+        self.slow: set[int] = set()
+        self.suspended = False
+
+    @property
+    def done(self) -> bool:
+        return len(self.outputs) == len(self.tasks)
+
+    @property
+    def results(self) -> list[TaskOutput]:
+        return [self.outputs[index] for index in sorted(self.outputs)]
+
+    def next_task(self, worker: Any) -> Optional[tuple[int, dict[str, Any]]]:
+        """Returns task to be started by worker or None if there is nothing to do"""
+        if self.suspended:
+            return None
+
+        if self.pending:
+            index = self.pending.popleft()
+            return index, self.tasks[index]
+
+        speculation_allowed = self.__speculation_allowed()
+        for index, attempts in self.running.items():
+            if not speculation_allowed and index not in self.slow:
+                continue
+            if len(attempts) < Stage.MAX_ATTEMPTS and all(
+                attempt_worker is not worker for attempt_worker, _ in attempts
+            ):
+                return index, self.tasks[index]
+        return None
+
+    def start(self, index: int, worker: Any, task_id: str):
+        self.running.setdefault(index, []).append((worker, task_id))
+
+    def complete(
+        self, index: int, worker: Any, task_id: str, output: TaskOutput
+    ) -> Optional[list[Attempt]]:
+        """
+        Returns other attempts of the task to discard,
+        or None if another attempt has already completed it.
+        """
+        attempts = self.running.pop(index, [])
+        if index in self.outputs:
+            return None
+
+        self.outputs[index] = output
+        self.completed_by[index] = worker
+        self.slow.discard(index)
+        return [attempt for attempt in attempts if attempt[1] != task_id]
+
+    def restore(self, index: int, output: TaskOutput, worker: Any = None):
+        """
+        Completes task by output written before the stage started, e.g.
+        found in map cache or in journal of resumed job. Output on worker
+        is lost with it like outputs of tasks completed in this stage.
+        """
+        self.pending.remove(index)
+        self.outputs[index] = output
+        if worker is not None:
+            self.completed_by[index] = worker
+
+    def fail(self, index: int, worker: Any, task_id: str):
+        """Requeues task if failed attempt was its last one, repeated calls are ignored"""
+        running = self.running.get(index, [])
+        attempts = [a for a in running if a[1] != task_id]
+        if len(attempts) == len(running):
+            return
+
+        if attempts:
+            self.running[index] = attempts
+        else:
+            self.running.pop(index, None)
+
+        if index not in self.outputs and index not in self.running:
+            self.pending.append(index)
+
+    def __speculation_allowed(self) -> bool:
+        if self.speculative_threshold is None:
+            return False
+        return len(self.outputs) >= self.speculative_threshold * len(self.tasks)
+
+    def mark_slow(self, index: int):
+        """Task exceeded its timeout, allow a backup attempt"""
+        if index in self.running:
+            self.slow.add(index)
+
+    def worker_lost(self, worker: Any):
+        """
+        Requeues tasks running only on lost worker and, if outputs
+        are stored on workers, tasks completed by it.
+        """
+        for index, attempts in list(self.running.items()):
+            for attempt_worker, task_id in attempts:
+                if attempt_worker is worker:
+                    self.fail(index, worker, task_id)
+
+        if not self.outputs_on_workers:
+            return
+
+        for index, completed_worker in list(self.completed_by.items()):
+            if completed_worker is worker:
+                del self.completed_by[index]
+                del self.outputs[index]
+                self.pending.append(index)
@@ -0,0 +1,76 @@
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+import attr
+
+
+@attr.s(auto_attribs=True)
+class TaskMetrics:
+    """
+    Metrics of a task measured by the worker process running it, summed
+    over tasks when aggregated. Times are in seconds:
+        function_time       user map/reduce/combine functions
+        serialization_time  reading inputs and writing outputs of task
+        fetch_time          fetching partitions from other workers, reducers
+                            of pipelined jobs also wait there for map outputs
+        queue_wait          waiting for a free slot on worker
+    """
+
+    tasks: int = 1
+    records_in: int = 0
+    records_out: int = 0
+    bytes_read: int = 0
+    bytes_written: int = 0
+    function_time: float = 0.0
+    serialization_time: float = 0.0
+    fetch_time: float = 0.0
+    queue_wait: float = 0.0
+
+    @contextmanager
+    def timed(self, metric: str) -> Iterator[None]:
+        """Adds time spent in the block to metric"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            setattr(self, metric, getattr(self, metric) + elapsed)
+
+    def add(self, other: "TaskMetrics"):
+        for field in attr.fields(TaskMetrics):
+            setattr(
+                self, field.name, getattr(self, field.name) + getattr(other, field.name)
+            )
+
+    def to_dict(self) -> dict[str, Any]:
+        return attr.asdict(self)
+
+    @staticmethod
+    def from_dict(data: dict[str, Any]) -> "TaskMetrics":
+        names = {field.name for field in attr.fields(TaskMetrics)}
+        return TaskMetrics(**{k: v for k, v in data.items() if k in names})
+
+
+@attr.s(auto_attribs=True)
+class JobMetrics:
+    """Metrics of completed tasks of a job, per stage and per stage worker"""
+
+    stages: dict[str, TaskMetrics] = attr.Factory(dict)
+    workers: dict[str, dict[str, TaskMetrics]] = attr.Factory(dict)
+
+    def record(self, stage: str, worker: str, metrics: TaskMetrics):
+        self.stages.setdefault(stage, TaskMetrics(tasks=0)).add(metrics)
+        stage_workers = self.workers.setdefault(stage, {})
+        stage_workers.setdefault(worker, TaskMetrics(tasks=0)).add(metrics)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "stages": {
+                stage: metrics.to_dict() for stage, metrics in self.stages.items()
+            },
+            "workers": {
+                stage: {worker: metrics.to_dict() for worker, metrics in items.items()}
+                for stage, items in self.workers.items()
+            },
+        }
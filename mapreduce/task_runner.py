@@ -0,0 +1,267 @@
+import itertools
+import os
+import time
+from operator import itemgetter
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from communication.shuffle import fetch_sources
+from mapreduce.compression import DEFAULT_COMPRESSION, Codec
+from mapreduce.external_sort import ExternalSorter
+from mapreduce.function_registry import LRUCache
+from mapreduce.input_split import InputSplit
+from mapreduce.map_task import MapOutputWriter, MapTask
+from mapreduce.partitioner import Partitioner
+from mapreduce.reduce_task import ReduceOutputWriter, ReduceTask
+from mapreduce.serialization import DEFAULT_SERIALIZATION, Serializer
+from mapreduce.task_metrics import TaskMetrics
+
+# Entry points of map and reduce tasks executed in worker processes.
+# They take the data of map/reduce command, so they can be pickled
+# and sent to a process pool.
+
+# User functions compiled by this process, by (function name, digest)
+compiled_functions: LRUCache[Callable] = LRUCache()
+
+
+def load_function(
+    data: dict[str, Any], name: str, compile_function: Callable[[str], Callable]
+) -> Callable:
+    digest: str = data[f"{name}_digest"]
+    function = compiled_functions.get((name, digest))
+    if function is None:
+        function = compile_function(data["functions"][digest])
+        compiled_functions.put((name, digest), function)
+    return function
+
+
+def task_outputs(data: dict[str, Any], output_filename: str) -> list[str]:
+    """Files written by map/reduce task with given command data"""
+    if "partitions" in data:
+        return [
+            MapTask.partition_filename(output_filename, partition)
+            for partition in range(data["partitions"])
+        ]
+    if "hot_keys" in data:
+        return [output_filename, ReduceTask.hot_keys_filename(output_filename)]
+    return [output_filename]
+
+
+def start_metrics(data: dict[str, Any]) -> TaskMetrics:
+    """Metrics of task starting now, worker sets submitted and fetch_time"""
+    metrics = TaskMetrics(fetch_time=data.get("fetch_time", 0.0))
+    if "submitted" in data:
+        metrics.queue_wait = max(time.time() - data["submitted"], 0.0)
+    return metrics
+
+
+def counted(values: Iterable[str], metrics: TaskMetrics) -> Iterator[str]:
+    for value in values:
+        metrics.records_in += 1
+        yield value
+
+
+def reduce_groups(
+    task: ReduceTask, groups: Iterable[tuple[str, Iterable[str]]], metrics: TaskMetrics
+):
+    """
+    Runs reduce on groups, time of reading them is serialization time.
+    Streamed values are read by reduce function, so in its time.
+    """
+    started = time.perf_counter()
+    function_time = metrics.function_time
+    for key, values in groups:
+        if isinstance(values, list):
+            metrics.records_in += len(values)
+        else:
+            values = counted(values, metrics)
+        with metrics.timed("function_time"):
+            task.execute(key, values)
+
+    elapsed = time.perf_counter() - started
+    metrics.serialization_time += elapsed - (metrics.function_time - function_time)
+
+
+def run_map(data: dict[str, Any], output_filename: str) -> tuple[str, dict[str, Any]]:
+    metrics = start_metrics(data)
+    split = InputSplit.from_dict(data["split"])
+
+    task = MapTask()
+    task.load_compiled(load_function(data, "map_function", MapTask.compile_function))
+
+    if "combine_function_digest" in data:
+        task.load_compiled_combiner(
+            load_function(data, "combine_function", ReduceTask.compile_function)
+        )
+
+    mode = data.get("map_mode", "document")
+    if mode == "document":
+        run_document_map(task, split, data, output_filename, metrics)
+    else:
+        run_streaming_map(task, split, mode, data, output_filename, metrics)
+    metrics.records_in = task.records_read
+    metrics.bytes_read = split.length
+
+    metrics.bytes_written = sum(
+        os.path.getsize(output) for output in task_outputs(data, output_filename)
+    )
+    return output_filename, metrics.to_dict()
+
+
+def run_document_map(
+    task: MapTask,
+    split: InputSplit,
+    data: dict[str, Any],
+    output_filename: str,
+    metrics: TaskMetrics,
+):
+    """Reads whole split and keeps all emitted pairs until map finishes"""
+    serialization = data.get("serialization", DEFAULT_SERIALIZATION)
+    compression = data.get("compression", DEFAULT_COMPRESSION)
+    with metrics.timed("function_time"):
+        task.execute_split(split)
+        task.combine()
+    metrics.records_out = len(task.results)
+
+    with metrics.timed("serialization_time"):
+        if "partitions" in data:
+            partitioner = Partitioner.from_dict(data["partitioner"])
+            task.store_partitioned_results(
+                output_filename,
+                partitioner,
+                data["partitions"],
+                serialization,
+                compression,
+            )
+        else:
+            task.store_results(output_filename, serialization, compression)
+
+
+def run_streaming_map(
+    task: MapTask,
+    split: InputSplit,
+    mode: str,
+    data: dict[str, Any],
+    output_filename: str,
+    metrics: TaskMetrics,
+):
+    """
+    Reads split line by line and writes emitted pairs in batches,
+    so memory use does not depend on split size. Batches are
+    combined separately.
+    """
+    serializer = Serializer.from_name(data.get("serialization", DEFAULT_SERIALIZATION))
+    partitioner: Optional[Partitioner] = None
+    if "partitions" in data:
+        partitioner = Partitioner.from_dict(data["partitioner"])
+
+    with MapOutputWriter(
+        output_filename,
+        serializer,
+        partitioner,
+        data.get("partitions", 1),
+        Codec.from_name(data.get("compression", DEFAULT_COMPRESSION)),
+    ) as output:
+        task.stream_to(output)
+        with metrics.timed("function_time"):
+            task.execute_split(split, mode, data.get("input_format", "text"))
+            task.flush()
+
+    metrics.function_time -= output.write_time
+    metrics.serialization_time += output.write_time
+    metrics.records_out = output.records
+
+
+def run_reduce(
+    data: dict[str, Any], output_filename: str
+) -> tuple[str, dict[str, Any]]:
+    metrics = start_metrics(data)
+    serializer = Serializer.from_name(data.get("serialization", DEFAULT_SERIALIZATION))
+
+    task = ReduceTask()
+    task.load_compiled(
+        load_function(data, "reduce_function", ReduceTask.compile_function)
+    )
+
+    # Streaming tasks get values of a key as an iterator and write results
+    # of every key right away, so neither has to fit in memory
+    streaming = data.get("streaming", False)
+    output: Optional[ReduceOutputWriter] = None
+    # Partial results of hot keys split over many reducers are written
+    # separately, master merges them after reduce stage
+    hot_output: Optional[ReduceOutputWriter] = None
+    if "hot_keys" in data:
+        hot_output = ReduceOutputWriter(ReduceTask.hot_keys_filename(output_filename))
+    if streaming:
+        output = ReduceOutputWriter(output_filename)
+        task.stream_to(output, hot_output, data.get("hot_keys", []))
+
+    try:
+        reduce_input(task, data, output_filename, serializer, metrics)
+        if output is None:
+            metrics.records_out = sum(len(values) for values in task.results.values())
+            with metrics.timed("serialization_time"):
+                if hot_output is not None:
+                    task.write_results(hot_output, data["hot_keys"])
+                task.store_results(output_filename)
+        else:
+            metrics.records_out = output.records
+            if hot_output is not None:
+                metrics.records_out += hot_output.records
+    finally:
+        for writer in [output, hot_output]:
+            if writer is not None:
+                writer.close()
+
+    metrics.bytes_written = sum(
+        os.path.getsize(output) for output in task_outputs(data, output_filename)
+    )
+    return output_filename, metrics.to_dict()
+
+
+def reduce_input(
+    task: ReduceTask,
+    data: dict[str, Any],
+    output_filename: str,
+    serializer: Serializer,
+    metrics: TaskMetrics,
+):
+    streaming = data.get("streaming", False)
+    codec = Codec.from_name(data.get("compression", DEFAULT_COMPRESSION))
+    if "partition_sources" in data or "fetched_partitions" in data:
+        # Partitions are fetched from shuffle services of map workers,
+        # pipelined jobs fetch them before the task is started
+        if "fetched_partitions" in data:
+            partition_files = data["fetched_partitions"]
+        else:
+            sources = dict(enumerate(data["partition_sources"]))
+            with metrics.timed("fetch_time"):
+                fetched_sources = fetch_sources(
+                    sources, output_filename, data.get("local_address")
+                )
+            partition_files = [fetched_sources[i] for i in sorted(fetched_sources)]
+
+        sorter = ExternalSorter(output_filename, serializer=serializer, codec=codec)
+        with metrics.timed("serialization_time"):
+            for partition_file, fetched in partition_files:
+                metrics.bytes_read += os.path.getsize(partition_file)
+                with codec.open(partition_file, "rb") as file:
+                    sorter.add_all(serializer.read(file))
+                if fetched:
+                    os.remove(partition_file)
+
+        groups = sorter.streamed_groups() if streaming else sorter.grouped()
+        reduce_groups(task, groups, metrics)
+        sorter.cleanup()
+    else:
+        metrics.bytes_read = os.path.getsize(data["filename"])
+        with codec.open(data["filename"], "rb") as file:
+            records = serializer.read(file)
+            if streaming:
+                # Shuffle of streaming jobs writes a record per value
+                grouped = itertools.groupby(records, key=itemgetter(0))
+                groups = (
+                    (key, (value for _, value in group)) for key, group in grouped
+                )
+            else:
+                groups = ((key, values) for key, *values in records)
+            reduce_groups(task, groups, metrics)
@@ -0,0 +1,70 @@
+import math
+from typing import Optional
+
+import attr
+
+from mapreduce.task_metrics import TaskMetrics
+
+# Throughput of a single slot in bytes/s assumed until tasks are observed
+DEFAULT_THROUGHPUT = 4 * 1024 * 1024
+MIN_SPLIT_SIZE = 64 * 1024
+MAX_SPLIT_SIZE = 1024 * 1024 * 1024
+# Reduce tasks are limited to this many waves over all worker slots
+MAX_REDUCE_WAVES = 4
+# Weight of the newest observation in throughput estimates
+SMOOTHING = 0.5
+
+
+@attr.s(auto_attribs=True)
+class TaskSizing:
+    """
+    Picks map split sizes and reduce partition counts, so tasks take about
+    target duration. Throughput of slots and size of map outputs relative
+    to their inputs are estimated from metrics of finished stages.
+    """
+
+    # Bytes/s of a single slot by stage, defaults are used until observed
+    throughput: dict[str, float] = attr.Factory(dict)
+    output_ratio: Optional[float] = None
+    min_split_size: int = MIN_SPLIT_SIZE
+    max_split_size: int = MAX_SPLIT_SIZE
+
+    def observe(self, stage: str, metrics: Optional[TaskMetrics]):
+        """Updates estimates with metrics of tasks of finished stage"""
+        if metrics is None or metrics.bytes_read == 0:
+            return
+
+        busy_time = metrics.function_time + metrics.serialization_time
+        if busy_time > 0:
+            self.throughput[stage] = self.__smooth(
+                self.throughput.get(stage), metrics.bytes_read / busy_time
+            )
+        if stage == "map":
+            self.output_ratio = self.__smooth(
+                self.output_ratio, metrics.bytes_written / metrics.bytes_read
+            )
+
+    def split_size(self, input_size: int, slots: int, target_duration: float) -> int:
+        size = self.throughput.get("map", DEFAULT_THROUGHPUT) * target_duration
+        # Every slot gets a task, even if they are shorter than target
+        size = min(size, math.ceil(input_size / max(slots, 1)))
+        return int(min(max(size, self.min_split_size), self.max_split_size))
+
+    def partitions(
+        self, reduce_input_size: float, slots: int, target_duration: float
+    ) -> int:
+        partition_size = (
+            self.throughput.get("reduce", DEFAULT_THROUGHPUT) * target_duration
+        )
+        partitions = math.ceil(reduce_input_size / partition_size)
+        return max(1, min(partitions, slots * MAX_REDUCE_WAVES))
+
+    def reduce_input_size(self, input_size: int) -> float:
+        """Estimated size of map outputs of input"""
+        return input_size * (self.output_ratio or 1.0)
+
+    @staticmethod
+    def __smooth(previous: Optional[float], observed: float) -> float:
+        if previous is None:
+            return observed
+        return SMOOTHING * observed + (1 - SMOOTHING) * previous
@@ -0,0 +1,44 @@
+from collections import deque
+from typing import Callable, Optional
+
+DEFAULT_TASK_TIMEOUT = 60.0
+MIN_TASK_TIMEOUT = 10.0
+TIMEOUT_FACTOR = 4.0
+DURATIONS_WINDOW = 100
+
+
+class TaskTimeouts:
+    """
+    Timeout of tasks in a stage, derived from durations of recently
+    finished tasks: factor * longest duration, but at least minimum.
+    Before any task finishes the initial timeout is used.
+
+    While pause_while returns True, expired timeouts are not counted,
+    e.g. reduce tasks of pipelined job waiting for map stage.
+    """
+
+    def __init__(
+        self,
+        initial: float = DEFAULT_TASK_TIMEOUT,
+        minimum: float = MIN_TASK_TIMEOUT,
+        factor: float = TIMEOUT_FACTOR,
+        pause_while: Optional[Callable[[], bool]] = None,
+    ) -> None:
+        self.initial = initial
+        self.minimum = minimum
+        self.factor = factor
+        self.pause_while = pause_while
+        self.durations: deque[float] = deque(maxlen=DURATIONS_WINDOW)
+
+    def observe(self, duration: float):
+        self.durations.append(duration)
+
+    @property
+    def paused(self) -> bool:
+        return self.pause_while is not None and self.pause_while()
+
+    @property
+    def timeout(self) -> float:
+        if not self.durations:
+            return self.initial
+        return max(self.minimum, self.factor * max(self.durations))
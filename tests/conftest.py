@@ -0,0 +1,37 @@
+import itertools
+import os
+import sys
+from typing import Callable
+
+import attr
+import pytest
+
+# Nodes import their modules the same way as scripts started from communication
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "communication")
+)
+
+
+@attr.s(auto_attribs=True)
+class Health:
+    alive: bool = True
+
+
+@attr.s(auto_attribs=True, eq=False)
+class FakeWorker:
+    """Worker as seen by scheduler and stages, without a connection"""
+
+    target_host: str
+    target_port: int
+    slots: int = 1
+    health: Health = attr.Factory(Health)
+    task_ids: itertools.count = attr.Factory(itertools.count)
+
+    def start_task(self) -> str:
+        return f"{self.target_port}_{next(self.task_ids)}"
+
+
+@pytest.fixture
+def make_worker() -> Callable[..., FakeWorker]:
+    ports = itertools.count(9000)
+    return lambda slots=1: FakeWorker("localhost", next(ports), slots)
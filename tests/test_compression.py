@@ -0,0 +1,45 @@
+import pytest
+
+from mapreduce.compression import BLOCK_SIZE, CODECS, Codec
+from mapreduce.serialization import Serializer
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_codec_round_trip_over_blocks(tmp_path, name):
+    codec = Codec.from_name(name)
+    data = bytes(range(256)) * (BLOCK_SIZE // 256 * 2 + 3)
+    path = str(tmp_path / "data")
+    with codec.open(path, "wb") as file:
+        # Writes not aligned to blocks
+        for start in range(0, len(data), 100_000):
+            file.write(data[start : start + 100_000])
+
+    with codec.open(path, "rb") as file:
+        assert file.read() == data
+
+
+@pytest.mark.parametrize("name", CODECS)
+def test_codec_with_serializer(tmp_path, name):
+    codec = Codec.from_name(name)
+    serializer = Serializer.from_name("binary")
+    records = [[f"key{i}", str(i)] for i in range(50_000)]
+    path = str(tmp_path / "records")
+    with codec.open(path, "wb") as file:
+        serializer.write_all(file, records)
+
+    with codec.open(path, "rb") as file:
+        assert list(serializer.read(file)) == records
+
+
+def test_codec_compresses():
+    data = b"abc" * 10_000
+    for name in ["zlib", "bz2", "lzma"]:
+        codec = Codec.from_name(name)
+        compressed = codec.compress(data)
+        assert len(compressed) < len(data)
+        assert codec.decompress(compressed) == data
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        Codec.from_name("snappy")
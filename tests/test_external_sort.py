@@ -0,0 +1,76 @@
+import os
+import random
+
+import pytest
+
+from mapreduce.compression import Codec
+from mapreduce.external_sort import ExternalSorter
+from mapreduce.serialization import Serializer
+
+
+def records(count: int, keys: int) -> list[tuple[str, str]]:
+    rng = random.Random(count)
+    return [(f"key{rng.randrange(keys):05}", str(i)) for i in range(count)]
+
+
+def test_sorted_in_memory(tmp_path):
+    sorter = ExternalSorter(str(tmp_path / "sort"))
+    data = records(1000, 100)
+    sorter.add_all(data)
+
+    assert list(sorter.sorted()) == sorted(data, key=lambda record: record[0])
+    assert len(sorter.runs) == 1
+
+
+@pytest.mark.parametrize("serialization", ["json", "binary"])
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_sorted_spilled_and_merged(tmp_path, serialization, compression):
+    sorter = ExternalSorter(
+        str(tmp_path / "sort"),
+        memory_limit=10_000,
+        merge_factor=3,
+        serializer=Serializer.from_name(serialization),
+        codec=Codec.from_name(compression),
+    )
+    data = records(5000, 300)
+    sorter.add_all(data)
+    assert len(sorter.runs) > 3
+
+    # Sort is stable, values of a key keep insertion order
+    assert list(sorter.sorted()) == sorted(data, key=lambda record: record[0])
+    assert len(sorter.runs) <= 3
+
+
+def test_grouped(tmp_path):
+    sorter = ExternalSorter(str(tmp_path / "sort"), memory_limit=5_000)
+    data = records(2000, 50)
+    sorter.add_all(data)
+
+    expected: dict[str, list[str]] = {}
+    for key, value in data:
+        expected.setdefault(key, []).append(value)
+    assert list(sorter.grouped()) == sorted(expected.items())
+
+
+def test_streamed_groups(tmp_path):
+    sorter = ExternalSorter(str(tmp_path / "sort"), memory_limit=5_000)
+    sorter.add_all([("b", "1"), ("a", "2"), ("b", "3"), ("a", "4")])
+
+    groups = [(key, list(values)) for key, values in sorter.streamed_groups()]
+    assert groups == [("a", ["2", "4"]), ("b", ["1", "3"])]
+
+
+def test_empty(tmp_path):
+    sorter = ExternalSorter(str(tmp_path / "sort"))
+    assert list(sorter.sorted()) == []
+
+
+def test_cleanup_removes_runs(tmp_path):
+    sorter = ExternalSorter(str(tmp_path / "sort"), memory_limit=1_000)
+    sorter.add_all(records(500, 10))
+    assert sorter.runs
+
+    list(sorter.sorted())
+    sorter.cleanup()
+    assert sorter.runs == []
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,92 @@
+from typing import Any, Optional
+
+from worker import Worker
+
+from mapreduce import task_runner
+from mapreduce.function_registry import LRUCache, function_digest
+from mapreduce.map_task import MapTask
+
+MAP_FUNCTION = 'emit(value, "1")'
+
+
+class RecordingWorker(Worker):
+    """Worker recording commands instead of sending them"""
+
+    def __init__(self) -> None:
+        super().__init__("localhost", 0, "localhost", 9000)
+        self.commands: list[tuple[str, dict[str, Any]]] = []
+
+    def communicate(
+        self,
+        command_name: str,
+        command_data: dict[str, Any] = dict(),
+        timeout: Optional[float] = None,
+    ) -> bool:
+        self.commands.append((command_name, dict(command_data)))
+        return True
+
+    def sent(self, command_name: str) -> list[dict[str, Any]]:
+        return [data for name, data in self.commands if name == command_name]
+
+
+def test_function_digest():
+    assert function_digest(MAP_FUNCTION) == function_digest(MAP_FUNCTION)
+    assert function_digest(MAP_FUNCTION) != function_digest(MAP_FUNCTION + " ")
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache: LRUCache[int] = LRUCache(max_size=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert len(cache) == 2
+    assert cache.pop("a") == 1 and cache.pop("a") is None
+
+
+def test_function_is_registered_once():
+    worker = RecordingWorker()
+    for _ in range(3):
+        assert worker.map(MAP_FUNCTION, {"path": "input.txt"})
+
+    digest = function_digest(MAP_FUNCTION)
+    assert worker.sent("register_function") == [
+        {"digest": digest, "source": MAP_FUNCTION}
+    ]
+    # Task commands carry only the digest
+    assert all(
+        data["map_function_digest"] == digest and "map_function" not in data
+        for data in worker.sent("map")
+    )
+
+
+def test_function_evicted_by_worker_is_registered_again():
+    worker = RecordingWorker()
+    worker.map(MAP_FUNCTION, {"path": "input.txt"})
+    task_id = worker.start_task()
+    worker.put_task_result(
+        task_id,
+        {
+            "error": "Unknown functions",
+            "missing_functions": [function_digest(MAP_FUNCTION)],
+        },
+    )
+
+    worker.map(MAP_FUNCTION, {"path": "input.txt"})
+    assert len(worker.sent("register_function")) == 2
+
+
+def test_task_process_compiles_function_once():
+    digest = function_digest(MAP_FUNCTION)
+    data = {"map_function_digest": digest, "functions": {digest: MAP_FUNCTION}}
+    function = task_runner.load_function(data, "map_function", MapTask.compile_function)
+
+    # Source is not needed once the function is compiled
+    data["functions"] = {}
+    assert (
+        task_runner.load_function(data, "map_function", MapTask.compile_function)
+        is function
+    )
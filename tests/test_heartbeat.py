@@ -0,0 +1,105 @@
+import asyncio
+import threading
+
+import attr
+from heartbeat import HeartbeatMonitor, WorkerHealth
+
+INTERVAL = 0.01
+
+
+@attr.s(auto_attribs=True, eq=False)
+class PingedWorker:
+    """Worker answering pings with responds, or raising if it is an error"""
+
+    responds: object
+    health: WorkerHealth = attr.Factory(WorkerHealth)
+
+    def ping(self, timeout: float) -> bool:
+        if isinstance(self.responds, Exception):
+            raise self.responds
+        return bool(self.responds)
+
+
+@attr.s(auto_attribs=True, eq=False)
+class AsyncPingedWorker(PingedWorker):
+    async def ping(self, timeout: float) -> bool:  # type: ignore[override]
+        return super().ping(timeout)
+
+
+def monitor(workers: list, exit_flag: threading.Event) -> tuple[HeartbeatMonitor, list]:
+    dead: list = []
+
+    def on_dead(worker, reason: str):
+        worker.health.alive = False
+        dead.append(worker)
+
+    return (
+        HeartbeatMonitor(lambda: workers, on_dead, exit_flag, INTERVAL, max_missed=3),
+        dead,
+    )
+
+
+def test_missed_heartbeats_are_reset_by_success():
+    health = WorkerHealth()
+    health.record_heartbeat(False)
+    health.record_heartbeat(False)
+    assert health.missed_heartbeats == 2
+
+    health.record_heartbeat(True)
+    assert health.missed_heartbeats == 0
+    assert health.since_last_heartbeat < 1.0
+
+
+def test_worker_is_dead_after_missed_heartbeats():
+    worker = PingedWorker(False)
+    heartbeat, dead = monitor([worker], threading.Event())
+    for _ in range(2):
+        heartbeat.record(worker, False)
+    assert dead == []
+
+    heartbeat.record(worker, False)
+    heartbeat.record(worker, False)
+    # Reported once
+    assert dead == [worker]
+
+
+def test_heartbeat_thread_survives_ping_errors():
+    healthy = PingedWorker(True)
+    silent = PingedWorker(False)
+    broken = PingedWorker(RuntimeError("unexpected"))
+    exit_flag = threading.Event()
+    heartbeat, dead = monitor([healthy, silent, broken], exit_flag)
+
+    heartbeat.start()
+    try:
+        for _ in range(500):
+            if len(dead) == 2:
+                break
+            exit_flag.wait(INTERVAL)
+        assert heartbeat.thread.is_alive()
+    finally:
+        exit_flag.set()
+        heartbeat.thread.join()
+
+    assert set(dead) == {silent, broken}
+    assert healthy.health.alive
+
+
+def test_async_heartbeat_survives_ping_errors():
+    healthy = AsyncPingedWorker(True)
+    broken = AsyncPingedWorker(RuntimeError("unexpected"))
+    exit_flag = threading.Event()
+    heartbeat, dead = monitor([healthy, broken], exit_flag)
+
+    async def run():
+        task = asyncio.create_task(heartbeat.run_async())
+        for _ in range(500):
+            if dead:
+                break
+            await asyncio.sleep(INTERVAL)
+        exit_flag.set()
+        await task
+
+    asyncio.run(run())
+    assert dead == [broken]
+    assert healthy.health.alive
@@ -0,0 +1,117 @@
+import os
+import uuid
+
+import pytest
+
+from mapreduce.input_format import (
+    JOB_DIR_PREFIX,
+    InputFormat,
+    input_dir,
+    input_files,
+    is_job_dir,
+)
+from mapreduce.input_split import InputSplit
+from mapreduce.map_task import MapTask
+
+LINES = ['{"user": "a", "count": 1}', "", '["b", "c,d"]']
+
+
+def test_text_format():
+    assert list(InputFormat.from_name("text").records(LINES)) == LINES
+
+
+def test_jsonl_format_skips_empty_lines():
+    records = list(InputFormat.from_name("jsonl").records(LINES))
+    assert records == [{"user": "a", "count": 1}, ["b", "c,d"]]
+
+
+def test_csv_format():
+    records = list(InputFormat.from_name("csv").records(['a,"b,c"', "", "d"]))
+    assert records == [["a", "b,c"], [], ["d"]]
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        InputFormat.from_name("parquet")
+
+
+@pytest.fixture
+def input_tree(tmp_path):
+    """
+    logs/2024/a.log, logs/2024/b.txt, logs/2025/c.log, logs/.hidden.log,
+    logs/_SUCCESS and intermediate files of a job
+    """
+    job_dir = tmp_path / "logs" / f"{JOB_DIR_PREFIX}{uuid.uuid4().hex}"
+    for path in [
+        "logs/2024/a.log",
+        "logs/2024/b.txt",
+        "logs/2025/c.log",
+        "logs/.hidden.log",
+        "logs/_SUCCESS",
+    ]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(path)
+    job_dir.mkdir()
+    (job_dir / "map_output.log").write_text("")
+    return tmp_path
+
+
+def names(paths: list[str], root) -> list[str]:
+    return [os.path.relpath(path, root) for path in paths]
+
+
+def test_single_file(input_tree):
+    path = str(input_tree / "logs/2024/a.log")
+    assert input_files(path) == [path]
+    assert input_dir(path) == str(input_tree / "logs/2024")
+
+
+def test_directory_skips_hidden_files_and_subdirectories(input_tree):
+    (input_tree / "logs/d.log").write_text("")
+    assert names(input_files(str(input_tree / "logs")), input_tree) == ["logs/d.log"]
+
+
+def test_glob(input_tree):
+    pattern = str(input_tree / "logs/*/*.log")
+    assert names(input_files(pattern), input_tree) == [
+        "logs/2024/a.log",
+        "logs/2025/c.log",
+    ]
+    assert input_dir(pattern) == str(input_tree / "logs")
+
+
+def test_recursive_glob_skips_job_directories(input_tree):
+    pattern = str(input_tree / "logs/**/*.log")
+    assert names(input_files(pattern), input_tree) == [
+        "logs/2024/a.log",
+        "logs/2025/c.log",
+    ]
+
+
+def test_glob_keeps_directories_named_like_jobs(tmp_path):
+    (tmp_path / "job_2024").mkdir()
+    (tmp_path / "job_2024/a.log").write_text("")
+    assert names(input_files(str(tmp_path / "job_*/*.log")), tmp_path) == [
+        "job_2024/a.log"
+    ]
+
+
+def test_job_dir_names():
+    assert is_job_dir(f"{JOB_DIR_PREFIX}{uuid.uuid4().hex}")
+    assert not is_job_dir("job_2024")
+    assert not is_job_dir(f"old_{JOB_DIR_PREFIX}{uuid.uuid4().hex}")
+
+
+def test_no_input_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        input_files(str(tmp_path / "*.log"))
+
+
+def test_map_reads_records_of_format(tmp_path):
+    path = tmp_path / "events.jsonl"
+    path.write_text("\n".join(LINES) + "\n")
+    task = MapTask()
+    task.load_function("emit(type(value).__name__, str(len(value)))")
+
+    task.execute_split(InputSplit(str(path), 0, path.stat().st_size), "lines", "jsonl")
+    assert task.results == [("dict", "2"), ("list", "2")]
@@ -0,0 +1,73 @@
+import gzip
+
+import pytest
+
+from mapreduce.input_split import InputSplit
+
+LINES = [f"line {i} {'x' * (i % 17)}\n" for i in range(500)]
+
+
+@pytest.fixture
+def text_file(tmp_path) -> str:
+    path = tmp_path / "input.txt"
+    path.write_text("".join(LINES))
+    return str(path)
+
+
+@pytest.mark.parametrize("split_size", [1, 7, 64, 1000, 10**6])
+def test_splits_own_every_line_once(text_file, split_size):
+    splits = InputSplit.split_file(text_file, split_size)
+    lines = [line for split in splits for line in split.read().splitlines(True)]
+    assert lines == LINES
+
+
+def test_split_snaps_to_newlines(text_file):
+    first, second = InputSplit.split_file(text_file, len(LINES[0]) + 1)[:2]
+    # Second line starts inside the first split and crosses its end
+    assert first.read() == LINES[0] + LINES[1]
+    # Second split starts in the middle of the second line, owns the third
+    assert second.read() == LINES[2]
+
+
+def test_split_starting_at_line_start(text_file):
+    split = InputSplit(text_file, len(LINES[0]), len(LINES[1]))
+    assert split.read() == LINES[1]
+
+
+def test_file_without_trailing_newline(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("a\nb\nc")
+    splits = InputSplit.split_file(str(path), 2)
+    assert "".join(split.read() for split in splits) == "a\nb\nc"
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_text("")
+    splits = InputSplit.split_file(str(path), 10)
+    assert len(splits) == 1
+    assert splits[0].read() == ""
+
+
+def test_gzip_is_single_split(tmp_path):
+    path = tmp_path / "input.txt.gz"
+    with gzip.open(path, "wt") as file:
+        file.writelines(LINES)
+
+    splits = InputSplit.split_file(str(path), 10)
+    assert len(splits) == 1
+    assert splits[0].compressed
+    assert splits[0].read() == "".join(LINES)
+
+
+def test_split_names_differ_by_directory(tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first = InputSplit(str(tmp_path / "a" / "input.txt"), 0, 10)
+    second = InputSplit(str(tmp_path / "b" / "input.txt"), 0, 10)
+    assert first.name != second.name
+
+
+def test_dict_round_trip(text_file):
+    split = InputSplit(text_file, 10, 20)
+    assert InputSplit.from_dict(split.to_dict()) == split
@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+from mapreduce.job_manager import JobManager
+from mapreduce.map_reduce import MapReduce
+
+
+def job() -> MapReduce:
+    return MapReduce("input.txt", "map", "reduce")
+
+
+class BlockingRunner:
+    """Runs jobs until they are released, jobs with input fail.txt fail"""
+
+    def __init__(self) -> None:
+        self.release = threading.Event()
+        self.running: list[str] = []
+        self.lock = threading.Lock()
+
+    def __call__(self, mr: MapReduce) -> list[str]:
+        with self.lock:
+            self.running.append(mr.job_id)
+        self.release.wait(10)
+        if mr.input_file == "fail.txt":
+            raise RuntimeError("Stage map finished 0/1 tasks")
+        return [f"{mr.job_id}.out"]
+
+
+def test_job_results():
+    runner = BlockingRunner()
+    runner.release.set()
+    manager = JobManager(runner)
+    job_id = manager.submit(job())
+    assert manager.wait(job_id, timeout=10) == [f"{job_id}.out"]
+    assert manager.jobs[job_id].state == "done"
+
+
+def test_jobs_over_limit_are_queued():
+    runner = BlockingRunner()
+    manager = JobManager(runner, max_running=2)
+    job_ids = [manager.submit(job()) for _ in range(3)]
+
+    with pytest.raises(TimeoutError):
+        manager.wait(job_ids[0], timeout=0.2)
+    assert sorted(runner.running) == sorted(job_ids[:2])
+    assert [manager.jobs[job_id].state for job_id in job_ids] == [
+        "running",
+        "running",
+        "queued",
+    ]
+
+    runner.release.set()
+    for job_id in job_ids:
+        manager.wait(job_id, timeout=10)
+    assert runner.running[2] == job_ids[2]
+
+
+def test_failed_job_raises_its_error():
+    runner = BlockingRunner()
+    runner.release.set()
+    manager = JobManager(runner)
+    failed_id = manager.submit(MapReduce("fail.txt", "map", "reduce"))
+    job_id = manager.submit(job())
+
+    with pytest.raises(RuntimeError, match="0/1"):
+        manager.wait(failed_id, timeout=10)
+    assert manager.jobs[failed_id].state == "failed"
+    # Other jobs are not affected
+    assert manager.wait(job_id, timeout=10) == [f"{job_id}.out"]
@@ -0,0 +1,75 @@
+from mapreduce.journal import JobJournal
+from mapreduce.stage import TaskOutput
+
+
+def write_job(filename: str):
+    journal = JobJournal(filename)
+    journal.append("job", job={"input_file": "input.txt"})
+    journal.append("stage", stage="map", tasks=[{"split": 0}, {"split": 1}])
+    journal.append(
+        "task", stage="map", index=1, output={"path": "out1", "host": "h", "port": 1}
+    )
+    journal.close()
+
+
+def test_replay(tmp_path):
+    filename = str(tmp_path / "journal.jsonl")
+    write_job(filename)
+
+    journal = JobJournal(filename)
+    state = journal.state
+    assert state is not None
+    assert state.job == {"input_file": "input.txt"}
+    assert state.tasks == {"map": [{"split": 0}, {"split": 1}]}
+    assert state.outputs == {"map": {1: TaskOutput("out1", "h", 1)}}
+    assert state.finished_stages == []
+    assert state.results is None
+    assert JobJournal.read_job(filename) == {"input_file": "input.txt"}
+
+    journal.append("stage_done", stage="map")
+    journal.append("done", results=["result"])
+    journal.close()
+
+    state = JobJournal(filename).state
+    assert state is not None
+    assert state.finished_stages == ["map"]
+    assert state.results == ["result"]
+
+
+def test_new_journal_has_no_state(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.jsonl"))
+    assert journal.state is None
+    journal.close()
+
+
+def test_incomplete_record_is_truncated(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    write_job(str(filename))
+    complete = filename.read_bytes()
+    with open(filename, "ab") as file:
+        file.write(b'{"event": "task", "stage": "map", "ind')
+
+    journal = JobJournal(str(filename))
+    assert journal.state is not None
+    assert journal.state.outputs == {"map": {1: TaskOutput("out1", "h", 1)}}
+    assert filename.read_bytes() == complete
+
+    # Records appended after truncation are replayed
+    journal.append("stage_done", stage="map")
+    journal.close()
+    state = JobJournal(str(filename)).state
+    assert state is not None
+    assert state.finished_stages == ["map"]
+
+
+def test_record_without_newline_is_truncated(tmp_path):
+    filename = tmp_path / "journal.jsonl"
+    write_job(str(filename))
+    complete = filename.read_bytes()
+    with open(filename, "ab") as file:
+        file.write(b'{"event": "stage_done", "stage": "map"}')
+
+    state = JobJournal(str(filename)).state
+    assert state is not None
+    assert state.finished_stages == []
+    assert filename.read_bytes() == complete
@@ -0,0 +1,55 @@
+import json
+from collections import Counter
+
+import pytest
+
+from mapreduce.local_runner import LocalRunner
+from mapreduce.map_reduce import MapReduce
+
+MAP_FUNCTION = """
+for word in value.split():
+    emit(word, "1")
+"""
+REDUCE_FUNCTION = """
+emit(str(sum(int(value) for value in values)))
+"""
+TEXT = "the quick brown fox jumps over the lazy dog\nthe end\n" * 200
+
+
+@pytest.fixture
+def input_file(tmp_path) -> str:
+    path = tmp_path / "input.txt"
+    path.write_text(TEXT)
+    return str(path)
+
+
+def expected_counts() -> dict[str, list[str]]:
+    return {word: [str(count)] for word, count in Counter(TEXT.split()).items()}
+
+
+@pytest.mark.parametrize("combine", [False, True])
+@pytest.mark.parametrize("map_mode", ["document", "lines"])
+def test_collect(input_file, combine, map_mode):
+    mr = MapReduce(
+        input_file,
+        MAP_FUNCTION,
+        REDUCE_FUNCTION,
+        chunk_size=1024,
+        map_mode=map_mode,
+        combine_function=REDUCE_FUNCTION if combine else None,
+    )
+    assert LocalRunner(processes=2).collect(mr) == expected_counts()
+
+
+def test_run_stores_partitions(input_file):
+    mr = MapReduce(input_file, MAP_FUNCTION, REDUCE_FUNCTION, chunk_size=1024)
+    outputs = LocalRunner(processes=2).run(mr)
+    assert len(outputs) == 2
+
+    results: dict[str, list[str]] = {}
+    for output in outputs:
+        with open(output) as file:
+            partition = json.load(file)
+        assert not results.keys() & partition.keys()
+        results.update(partition)
+    assert results == expected_counts()
@@ -0,0 +1,129 @@
+import os
+import time
+
+import pytest
+
+from mapreduce.input_split import InputSplit
+from mapreduce.map_cache import (
+    DIGESTS_DIR,
+    MapOutputCache,
+    content_digest,
+    output_files,
+    split_key,
+)
+
+CONFIG = {"map_function": "digest"}
+
+
+@pytest.fixture
+def cache(tmp_path) -> MapOutputCache:
+    return MapOutputCache(str(tmp_path / "cache"))
+
+
+def write_output(path, data: bytes = b"output") -> str:
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_put_and_get(tmp_path, cache):
+    output = write_output(tmp_path / "map_output")
+    assert cache.get("key") is None
+
+    cache.put("key", output)
+    cached = cache.get("key")
+    assert cached is not None
+    with open(cached, "rb") as file:
+        assert file.read() == b"output"
+    # Output is linked, not moved
+    assert os.path.exists(output)
+
+
+def test_put_partitioned_output(tmp_path, cache):
+    output = str(tmp_path / "map_output")
+    for path in output_files(output, 3):
+        with open(path, "wb") as file:
+            file.write(path.encode())
+
+    cache.put("key", output, partitions=3, move=True)
+    cached = cache.get("key")
+    assert cached is not None
+    for source, path in zip(output_files(output, 3), output_files(cached, 3)):
+        assert not os.path.exists(source)
+        with open(path, "rb") as file:
+            assert file.read() == source.encode()
+
+
+def test_first_put_is_kept(tmp_path, cache):
+    cache.put("key", write_output(tmp_path / "first", b"first"))
+    cache.put("key", write_output(tmp_path / "second", b"second"))
+    with open(cache.get("key"), "rb") as file:
+        assert file.read() == b"first"
+
+
+def test_split_key(tmp_path):
+    first = tmp_path / "first.txt"
+    second = tmp_path / "second.txt"
+    first.write_text("same\ncontent\n")
+    second.write_text("same\ncontent\n")
+    first_split = InputSplit(str(first), 0, 100)
+    second_split = InputSplit(str(second), 0, 100)
+    digest = content_digest(first_split)
+    assert digest == content_digest(second_split)
+
+    key = split_key(first_split, digest, CONFIG)
+    assert key == split_key(first_split, digest, dict(CONFIG))
+    # Map function gets the path as key, so it is a part of the cache key
+    assert key != split_key(second_split, digest, CONFIG)
+    assert key != split_key(first_split, digest, {"map_function": "other"})
+
+
+def test_split_digest_is_reused_until_file_changes(tmp_path, cache):
+    path = tmp_path / "input.txt"
+    path.write_text("a\nb\n")
+    split = InputSplit(str(path), 0, 4)
+
+    digest = cache.split_digest(split)
+    assert digest == content_digest(split)
+    assert len(os.listdir(f"{cache.directory}/{DIGESTS_DIR}")) == 1
+    assert cache.split_digest(split) == digest
+
+    path.write_text("a\nc\n")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10**9))
+    assert cache.split_digest(split) == content_digest(split) != digest
+
+
+def test_evict_least_recently_used(tmp_path, cache):
+    cache.max_size = 250
+    now = time.time()
+    for age, key in enumerate(["new", "old", "oldest"]):
+        cache.put(key, write_output(tmp_path / key, b"x" * 100))
+        os.utime(cache.entry(key), (now - age * 10, now - age * 10))
+
+    cache.evict()
+    assert cache.get("oldest") is None
+    assert cache.get("old") is not None
+    assert cache.get("new") is not None
+
+
+def test_evict_keeps_entries_of_running_job(tmp_path, cache):
+    cache.max_size = 0
+    cache.put("used", write_output(tmp_path / "used"))
+    cache.put("unused", write_output(tmp_path / "unused"))
+
+    cache.evict(keep=["used"])
+    assert cache.get("used") is not None
+    assert cache.get("unused") is None
+
+
+def test_evict_removes_stale_split_digests(tmp_path, cache):
+    path = tmp_path / "input.txt"
+    path.write_text("a\n")
+    cache.split_digest(InputSplit(str(path), 0, 2))
+    digests = f"{cache.directory}/{DIGESTS_DIR}"
+    (digest_file,) = os.listdir(digests)
+    os.utime(f"{digests}/{digest_file}", (time.time() - 100, time.time() - 100))
+
+    cache.max_size = 0
+    cache.put("key", write_output(tmp_path / "output"))
+    cache.evict()
+    assert os.listdir(digests) == []
@@ -0,0 +1,102 @@
+import pytest
+
+from mapreduce.input_split import InputSplit
+from mapreduce.map_task import MapOutputWriter, MapTask
+from mapreduce.serialization import DEFAULT_SERIALIZATION, Serializer
+
+# User code of map and combine functions, as loaded by FunctionLoader
+MAP_FUNCTION = """
+for word in value.split():
+    emit(word, "1")
+"""
+COMBINE_FUNCTION = """
+emit(str(sum(int(value) for value in values)))
+"""
+
+
+def map_task(combine: bool = False) -> MapTask:
+    task = MapTask()
+    task.load_function(MAP_FUNCTION)
+    if combine:
+        task.load_combiner(COMBINE_FUNCTION)
+    return task
+
+
+def test_map_without_combiner_keeps_every_pair():
+    task = map_task()
+    task.execute("input.txt", "a b a")
+    task.combine()
+    assert task.results == [("a", "1"), ("b", "1"), ("a", "1")]
+
+
+def test_combiner_merges_values_of_a_key():
+    task = map_task(combine=True)
+    task.execute("input.txt", "a b a c a")
+    task.combine()
+    assert sorted(task.results) == [("a", "3"), ("b", "1"), ("c", "1")]
+    assert task.combiner is not None and task.combiner.results == {}
+
+
+def test_combiner_can_emit_many_values():
+    task = MapTask()
+    task.load_function(MAP_FUNCTION)
+    task.load_combiner("for value in sorted(set(values)):\n    emit(value)")
+    task.results = [("a", "2"), ("a", "1"), ("a", "2"), ("b", "1")]
+    task.combine()
+    assert task.results == [("a", "1"), ("a", "2"), ("b", "1")]
+
+
+ITERATOR_MAP_FUNCTION = """
+for line in value:
+    for word in line.split():
+        emit(word, "1")
+"""
+
+
+@pytest.fixture
+def split(tmp_path) -> InputSplit:
+    path = tmp_path / "input.txt"
+    path.write_text("a b a\nc a\n\nb c\n")
+    return InputSplit(str(path), 0, path.stat().st_size)
+
+
+def streamed_results(task: MapTask, split: InputSplit, mode: str, path: str):
+    serializer = Serializer.from_name(DEFAULT_SERIALIZATION)
+    with MapOutputWriter(path, serializer) as output:
+        task.stream_to(output, batch_size=3)
+        task.execute_split(split, mode)
+        task.flush()
+
+    with open(path, "rb") as file:
+        return [tuple(record) for record in serializer.read(file)], output.records
+
+
+@pytest.mark.parametrize(
+    "mode, function", [("lines", MAP_FUNCTION), ("iterator", ITERATOR_MAP_FUNCTION)]
+)
+def test_streaming_map_writes_every_pair(tmp_path, split, mode, function):
+    task = MapTask()
+    task.load_function(function)
+    results, records = streamed_results(task, split, mode, str(tmp_path / "output"))
+
+    assert sorted(results) == sorted((word, "1") for word in "a b a c a b c".split())
+    assert records == 7
+    assert task.records_read == 4
+    assert task.results == []
+
+
+def test_streaming_map_combines_batches(tmp_path, split):
+    task = map_task(combine=True)
+    results, _ = streamed_results(task, split, "lines", str(tmp_path / "output"))
+
+    # Batches are combined separately, values of a key add up across them
+    counts: dict[str, int] = {}
+    for key, value in results:
+        counts[key] = counts.get(key, 0) + int(value)
+    assert counts == {"a": 3, "b": 2, "c": 2}
+    assert len(results) < 7
+
+
+def test_unknown_map_mode(split):
+    with pytest.raises(ValueError):
+        map_task().execute_split(split, "pairs")
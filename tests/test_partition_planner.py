@@ -0,0 +1,101 @@
+from collections import Counter
+
+from mapreduce.input_split import InputSplit
+from mapreduce.partition_planner import (
+    SAMPLE_SPLITS,
+    find_hot_keys,
+    plan_partitions,
+    sample_key_volumes,
+    sample_splits,
+)
+from mapreduce.partitioner import Partitioner, RangePartitioner
+
+# User code of map function, as loaded by FunctionLoader
+MAP_FUNCTION = """
+for word in value.split():
+    emit(word, "1")
+"""
+
+
+def test_range_partitioner():
+    partitioner = RangePartitioner(["d", "m"], [])
+    assert partitioner.partition("a", 3) == 0
+    assert partitioner.partition("d", 3) == 1
+    assert partitioner.partition("l", 3) == 1
+    assert partitioner.partition("m", 3) == 2
+    assert partitioner.partition("z", 3) == 2
+    # Fewer partitions than ranges
+    assert partitioner.partition("z", 2) == 1
+
+
+def test_range_partitioner_spreads_hot_keys():
+    partitioner = RangePartitioner(["m"], ["hot"])
+    partitions = {partitioner.partition("hot", 4) for _ in range(200)}
+    assert partitions == {0, 1, 2, 3}
+
+
+def test_range_partitioner_dict_round_trip():
+    partitioner = RangePartitioner(["b", "c"], ["x"])
+    restored = Partitioner.from_dict(partitioner.to_dict())
+    assert type(restored) is RangePartitioner
+    assert restored.to_dict() == partitioner.to_dict()
+
+
+def partition_volumes(
+    partitioner: RangePartitioner, volumes: Counter[str], partitions: int
+) -> list[int]:
+    sizes = [0] * partitions
+    for key, volume in volumes.items():
+        if key not in partitioner.hot_key_set:
+            sizes[partitioner.partition(key, partitions)] += volume
+    return sizes
+
+
+def test_plan_partitions_balances_volume():
+    volumes = Counter({f"key{i:03}": 10 for i in range(100)})
+    partitioner = plan_partitions(volumes, 4)
+
+    assert partitioner.boundaries == sorted(partitioner.boundaries)
+    assert partition_volumes(partitioner, volumes, 4) == [250, 250, 250, 250]
+
+
+def test_plan_partitions_leaves_no_partition_empty():
+    volumes = Counter({"a": 1000, "b": 1, "c": 1, "d": 1})
+    partitioner = plan_partitions(volumes, 3)
+    assert all(partition_volumes(partitioner, volumes, 3))
+
+
+def test_plan_partitions_splits_hot_keys():
+    volumes = Counter({f"key{i:03}": 10 for i in range(30)})
+    volumes["hot"] = 1000
+    partitioner = plan_partitions(volumes, 3, split_hot_keys=True)
+
+    assert partitioner.hot_keys == ["hot"]
+    assert partition_volumes(partitioner, volumes, 3) == [100, 100, 100]
+
+
+def test_find_hot_keys():
+    volumes = Counter({"a": 100, "b": 10, "c": 10})
+    assert find_hot_keys(volumes, 2) == ["a"]
+    assert find_hot_keys(volumes, 1) == []
+
+
+def test_sample_splits_are_inside_splits(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("word\n" * 100_000)
+    splits = InputSplit.split_file(str(path), 64 * 1024)
+
+    samples = sample_splits(splits)
+    assert len(samples) == SAMPLE_SPLITS
+    size = path.stat().st_size
+    assert all(0 <= s.offset and s.offset + s.length <= size for s in samples)
+
+
+def test_sample_key_volumes(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("a a a b\n" * 1000)
+    splits = InputSplit.split_file(str(path), 1024)
+
+    volumes = sample_key_volumes(splits, MAP_FUNCTION)
+    assert set(volumes) == {"a", "b"}
+    assert volumes["a"] == 3 * volumes["b"]
@@ -0,0 +1,41 @@
+import pytest
+
+from mapreduce.map_task import MapTask
+from mapreduce.partitioner import HashPartitioner, Partitioner
+from mapreduce.serialization import DEFAULT_SERIALIZATION, Serializer
+
+
+def test_hash_partitioner_is_stable():
+    partitioner = HashPartitioner()
+    # crc32 of the key, the same in every process
+    assert partitioner.partition("key", 7) == 2324736937 % 7
+    assert all(0 <= partitioner.partition(str(i), 5) < 5 for i in range(100))
+
+
+def test_partitioner_dict_round_trip():
+    restored = Partitioner.from_dict(HashPartitioner().to_dict())
+    assert type(restored) is HashPartitioner
+
+
+def test_unknown_partitioner():
+    with pytest.raises(ValueError):
+        Partitioner.from_dict({"name": "random"})
+
+
+def test_map_results_are_written_to_their_partitions(tmp_path):
+    task = MapTask()
+    task.results = [(f"key{i % 10}", str(i)) for i in range(100)]
+    partitioner = HashPartitioner()
+    filenames = task.store_partitioned_results(str(tmp_path / "output"), partitioner, 3)
+    assert filenames == [
+        MapTask.partition_filename(f"{tmp_path}/output", i) for i in range(3)
+    ]
+
+    serializer = Serializer.from_name(DEFAULT_SERIALIZATION)
+    records = []
+    for partition, filename in enumerate(filenames):
+        with open(filename, "rb") as file:
+            for key, value in serializer.read(file):
+                assert partitioner.partition(key, 3) == partition
+                records.append((key, value))
+    assert sorted(records) == sorted(task.results)
@@ -0,0 +1,136 @@
+import asyncio
+import json
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from protocol import (
+    FRAME_HEADER,
+    AsyncConnection,
+    Connection,
+    read_frame,
+    recv_frame,
+    send_frame,
+    write_frame,
+)
+
+# Larger than the fixed 16 KiB buffer nodes used to read messages with
+LARGE = "x" * (1024 * 1024)
+
+
+@pytest.fixture
+def sockets():
+    left, right = socket.socketpair()
+    yield left, right
+    left.close()
+    right.close()
+
+
+@pytest.fixture
+def echo_server():
+    """Answers every request with its own payload and a body of its size"""
+    server = socket.create_server(("localhost", 0))
+
+    def serve(sock: socket.socket):
+        with sock:
+            while (frame := recv_frame(sock)) is not None:
+                request_id, payload, _ = frame
+                send_frame(sock, request_id, payload, b"b" * len(payload))
+
+    def accept():
+        while True:
+            try:
+                sock, _ = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=serve, args=[sock], daemon=True).start()
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield server.getsockname()[:2]
+    server.close()
+
+
+def test_frame_round_trip(sockets):
+    left, right = sockets
+    send_frame(left, 7, b'{"name": "ping"}', b"body")
+    assert recv_frame(right) == (7, b'{"name": "ping"}', b"body")
+
+
+def test_large_frame_is_read_whole(sockets):
+    left, right = sockets
+    payload = json.dumps({"data": LARGE}).encode()
+    sender = threading.Thread(target=send_frame, args=[left, 1, payload, b"\0" * 100])
+    sender.start()
+    assert recv_frame(right) == (1, payload, b"\0" * 100)
+    sender.join()
+
+
+def test_closed_connection(sockets):
+    left, right = sockets
+    left.close()
+    assert recv_frame(right) is None
+
+
+def test_connection_closed_in_the_middle_of_frame(sockets):
+    left, right = sockets
+    left.sendall(FRAME_HEADER.pack(1, 100, 0) + b"{")
+    left.close()
+    with pytest.raises(ConnectionError):
+        recv_frame(right)
+
+
+def test_connection_matches_responses_to_requests(echo_server):
+    connection = Connection(*echo_server, timeout=5)
+    try:
+        payloads = [{"name": "task", "data": str(i) * (i * 1000)} for i in range(20)]
+        with ThreadPoolExecutor(8) as executor:
+            responses = list(
+                executor.map(lambda payload: connection.request(payload, 5), payloads)
+            )
+        assert responses == payloads
+    finally:
+        connection.close()
+
+
+def test_connection_sends_large_messages(echo_server):
+    connection = Connection(*echo_server, timeout=5)
+    try:
+        payload = {"name": "task", "data": LARGE}
+        response, body = connection.request_with_body(payload, 5)
+        assert response == payload
+        assert len(body) == len(json.dumps(payload).encode())
+    finally:
+        connection.close()
+
+
+def test_closed_connection_fails_requests(echo_server):
+    connection = Connection(*echo_server, timeout=5)
+    connection.close()
+    with pytest.raises(ConnectionError):
+        connection.request({"name": "ping"}, 5)
+
+
+def test_async_connection_sends_large_messages():
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while (frame := await read_frame(reader)) is not None:
+            request_id, payload, _ = frame
+            await write_frame(writer, request_id, payload)
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handle, "localhost", 0)
+        host, port = server.sockets[0].getsockname()[:2]
+        connection = await AsyncConnection.open(host, port, 5)
+        try:
+            payloads = [{"name": "task", "data": LARGE[: i * 10_000]} for i in range(5)]
+            responses = await asyncio.gather(
+                *[connection.request(payload, 5) for payload in payloads]
+            )
+            assert responses == payloads
+        finally:
+            connection.close()
+            server.close()
+            await server.wait_closed()
+
+    asyncio.run(run())
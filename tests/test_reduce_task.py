@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from mapreduce import task_runner
+from mapreduce.function_registry import function_digest
+from mapreduce.reduce_task import ReduceOutputWriter, ReduceTask
+from mapreduce.serialization import DEFAULT_SERIALIZATION, Serializer
+
+REDUCE_FUNCTION = """
+emit(str(sum(int(value) for value in values)))
+"""
+COUNTS = {"a": ["3"], "b": ["1"], "zażółć": ["2"]}
+
+
+def reduce_task() -> ReduceTask:
+    task = ReduceTask()
+    task.load_function(REDUCE_FUNCTION)
+    return task
+
+
+def test_output_writer_matches_stored_results(tmp_path):
+    task = reduce_task()
+    for key, count in [("a", 3), ("b", 1), ("zażółć", 2)]:
+        task.execute(key, ["1"] * count)
+    task.store_results(str(tmp_path / "stored"))
+
+    with ReduceOutputWriter(str(tmp_path / "streamed")) as output:
+        for key, values in COUNTS.items():
+            output.write(key, values)
+
+    assert (tmp_path / "stored").read_text() == (tmp_path / "streamed").read_text()
+    assert output.keys == 3 and output.records == 3
+
+
+def test_empty_output_is_valid_json(tmp_path):
+    ReduceOutputWriter(str(tmp_path / "output")).close()
+    assert json.loads((tmp_path / "output").read_text()) == {}
+
+
+def test_streaming_reduce_keeps_no_results(tmp_path):
+    task = reduce_task()
+    with ReduceOutputWriter(str(tmp_path / "output")) as output:
+        task.stream_to(output)
+        task.execute("a", iter(["1", "1", "1"]))
+        assert task.results == {}
+        task.execute("b", iter(["1"]))
+
+    assert json.loads((tmp_path / "output").read_text()) == {"a": ["3"], "b": ["1"]}
+
+
+def test_hot_keys_are_written_separately(tmp_path):
+    task = reduce_task()
+    with ReduceOutputWriter(str(tmp_path / "output")) as output:
+        with ReduceOutputWriter(str(tmp_path / "hot")) as hot_output:
+            task.stream_to(output, hot_output, ["hot"])
+            task.execute("a", ["1"])
+            task.execute("hot", ["1", "1"])
+
+    assert json.loads((tmp_path / "output").read_text()) == {"a": ["1"]}
+    assert json.loads((tmp_path / "hot").read_text()) == {"hot": ["2"]}
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_reduce_of_shuffled_records(tmp_path, streaming):
+    serializer = Serializer.from_name(DEFAULT_SERIALIZATION)
+    shuffled = tmp_path / "shuffle_results.txt"
+    with open(shuffled, "wb") as file:
+        for key, [count] in COUNTS.items():
+            values = ["1"] * int(count)
+            # Shuffle of streaming jobs writes a record per value
+            if streaming:
+                serializer.write_all(file, [[key, value] for value in values])
+            else:
+                serializer.write(file, [key, *values])
+
+    digest = function_digest(REDUCE_FUNCTION)
+    data = {
+        "filename": str(shuffled),
+        "streaming": streaming,
+        "reduce_function_digest": digest,
+        "functions": {digest: REDUCE_FUNCTION},
+    }
+    output, metrics = task_runner.run_reduce(data, str(tmp_path / "output"))
+
+    with open(output) as file:
+        assert json.load(file) == COUNTS
+    assert metrics["records_in"] == 6
+    assert metrics["records_out"] == 3
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+
+import pytest
+
+from mapreduce import scheduler
+from mapreduce.scheduler import AsyncFairScheduler, FairScheduler
+
+
+@pytest.fixture(autouse=True)
+def short_wait(monkeypatch):
+    monkeypatch.setattr(scheduler, "WAIT_INTERVAL", 0.05)
+
+
+def test_slots_of_worker_are_limited(make_worker):
+    fair = FairScheduler()
+    worker = make_worker(slots=2)
+    with fair.slot(worker, "job") as first, fair.slot(worker, "job") as second:
+        assert first and second
+        assert fair.taken[scheduler.address(worker)] == 2
+        assert fair.running_jobs == {"job": 2}
+        assert fair.next_job(worker) is None
+
+    assert fair.running_jobs == {}
+    assert not fair.taken
+
+
+def test_free_slot_goes_to_job_with_fewest_running_tasks(make_worker):
+    fair = FairScheduler()
+    worker = make_worker(slots=1)
+    other_worker = make_worker(slots=2)
+    fair.take(other_worker, "big")
+    fair.take(other_worker, "big")
+    fair.add_waiting(worker, "big")
+    fair.add_waiting(worker, "small")
+
+    assert fair.next_job(worker) == "small"
+    fair.remove_waiting(worker, "small")
+    assert fair.next_job(worker) == "big"
+
+
+def test_equal_jobs_are_served_in_submit_order(make_worker):
+    fair = FairScheduler()
+    worker = make_worker()
+    fair.add_waiting(worker, "first")
+    fair.add_waiting(worker, "second")
+    assert fair.next_job(worker) == "first"
+
+
+def test_waiting_task_gets_released_slot(make_worker):
+    fair = FairScheduler()
+    worker = make_worker(slots=1)
+    granted: list[bool] = []
+
+    def wait_for_slot():
+        with fair.slot(worker, "second") as slot:
+            granted.append(slot)
+
+    with fair.slot(worker, "first"):
+        thread = threading.Thread(target=wait_for_slot)
+        thread.start()
+        thread.join(0.2)
+        assert granted == []
+
+    thread.join(5)
+    assert granted == [True]
+
+
+def test_lost_worker_grants_no_slot(make_worker):
+    fair = FairScheduler()
+    worker = make_worker(slots=1)
+    fair.take(worker, "other")
+
+    def lose_worker():
+        worker.health.alive = False
+
+    threading.Timer(0.1, lose_worker).start()
+    with fair.slot(worker, "job") as granted:
+        assert not granted
+    assert fair.running_jobs == {"other": 1}
+    assert not fair.waiting
+
+
+def test_slot_not_needed(make_worker):
+    fair = FairScheduler()
+    worker = make_worker(slots=1)
+    fair.take(worker, "other")
+    with fair.slot(worker, "job", needed=False) as granted:
+        assert granted
+    assert fair.running_jobs == {"other": 1}
+
+
+def test_async_slot(make_worker):
+    fair = AsyncFairScheduler()
+    worker = make_worker(slots=1)
+    order: list[str] = []
+
+    async def task(job_id: str):
+        async with fair.slot_async(worker, job_id) as granted:
+            assert granted
+            order.append(job_id)
+            await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(task("first"), task("second"), task("first"))
+
+    asyncio.run(run())
+    assert sorted(order) == ["first", "first", "second"]
+    assert fair.running_jobs == {}
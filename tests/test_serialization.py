@@ -0,0 +1,35 @@
+import pytest
+
+from mapreduce.serialization import SERIALIZERS, Serializer
+
+RECORDS = [
+    ["key", "value"],
+    ["", ""],
+    ["zażółć", "gęślą", "jaźń"],
+    ["tab\tand\nnewline", '{"json": [1, 2]}'],
+    ["only key"],
+]
+
+
+@pytest.mark.parametrize("name", SERIALIZERS)
+def test_serializer_round_trip(tmp_path, name):
+    serializer = Serializer.from_name(name)
+    path = tmp_path / "records"
+    with open(path, "wb") as file:
+        serializer.write_all(file, RECORDS)
+
+    with open(path, "rb") as file:
+        assert list(serializer.read(file)) == RECORDS
+
+
+@pytest.mark.parametrize("name", SERIALIZERS)
+def test_serializer_empty_file(tmp_path, name):
+    path = tmp_path / "records"
+    path.write_bytes(b"")
+    with open(path, "rb") as file:
+        assert list(Serializer.from_name(name).read(file)) == []
+
+
+def test_unknown_serializer():
+    with pytest.raises(ValueError):
+        Serializer.from_name("xml")
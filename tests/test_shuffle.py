@@ -0,0 +1,38 @@
+import socket
+
+import pytest
+
+from communication.shuffle import FetchError, fetch_sources, remove_fetched
+
+
+@pytest.fixture
+def closed_port() -> int:
+    with socket.create_server(("localhost", 0)) as server:
+        return server.getsockname()[1]
+
+
+def test_local_and_shared_sources_are_read_in_place(tmp_path):
+    sources = {
+        0: {"host": "", "port": 0, "path": "shared"},
+        1: {"host": "localhost", "port": 9000, "path": "local"},
+    }
+    paths = fetch_sources(sources, str(tmp_path / "fetched"), ("localhost", 9000))
+    assert paths == {0: ("shared", False), 1: ("local", False)}
+
+
+def test_unreachable_source_fails_fetch(tmp_path, closed_port):
+    source = {"host": "localhost", "port": closed_port, "path": "map_output"}
+    with pytest.raises(FetchError) as error:
+        fetch_sources({3: source}, str(tmp_path / "fetched"))
+
+    # Reducer reports the lost source, so its map task runs again
+    assert error.value.source == source
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_only_fetched_files_are_removed(tmp_path):
+    kept, fetched = tmp_path / "kept", tmp_path / "fetched"
+    kept.write_text("")
+    fetched.write_text("")
+    remove_fetched([(str(kept), False), (str(fetched), True)])
+    assert list(tmp_path.iterdir()) == [kept]
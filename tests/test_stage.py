@@ -0,0 +1,213 @@
+import pytest
+
+from mapreduce.map_reduce import MAX_ATTEMPT_TIMEOUTS, MAX_TASK_FAILS, MapReduce
+from mapreduce.stage import Stage, TaskOutput
+
+TASKS = [{"task": 0}, {"task": 1}]
+
+
+def output(worker, path: str = "output") -> TaskOutput:
+    return TaskOutput(path, worker.target_host, worker.target_port)
+
+
+@pytest.fixture
+def job() -> MapReduce:
+    return MapReduce("input.txt", "map", "reduce")
+
+
+def start(job: MapReduce, worker, tasks: Stage) -> tuple[int, str]:
+    attempt = job.next_attempt(worker, tasks)
+    assert attempt is not None
+    index, _, task_id = attempt
+    return index, task_id
+
+
+def test_tasks_are_started_in_order(make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS, None)
+    assert tasks.next_task(worker) == (0, TASKS[0])
+    assert tasks.next_task(worker) == (1, TASKS[1])
+    assert tasks.next_task(worker) is None
+
+
+def test_failed_task_is_retried(job, make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS[:1], None)
+    index, task_id = start(job, worker, tasks)
+
+    finished = job.finish_attempt(
+        "map", worker, tasks, index, task_id, {"error": "boom"}
+    )
+    assert finished.failed
+    assert finished.discarded == []
+    assert list(tasks.pending) == [index]
+
+    index, task_id = start(job, worker, tasks)
+    finished = job.finish_attempt(
+        "map", worker, tasks, index, task_id, {"output": "out"}
+    )
+    assert not finished.failed
+    assert finished.output == output(worker, "out")
+    assert tasks.done
+
+
+def test_abandoned_attempt_is_discarded(job, make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS[:1], None)
+    index, task_id = start(job, worker, tasks)
+
+    # No result, but worker is alive, so the attempt may still be running
+    finished = job.finish_attempt("map", worker, tasks, index, task_id, None)
+    assert finished.failed
+    assert finished.discarded == [(worker, task_id)]
+    assert list(tasks.pending) == [index]
+
+
+def test_slow_task_gets_backup_attempt(job, make_worker):
+    worker, backup_worker = make_worker(), make_worker()
+    tasks = Stage(TASKS[:1], None)
+    index, task_id = start(job, worker, tasks)
+    assert job.next_attempt(backup_worker, tasks) is None
+
+    # Timeout does not fail the attempt while its worker is alive
+    assert job.attempt_expired(worker, index, tasks, 1.0, 1)
+    backup_index, backup_id = start(job, backup_worker, tasks)
+    assert backup_index == index
+
+    finished = job.finish_attempt(
+        "map", backup_worker, tasks, index, backup_id, {"output": "backup"}
+    )
+    assert finished.output == output(backup_worker, "backup")
+    assert finished.discarded == [(worker, task_id)]
+
+    # The slower attempt finishes too, its output is discarded
+    finished = job.finish_attempt(
+        "map", worker, tasks, index, task_id, {"output": "slow"}
+    )
+    assert finished.output is None
+    assert finished.discarded == [(worker, task_id)]
+    assert tasks.outputs == {index: output(backup_worker, "backup")}
+
+
+def test_speculation_after_threshold(make_worker):
+    worker, other_worker = make_worker(), make_worker()
+    tasks = Stage(TASKS, 0.5)
+    tasks.next_task(worker)
+    tasks.start(0, worker, "a")
+    tasks.next_task(worker)
+    tasks.start(1, worker, "b")
+    assert tasks.next_task(other_worker) is None
+
+    tasks.complete(0, worker, "a", output(worker))
+    # Backups run only on other workers
+    assert tasks.next_task(worker) is None
+    assert tasks.next_task(other_worker) == (1, TASKS[1])
+
+
+def test_failing_twice_requeues_once(make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS[:1], None)
+    tasks.next_task(worker)
+    tasks.start(0, worker, "a")
+    tasks.fail(0, worker, "a")
+    tasks.fail(0, worker, "a")
+    assert list(tasks.pending) == [0]
+
+
+def test_incomplete_stage_raises(job, make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS, None)
+    tasks.start(0, worker, "a")
+    tasks.complete(0, worker, "a", output(worker))
+    with pytest.raises(RuntimeError, match="1/2"):
+        job.finish_stage("reduce", tasks, 0.0)
+
+
+def test_attempt_of_lost_worker_is_not_discarded(job, make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS[:1], None)
+    index, task_id = start(job, worker, tasks)
+    worker.health.alive = False
+
+    finished = job.finish_attempt("map", worker, tasks, index, task_id, None)
+    assert finished.failed
+    assert finished.discarded == []
+
+
+def test_attempt_of_lost_worker_expires(job, make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS[:1], None)
+    index, _ = start(job, worker, tasks)
+    worker.health.alive = False
+    assert not job.attempt_expired(worker, index, tasks, 1.0, 1)
+
+
+def test_attempt_is_given_up_after_too_many_timeouts(job, make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS[:1], None)
+    index, _ = start(job, worker, tasks)
+    # E.g. user function hangs, worker keeps heartbeating
+    assert job.attempt_expired(worker, index, tasks, 1.0, MAX_ATTEMPT_TIMEOUTS - 1)
+    assert not job.attempt_expired(worker, index, tasks, 1.0, MAX_ATTEMPT_TIMEOUTS)
+
+
+def test_lost_worker_tasks_are_requeued(job, make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS, None, outputs_on_workers=True)
+    index, task_id = start(job, worker, tasks)
+    job.finish_attempt("map", worker, tasks, index, task_id, {"output": "out"})
+    start(job, worker, tasks)
+
+    worker.health.alive = False
+    assert job.next_attempt(worker, tasks) is None
+    assert job.slot_finished(worker, tasks)
+    # Running and completed tasks, whose outputs were on the worker
+    assert sorted(tasks.pending) == [0, 1]
+    assert tasks.outputs == {}
+
+
+def test_outputs_on_shared_storage_survive_worker(make_worker):
+    worker = make_worker()
+    tasks = Stage(TASKS[:1], None)
+    tasks.start(0, worker, "a")
+    tasks.complete(0, worker, "a", output(worker))
+    tasks.worker_lost(worker)
+    assert tasks.done
+
+
+def test_lost_map_output_reruns_map_tasks(job, make_worker):
+    map_worker, reduce_worker = make_worker(), make_worker()
+    job.map_stage = Stage(TASKS, None, outputs_on_workers=True)
+    for index in range(len(TASKS)):
+        job.map_stage.start(index, map_worker, str(index))
+        job.map_stage.complete(index, map_worker, str(index), output(map_worker))
+
+    tasks = Stage([{"partition": 0}], None)
+    index, task_id = start(job, reduce_worker, tasks)
+    lost_source = output(map_worker).source()
+    finished = job.finish_attempt(
+        "reduce",
+        reduce_worker,
+        tasks,
+        index,
+        task_id,
+        {"error": "FetchError", "lost_source": lost_source},
+    )
+    assert finished.failed
+    assert not job.map_stage.done
+    # Reducers wait until map tasks of the lost worker run again
+    assert tasks.suspended
+    assert job.next_attempt(reduce_worker, tasks) is None
+    assert job.lost_map_stage(tasks, 0) is job.map_stage
+    assert job.lost_map_stage(tasks, MAX_TASK_FAILS) is None
+
+
+def test_reduce_attempt_gets_current_map_outputs(job, make_worker):
+    worker = make_worker()
+    job.map_stage = Stage(TASKS, None, outputs_on_workers=True)
+    job.map_stage.start(0, worker, "a")
+    job.map_stage.complete(0, worker, "a", output(worker, "map_0"))
+
+    data = job.attempt_data("reduce", {"partition": 1}, "task")
+    assert data["task_id"] == "task"
+    assert data["partition_sources"] == [output(worker).source("map_0.part1")]
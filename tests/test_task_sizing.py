@@ -0,0 +1,63 @@
+import pytest
+
+from mapreduce.task_metrics import TaskMetrics
+from mapreduce.task_sizing import (
+    DEFAULT_THROUGHPUT,
+    MAX_REDUCE_WAVES,
+    MIN_SPLIT_SIZE,
+    TaskSizing,
+)
+
+MiB = 1024 * 1024
+
+
+def test_split_size_from_default_throughput():
+    sizing = TaskSizing()
+    assert sizing.split_size(1024 * MiB, 4, 2.0) == 2 * DEFAULT_THROUGHPUT
+
+
+def test_every_slot_gets_a_split():
+    assert TaskSizing().split_size(8 * MiB, 8, 60.0) == MiB
+
+
+def test_split_size_is_bounded():
+    sizing = TaskSizing(max_split_size=16 * MiB)
+    assert sizing.split_size(1024, 4, 10.0) == MIN_SPLIT_SIZE
+    assert sizing.split_size(1024 * MiB, 1, 3600.0) == 16 * MiB
+
+
+def test_observed_map_throughput_and_output_ratio():
+    sizing = TaskSizing()
+    metrics = TaskMetrics(
+        bytes_read=8 * MiB,
+        bytes_written=2 * MiB,
+        function_time=3.0,
+        serialization_time=1.0,
+    )
+    sizing.observe("map", metrics)
+
+    assert sizing.throughput["map"] == 2 * MiB
+    assert sizing.split_size(1024 * MiB, 4, 2.0) == 4 * MiB
+    assert sizing.reduce_input_size(100) == 25.0
+
+
+def test_observations_are_smoothed():
+    sizing = TaskSizing()
+    sizing.observe("reduce", TaskMetrics(bytes_read=4 * MiB, function_time=1.0))
+    sizing.observe("reduce", TaskMetrics(bytes_read=2 * MiB, function_time=1.0))
+    assert sizing.throughput["reduce"] == 3 * MiB
+    assert sizing.output_ratio is None
+
+
+@pytest.mark.parametrize("metrics", [None, TaskMetrics()])
+def test_stage_without_input_is_not_observed(metrics):
+    sizing = TaskSizing()
+    sizing.observe("map", metrics)
+    assert sizing.throughput == {} and sizing.output_ratio is None
+
+
+def test_partitions():
+    sizing = TaskSizing(throughput={"reduce": MiB})
+    assert sizing.partitions(10 * MiB, 4, 2.0) == 5
+    assert sizing.partitions(0, 4, 2.0) == 1
+    assert sizing.partitions(1024 * MiB, 4, 1.0) == 4 * MAX_REDUCE_WAVES
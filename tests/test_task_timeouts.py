@@ -0,0 +1,29 @@
+from mapreduce.task_timeouts import TaskTimeouts
+
+
+def test_initial_timeout_before_any_task_finishes():
+    assert TaskTimeouts(initial=30.0).timeout == 30.0
+
+
+def test_timeout_follows_longest_recent_duration():
+    timeouts = TaskTimeouts(initial=30.0, minimum=1.0, factor=4.0)
+    timeouts.observe(0.5)
+    timeouts.observe(2.0)
+    timeouts.observe(1.0)
+    assert timeouts.timeout == 8.0
+
+
+def test_timeout_is_at_least_minimum():
+    timeouts = TaskTimeouts(initial=30.0, minimum=10.0, factor=4.0)
+    timeouts.observe(0.1)
+    assert timeouts.timeout == 10.0
+
+
+def test_paused_while_condition_holds():
+    waiting = [True]
+    timeouts = TaskTimeouts(pause_while=lambda: waiting[0])
+    assert timeouts.paused
+
+    waiting[0] = False
+    assert not timeouts.paused
+    assert not TaskTimeouts().paused